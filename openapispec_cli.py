@@ -1,8 +1,12 @@
 import sys
 import logging
-from src.gh_utils import get_api_repositories, fetch_openapi_specs
-from src.site_generator import generate_static_site, generate_integrated_viewer
-from src.cleaner import clean, clean_directories
+from pathlib import Path
+from src.config import CONFIG
+from src.metrics import span, write_metrics_report
+
+# 起動を速くするため、yaml / requests / jinja2 を読み込むモジュールはコマンドの実行時に読み込む
+# （clean では読み込まず、collect では静的サイト生成のモジュールを、build では requests を読み込まない。
+#   requests はHTTPバックエンドが最初にリクエストを送る時に読み込む）
 
 logger = logging.getLogger('openapispec-collector')
 
@@ -19,33 +23,48 @@ Usage: python openapispec_cli.py <command>
 Commands:
   collect   API仕様書の収集のみ
   build     収集済み仕様書から静的サイト生成のみ
-  all       収集＋静的サイト生成＋統合ビューア生成
+  all       収集＋差分（変更履歴）＋静的サイト生成＋統合ビューア生成
   viewer    統合ビューアのみ生成
+  diff      前回の実行からの仕様書の変更を、互換性の有無で分類して変更履歴（changelog.json / .html）に書き出す
+            (--fail-on-breaking: 互換性のない変更があれば終了コード1で終了する)
+  watch     静的サイトを生成し、仕様書・テンプレートの変更を監視して変更部分だけを生成し直す
   clean     クリーンアップのみ
+  vendor    ビルドに埋め込む外部アセット（Swagger UI / ReDoc）を取得してキャッシュ
+            (--refresh: キャッシュ済みのアセットも取得し直す,
+             --lock: 取得した内容のintegrityを vendor_lock_file に記録する。URLのバージョンを変えたら実行してコミットする)
+  serve     生成した静的サイトを、仕様書のJSON・検索のAPIとともにHTTPで配信（ETagと事前圧縮した応答を返す）
+            (--host アドレス, --port ポート)
+  query     build で作成したカタログから仕様書・パス・操作・パラメータ・スキーマ・プロパティを検索
+            (例: query "/users/{id}", query ErrorResponse --kind schema --exact)
+            (--kind 種類, --repo リポジトリ, --exact: 名前の完全一致, --limit 件数, --json: JSONで出力)
+
+Options:
+  --profile 実行全体をcProfileで計測し、結果を profile_file に保存して上位の関数をログに出力する
 """)
 
 def collect_specs():
     """
     API仕様書を収集し、収集件数とファイルリストを返す共通関数
     """
-    static_site_dir = clean_directories()
-    static_site_dir.mkdir(exist_ok=True)
-    api_repos = get_api_repositories()
-    if not api_repos:
-        logger.warning("対象のリポジトリが見つかりませんでした")
-        return 0, []
-    successful_specs = 0
-    all_files = []
-    for repo in api_repos:
-        try:
-            output_files = fetch_openapi_specs(repo)
-            if output_files:
-                successful_specs += len(output_files)
-                all_files.extend(output_files)
-                logger.info(f"{repo}の仕様書を正常に取得しました: {output_files}")
-        except Exception as e:
-            logger.error(f"{repo}の処理中にエラーが発生しました: {e}")
-    return successful_specs, all_files
+    from src.cleaner import clean_directories
+    from src.gh_utils import iter_api_repositories
+    from src.collector import collect_repositories, check_failure_threshold
+    from src.bundler import fetch_missing_refs
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    if not CONFIG.get("incremental_collect", True):
+        static_site_dir = clean_directories()
+    static_site_dir.mkdir(exist_ok=True, parents=True)
+    # リポジトリ一覧の次ページを取得している間も、取得済みのリポジトリから仕様書の収集を進める
+    with span("stage", stage="collect"):
+        result = collect_repositories(iter_api_repositories())
+        if not result["repos"]:
+            logger.warning("対象のリポジトリが見つかりませんでした")
+            return 0, []
+        check_failure_threshold(result)
+        if CONFIG.get("bundle_refs", True):
+            # 仕様書が $ref で参照している収集対象外のファイルを取得する
+            fetch_missing_refs(result)
+    return len(result["files"]), result["files"]
 
 def collect_only():
     logger.info("OpenAPI仕様書収集のみを実行します")
@@ -53,36 +72,172 @@ def collect_only():
     logger.info(f"{successful_specs}件の仕様書を収集しました")
 
 def build_only():
+    from src.site_generator import generate_static_site
     logger.info("静的サイト生成のみを実行します")
-    specs_count = generate_static_site()
+    with span("stage", stage="build"):
+        specs_count = generate_static_site()
     logger.info(f"合計 {specs_count} 件の仕様書を使用して静的サイトを生成しました")
 
 def all_process():
     logger.info("API仕様書収集＋静的サイト生成＋統合ビューア生成を実行します")
     successful_specs, _ = collect_specs()
     if successful_specs > 0:
-        specs_count = generate_static_site()
+        from src.catalog import SpecCatalog
+        from src.spec_diff import generate_changelog
+        from src.site_generator import generate_static_site, generate_integrated_viewer
+        # 仕様書の解析は1回だけ行い、index.html と統合ビューアで共有する
+        with span("stage", stage="parse"):
+            catalog = SpecCatalog.load()
+        with span("stage", stage="diff"):
+            generate_changelog(catalog)
+        with span("stage", stage="build"):
+            specs_count = generate_static_site(catalog)
         logger.info(f"合計 {specs_count} 件の仕様書を使用して静的サイトを生成しました")
-        generate_integrated_viewer()
+        with span("stage", stage="viewer"):
+            generate_integrated_viewer(catalog)
     else:
         logger.warning("有効な仕様書が1つも取得できなかったため、静的サイトは生成されませんでした")
     logger.info("処理が完了しました")
 
+def diff_only():
+    from src.spec_diff import generate_changelog
+    with span("stage", stage="diff"):
+        run = generate_changelog()
+    if run["summary"]["breaking"] and "--fail-on-breaking" in sys.argv[2:]:
+        logger.error(f"互換性のない変更が {run['summary']['breaking']}件あります")
+        sys.exit(1)
+
+def viewer_only():
+    from src.site_generator import generate_integrated_viewer
+    with span("stage", stage="viewer"):
+        generate_integrated_viewer()
+
+def watch_only():
+    from src.watcher import watch
+    watch()
+
+def clean_only():
+    from src.cleaner import clean
+    clean()
+
+def vendor_only():
+    from src.vendor_assets import vendor_assets
+    logger.info("外部アセットをキャッシュします")
+    vendor_assets(refresh="--refresh" in sys.argv[2:], lock="--lock" in sys.argv[2:])
+    logger.info("外部アセットのキャッシュが完了しました")
+
+def option_value(args, name, default=None):
+    """
+    "--name 値" 形式のオプションの値を返す
+    """
+    if name in args:
+        index = args.index(name)
+        if index + 1 < len(args):
+            return args[index + 1]
+    return default
+
+def query_only():
+    """
+    カタログのデータベースを検索して結果を表示する（検索語がない場合やデータベースがない場合は終了コード1で終了する）
+    """
+    from src.catalog_db import ITEM_KINDS, query_catalog_db, print_query_results
+    args = sys.argv[2:]
+    value_options = ("--kind", "--repo", "--limit")
+    words = [
+        arg for index, arg in enumerate(args)
+        if not arg.startswith("--") and (index == 0 or args[index - 1] not in value_options)
+    ]
+    kind = option_value(args, "--kind")
+    if not words:
+        logger.error("検索語を指定してください")
+        sys.exit(1)
+    if kind is not None and kind not in ITEM_KINDS:
+        logger.error(f"--kind には {', '.join(ITEM_KINDS)} のいずれかを指定してください: {kind}")
+        sys.exit(1)
+    try:
+        results = query_catalog_db(
+            " ".join(words), kind=kind, repo=option_value(args, "--repo"), exact="--exact" in args,
+            limit=int(option_value(args, "--limit", 20)),
+        )
+    except (FileNotFoundError, ValueError) as e:
+        logger.error(f"{e}")
+        sys.exit(1)
+    print_query_results(results, as_json="--json" in args)
+
+def serve_only():
+    from src.server import serve
+    args = sys.argv[2:]
+    port = option_value(args, "--port")
+    serve(host=option_value(args, "--host"), port=int(port) if port is not None else None)
+
+def run_command(process):
+    """
+    コマンドを実行し、失敗リポジトリが多すぎる場合や外部アセットを用意できない場合は終了コード1で終了する
+    失敗した場合も、そこまでの計測結果を書き出す
+    """
+    try:
+        if "--profile" in sys.argv[2:]:
+            run_with_profile(process)
+        else:
+            process()
+    except Exception as e:
+        # 例外のクラスを読み込むためだけに requests などを読み込まないよう、失敗した場合にだけ読み込む
+        from src.collector import CollectionFailedError
+        from src.vendor_assets import VendorAssetError
+        if isinstance(e, CollectionFailedError):
+            logger.error(f"{e}")
+            logger.error("部分的な結果で静的サイトを公開しないよう処理を中断しました")
+            sys.exit(1)
+        if isinstance(e, VendorAssetError):
+            logger.error(f"{e}")
+            logger.error("外部アセットを用意できないため処理を中断しました")
+            sys.exit(1)
+        raise
+    finally:
+        write_metrics_report()
+
+def run_with_profile(process):
+    """
+    cProfileで計測しながら実行し、結果を profile_file に保存して累積時間の上位をログに出す
+    """
+    import io
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    try:
+        profiler.runcall(process)
+    finally:
+        profile_file = CONFIG.get("profile_file", "openapispec.prof")
+        profiler.dump_stats(profile_file)
+        output = io.StringIO()
+        pstats.Stats(profiler, stream=output).sort_stats("cumulative").print_stats(25)
+        logger.info(f"プロファイル結果を保存しました: {profile_file} (python -m pstats {profile_file} で確認できます)\n{output.getvalue()}")
+
 def main():
     if len(sys.argv) <= 1:
         print_usage()
         return
     command = sys.argv[1]
     if command == "collect":
-        collect_only()
+        run_command(collect_only)
     elif command == "build":
-        build_only()
+        run_command(build_only)
     elif command == "all":
-        all_process()
+        run_command(all_process)
     elif command == "viewer":
-        generate_integrated_viewer()
+        run_command(viewer_only)
+    elif command == "diff":
+        run_command(diff_only)
+    elif command == "watch":
+        run_command(watch_only)
     elif command == "clean":
-        clean()
+        clean_only()
+    elif command == "vendor":
+        run_command(vendor_only)
+    elif command == "serve":
+        run_command(serve_only)
+    elif command == "query":
+        query_only()
     else:
         print_usage()
 
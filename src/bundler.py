@@ -0,0 +1,355 @@
+import re
+import os
+import logging
+import posixpath
+from pathlib import Path
+from urllib.parse import unquote
+from src.config import CONFIG
+
+# 参照先ファイルの取得に使うモジュール（gh_utils は requests を読み込む）は、
+# ビルドで $ref を解決するだけの場合に読み込まないよう、取得する関数の中で読み込む
+
+logger = logging.getLogger('openapispec-collector')
+
+# 循環参照の参照先を移す場所（仕様書内の $ref で参照できるよう components.schemas に置く）
+HOISTED_SECTION = ("components", "schemas")
+HOISTED_NAME_PATTERN = re.compile(r"[^A-Za-z0-9._-]+")
+
+def split_ref(ref):
+    """
+    $ref を (ファイル部分, JSONポインタ) に分ける。ファイル部分はURLデコードする
+    """
+    file_part, _, pointer = ref.partition("#")
+    return unquote(file_part), unquote(pointer)
+
+def is_remote_ref(file_part):
+    return "://" in file_part or file_part.startswith("//")
+
+def iter_external_refs(node):
+    """
+    他のファイルを参照する $ref のファイル部分を順に返す（同じファイル内の参照とURLは除く）
+    """
+    if isinstance(node, dict):
+        ref = node.get("$ref")
+        if isinstance(ref, str):
+            file_part, _ = split_ref(ref)
+            if file_part and not is_remote_ref(file_part):
+                yield file_part
+        for value in node.values():
+            yield from iter_external_refs(value)
+    elif isinstance(node, list):
+        for value in node:
+            yield from iter_external_refs(value)
+
+def has_external_refs(node):
+    return next(iter_external_refs(node), None) is not None
+
+def resolve_pointer(document, pointer):
+    """
+    JSONポインタ（RFC 6901）が指す値を返す。見つからない場合はKeyErrorを送出する
+    """
+    node = document
+    if not pointer or pointer == "/":
+        return node
+    for token in pointer.lstrip("/").split("/"):
+        token = token.replace("~1", "/").replace("~0", "~")
+        if isinstance(node, list):
+            try:
+                node = node[int(token)]
+            except (ValueError, IndexError):
+                raise KeyError(pointer)
+        elif isinstance(node, dict) and token in node:
+            node = node[token]
+        else:
+            raise KeyError(pointer)
+    return node
+
+class RefResolver:
+    """
+    static_site 配下のファイルを $ref の参照先として読み込む
+    読み込んだファイルはパスごとに（更新日時とサイズが変わるまで）保持し、複数の仕様書で使い回す
+    """
+
+    def __init__(self, static_site_dir, parse_cache=None):
+        self.static_site_dir = Path(static_site_dir)
+        self.parse_cache = parse_cache
+        self.documents = {}
+        self.stats = {"documents": 0, "document_hits": 0, "refs": 0, "ref_hits": 0, "cycles": 0}
+
+    def load_document(self, path):
+        stat = path.stat()
+        stamp = (stat.st_mtime_ns, stat.st_size)
+        cached = self.documents.get(path)
+        if cached is not None and cached[0] == stamp:
+            self.stats["document_hits"] += 1
+            return cached[1]
+        content = path.read_text(encoding='utf-8')
+        if self.parse_cache is not None:
+            data = self.parse_cache.load(content)
+        else:
+            from src.parse_cache import load_yaml
+            data = load_yaml(content)
+        self.documents[path] = (stamp, data)
+        self.stats["documents"] += 1
+        return data
+
+    def bundle(self, spec_file, data):
+        """
+        外部ファイルへの $ref を参照先の内容に置き換えた仕様書と、警告の一覧を返す
+        外部ファイルへの参照がなければdataをそのまま返す
+        """
+        if not has_external_refs(data):
+            return data, []
+        return SpecBundle(self, Path(spec_file), data).run()
+
+    def report(self):
+        logger.info(
+            f"$refを解決しました: 参照 {self.stats['refs']}件 (解決済みの再利用 {self.stats['ref_hits']}件, "
+            f"循環 {self.stats['cycles']}件), ファイル読み込み {self.stats['documents']}件 "
+            f"(再利用 {self.stats['document_hits']}件)"
+        )
+
+class SpecBundle:
+    """
+    1つの仕様書の $ref を解決する
+    解決結果は (ファイル, JSONポインタ) ごとに保持し、同じ参照は1回だけ解決する
+    解決中の参照にもう一度たどり着いた場合は循環参照として components.schemas に移し、
+    内部参照（#/components/schemas/...）に置き換える
+    """
+
+    def __init__(self, resolver, root_file, root_data):
+        self.resolver = resolver
+        self.root_file = Path(os.path.normpath(root_file))
+        self.root_data = root_data
+        relative = self.root_file.relative_to(os.path.normpath(resolver.static_site_dir))
+        self.repo_dir = Path(os.path.normpath(resolver.static_site_dir)) / relative.parts[0]
+        self.resolved = {}
+        self.in_progress = set()
+        self.hoisted = {}
+        self.definitions = {}
+        self.warnings = []
+
+    def run(self):
+        bundled = self.walk(self.root_data, self.root_file)
+        if self.definitions:
+            section = bundled
+            for key in HOISTED_SECTION:
+                section = section.setdefault(key, {})
+            section.update(self.definitions)
+        return bundled, self.warnings
+
+    def walk(self, node, base_file):
+        if isinstance(node, dict):
+            if isinstance(node.get("$ref"), str):
+                return self.resolve_ref(node, base_file)
+            return {key: self.walk(value, base_file) for key, value in node.items()}
+        if isinstance(node, list):
+            return [self.walk(value, base_file) for value in node]
+        return node
+
+    def resolve_ref(self, node, base_file):
+        file_part, pointer = split_ref(node["$ref"])
+        if is_remote_ref(file_part):
+            self.warnings.append(f"URLへの$refは解決しません: {node['$ref']}")
+            return node
+        target_file = Path(os.path.normpath(base_file.parent / file_part)) if file_part else base_file
+        if target_file == self.root_file:
+            # 仕様書自身への参照は内部参照のまま残す
+            return {**node, "$ref": "#" + pointer}
+        key = (target_file, pointer)
+        self.resolver.stats["refs"] += 1
+        if key in self.resolved:
+            self.resolver.stats["ref_hits"] += 1
+            return self.resolved[key]
+        if key in self.in_progress:
+            self.resolver.stats["cycles"] += 1
+            return {"$ref": "#/" + "/".join(HOISTED_SECTION) + "/" + self.hoisted_name(key)}
+        if self.repo_dir not in target_file.parents:
+            self.warnings.append(f"リポジトリ外のファイルへの$refは解決しません: {node['$ref']}")
+            return node
+        try:
+            target = resolve_pointer(self.resolver.load_document(target_file), pointer)
+        except FileNotFoundError:
+            self.warnings.append(f"$refの参照先のファイルがありません: {node['$ref']} ({target_file})")
+            return node
+        except KeyError:
+            self.warnings.append(f"$refの参照先が見つかりません: {node['$ref']}")
+            return node
+        except Exception as e:
+            self.warnings.append(f"$refの参照先を読み込めませんでした: {node['$ref']} - {e}")
+            return node
+        self.in_progress.add(key)
+        try:
+            value = self.walk(target, target_file)
+        finally:
+            self.in_progress.discard(key)
+        if key in self.hoisted:
+            self.definitions[self.hoisted[key]] = value
+            value = {"$ref": "#/" + "/".join(HOISTED_SECTION) + "/" + self.hoisted[key]}
+        self.resolved[key] = value
+        return value
+
+    def hoisted_name(self, key):
+        """
+        循環参照の移動先の名前（JSONポインタの末尾、なければファイル名）を決める
+        """
+        if key in self.hoisted:
+            return self.hoisted[key]
+        target_file, pointer = key
+        base = pointer.rstrip("/").rsplit("/", 1)[-1] if pointer.strip("/") else target_file.stem
+        base = HOISTED_NAME_PATTERN.sub("_", base.replace("~1", "/").replace("~0", "~")) or "Bundled"
+        existing = resolve_existing_names(self.root_data) | set(self.definitions) | set(self.hoisted.values())
+        name = base
+        suffix = 2
+        while name in existing:
+            name = f"{base}_{suffix}"
+            suffix += 1
+        self.hoisted[key] = name
+        return name
+
+def resolve_existing_names(data):
+    try:
+        section = resolve_pointer(data, "/" + "/".join(HOISTED_SECTION))
+    except KeyError:
+        return set()
+    return set(section) if isinstance(section, dict) else set()
+
+def referenced_paths(repo_file, content):
+    """
+    仕様書の本文から外部ファイルへの $ref を集め、リポジトリ内のパスの集合で返す
+    """
+    if "$ref" not in content:
+        return set()
+    # $ref のない仕様書だけを収集する場合は yaml を読み込まない（collect の起動を速くするため）
+    from src.parse_cache import load_yaml
+    try:
+        data = load_yaml(content)
+    except Exception as e:
+        logger.warning(f"$refを確認するための解析に失敗しました: {repo_file} - {e}")
+        return set()
+    paths = set()
+    for file_part in iter_external_refs(data):
+        path = posixpath.normpath(posixpath.join(posixpath.dirname(repo_file), file_part))
+        if not path.startswith("../") and not posixpath.isabs(path):
+            paths.add(path)
+    return paths
+
+def get_ref_manifest_path():
+    return Path(CONFIG["static_site_dir"]) / CONFIG.get("ref_manifest_file", ".ref-manifest.json")
+
+def _list_repo_blobs(repo_name, backend, manifest, conditional=True):
+    """
+    リポジトリのblobを {パス: blob} で返す。2つ目の戻り値はツリー全体の一覧かどうか
+    前回のツリーのETagで条件付きリクエストを送り、304なら manifest に記録済みの参照先ファイルだけを返す
+    """
+    from src import git_mirror
+    if CONFIG.get("collect_mode", "rest") == "mirror":
+        return {blob["path"]: blob for blob in git_mirror.list_mirror_blobs(git_mirror.get_mirror_dir(repo_name))}, True
+    cached = manifest.get_tree(repo_name) if conditional else None
+    tree, etag = backend.list_tree(CONFIG['organization'], repo_name, etag=cached and cached["etag"])
+    if tree is None:
+        logger.info(f"{repo_name}のツリーに変更がないため記録済みの参照先ファイルを使います")
+        return manifest.blobs(repo_name), False
+    manifest.record_tree(repo_name, etag)
+    return {blob["path"]: blob for blob in tree}, True
+
+class _BlobReader:
+    """
+    参照先ファイルのblobの本文を読み出す
+    ミラーでは最初に必要になったときに cat-file --batch を1つ起動し、リポジトリ内の参照先で使い回す
+    """
+
+    def __init__(self, repo_name, backend):
+        self.repo_name = repo_name
+        self.backend = backend
+        self.cat_file = None
+
+    def read(self, blob):
+        from src import git_mirror
+        if CONFIG.get("collect_mode", "rest") != "mirror":
+            return self.backend.fetch_blob(CONFIG['organization'], self.repo_name, blob["sha"])
+        if self.cat_file is None:
+            self.cat_file = git_mirror.CatFileBatch(git_mirror.get_mirror_dir(self.repo_name))
+        content = self.cat_file.read(blob["sha"])
+        return content.decode("utf-8") if content is not None else None
+
+    def close(self):
+        if self.cat_file is not None:
+            self.cat_file.close()
+
+def fetch_referenced_files(repo_name, spec_files, manifest, backend=None):
+    """
+    リポジトリの仕様書が $ref で参照しているファイルのうち、収集対象外のものを取得する
+    参照先のファイルがさらに参照しているファイルもたどる
+    blob SHAを ref_manifest_file に記録し、変更のないファイルは取得しない
+    戻り値は参照先のリポジトリ内のパスの集合
+    """
+    from src import gh_utils
+    backend = backend or gh_utils.get_backend()
+    repo_dir = Path(CONFIG["static_site_dir"]) / repo_name
+    collected = {spec_file.relative_to(repo_dir).as_posix() for spec_file in spec_files}
+    pending = sorted(collected)
+    referenced = set()
+    blobs = None
+    reader = _BlobReader(repo_name, backend)
+    try:
+        while pending:
+            repo_file = pending.pop()
+            local_file = repo_dir / repo_file
+            if not local_file.exists():
+                continue
+            for path in sorted(referenced_paths(repo_file, local_file.read_text(encoding='utf-8'))):
+                if path in collected or path in referenced:
+                    continue
+                referenced.add(path)
+                if blobs is None:
+                    # ツリーは参照先を取得する必要がある場合だけ、リポジトリごとに1回取得する
+                    blobs, complete = _list_repo_blobs(repo_name, backend, manifest)
+                blob = blobs.get(path)
+                if blob is None and not complete:
+                    # 前回記録していない参照先があれば、ツリー全体を条件なしで取得し直す
+                    blobs, complete = _list_repo_blobs(repo_name, backend, manifest, conditional=False)
+                    blob = blobs.get(path)
+                if blob is None:
+                    logger.warning(f"{repo_name}/{repo_file} の$refの参照先がリポジトリにありません: {path}")
+                    continue
+                content = None
+                if not manifest.is_current(repo_name, path, blob["sha"]):
+                    content = reader.read(blob)
+                    if content is None:
+                        logger.warning(f"{repo_name}/{path} のblobがミラーに見つかりませんでした")
+                        continue
+                if gh_utils.fetch_spec_blob(backend, repo_name, blob, manifest, content):
+                    pending.append(path)
+    finally:
+        reader.close()
+    return referenced
+
+def fetch_missing_refs(result):
+    """
+    収集後に、各リポジトリの仕様書が参照しているファイルを取得する（bundle_refs が有効な場合）
+    収集に失敗したリポジトリの参照先ファイルは削除せずに残す
+    """
+    from src import gh_utils
+    from src.manifest import CollectManifest
+    manifest = CollectManifest.load(get_ref_manifest_path())
+    backend = gh_utils.get_backend()
+    spec_files = {}
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    for spec_file in result["files"]:
+        spec_files.setdefault(spec_file.relative_to(static_site_dir).parts[0], []).append(spec_file)
+    for repo_name in result["repos"]:
+        if repo_name in result["failed"]:
+            continue
+        try:
+            referenced = fetch_referenced_files(repo_name, spec_files.get(repo_name, []), manifest, backend)
+            manifest.retain(repo_name, referenced)
+        except Exception as e:
+            logger.error(f"{repo_name}の$refの参照先の取得中にエラーが発生しました: {e}")
+    manifest.retain(None, [], keep_repos=set(result["repos"]))
+    manifest.save()
+    logger.info(
+        f"$refの参照先ファイル: 取得 {manifest.stats['fetched']}件, 変更なし {manifest.stats['unchanged']}件, "
+        f"削除 {manifest.stats['removed']}件"
+    )
+    return manifest.stats
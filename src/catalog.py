@@ -0,0 +1,363 @@
+import os
+import json
+import logging
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from src.config import CONFIG
+from src.parse_cache import ParseCache, get_parse_cache, load_yaml
+from src.search_index import build_search_index
+from src.bundler import RefResolver
+from src.spec_glob import compile_spec_pattern, static_prefix
+from src.metrics import get_metrics, reset_metrics, span, increment
+
+logger = logging.getLogger('openapispec-collector')
+
+HTTP_METHODS = ("get", "put", "post", "delete", "options", "head", "patch", "trace")
+
+# 分割出力で仕様書ごとのJSONを置くディレクトリ（static_site からの相対パス）
+SPEC_PAYLOAD_DIR = "static/specs"
+
+class SpecEntry:
+    """
+    カタログ内の1つの仕様書
+    pathは static_site からの相対パス、dataは解析済みの仕様書（解析に失敗した場合はNone）
+    jsonはdataをJSONにした文字列、warningsは仕様書の構造についての警告
+    sourceは再解析に使う (リポジトリのディレクトリ, ファイル, 既定のタイトル)
+    """
+
+    def __init__(self, repo, path, title, data=None, size=0, error=None, warnings=None, source=None):
+        self.repo = repo
+        self.path = path
+        self.title = title
+        self.data = data
+        self.size = size
+        self.error = error
+        self.warnings = warnings or []
+        self.source = source
+        self.json = serialize_spec(data)
+        self.operations = count_operations(data)
+        self.description = spec_description(data)
+
+    @property
+    def released(self):
+        return self.parsed and self.json is None
+
+    def release(self):
+        """
+        解析結果とJSON文字列を手放す（必要になったら load_json() で読み込み直す）
+        """
+        self.data = None
+        self.json = None
+
+    def load_json(self, static_site_dir, parse_cache=None, resolver=None):
+        """
+        仕様書のJSON文字列を返す。release() 済みの場合は仕様書を解析し直して作成する
+        """
+        if not self.released:
+            return self.json
+        return parse_spec_file(static_site_dir, *self.source, parse_cache, resolver).json
+
+    @property
+    def payload_path(self):
+        """
+        分割出力での仕様書のJSONのパス（static_site からの相対パス）
+        """
+        return f"{SPEC_PAYLOAD_DIR}/{self.path}.json"
+
+    def summary(self):
+        """
+        サイドバーの表示に必要な情報だけの辞書を返す
+        """
+        description = self.description
+        return {
+            "path": self.path,
+            "title": self.title,
+            "repo": self.repo,
+            "description": description[:150] + ("..." if len(description) > 150 else ""),
+            "operations": self.operations,
+            "url": self.payload_path,
+        }
+
+    @property
+    def parsed(self):
+        return self.error is None
+
+class SpecCatalog:
+    """
+    static_site 配下の仕様書を1回だけ探索・解析し、
+    index.html と統合ビューアの両方の生成に使い回す
+    """
+
+    def __init__(self, static_site_dir, entries=None):
+        self.static_site_dir = Path(static_site_dir)
+        self.entries = entries or []
+        self.parse_stats = None
+        # retain_data=False で読み込んだ場合、解析結果を保持していない
+        self.retain_data = True
+        # bundle_refs が有効な場合に $ref の解決に使う（release() 済みの仕様書の再解析でも使い回す）
+        self.resolver = None
+        # build_search_index() で作成した検索索引（index.html と統合ビューアで共有する）と、
+        # watchコマンドで仕様書を差し替えるための作成途中の状態
+        self.search_index = None
+        self.search_builder = None
+        # load(retain_data=False, count_components=True) で解析結果を手放す前に数えた components の出現回数
+        self.shared_components = None
+
+    def __iter__(self):
+        return iter(self.entries)
+
+    def __len__(self):
+        return len(self.entries)
+
+    @property
+    def total_size(self):
+        return sum(entry.size for entry in self.entries)
+
+    def api_specs(self):
+        """
+        解析に成功した仕様書を {パス: 解析結果} の辞書で返す
+        """
+        return {entry.path: entry.data for entry in self.entries if entry.parsed}
+
+    def summaries(self):
+        """
+        解析に成功した仕様書の一覧（タイトル・リポジトリ・パス・オペレーション数）を返す
+        """
+        return [entry.summary() for entry in self.entries if entry.parsed]
+
+    def api_specs_json(self):
+        """
+        json.dumps(self.api_specs()) と同じ文字列を、仕様書ごとにJSON化済みの文字列から組み立てる
+        """
+        return "".join(self.iter_api_specs_json())
+
+    def iter_spec_json(self):
+        """
+        解析に成功した仕様書を (パス, JSON文字列) で1件ずつ返す
+        release() 済みの仕様書はここで解析し直すため、同時に保持するのは1件分のJSONだけになる
+        """
+        parse_cache = None if self.retain_data else get_parse_cache()
+        for entry in self.entries:
+            if entry.parsed:
+                yield entry.path, entry.load_json(self.static_site_dir, parse_cache, self.resolver)
+
+    def iter_api_specs_json(self):
+        """
+        api_specs_json() と同じ文字列を仕様書1件ずつに分けて順に返す
+        """
+        yield "{"
+        separator = ""
+        for path, spec_json in self.iter_spec_json():
+            yield f"{separator}{json.dumps(path)}: {spec_json}"
+            separator = ", "
+        yield "}"
+
+    @classmethod
+    def load(cls, static_site_dir=None, retain_data=True, count_components=False):
+        """
+        仕様書を探索・解析してカタログを作成する
+        retain_dataがFalseの場合は、仕様書ごとに検索索引へ登録してから解析結果を手放す
+        （統合ビューアだけを生成する場合に、メモリ使用量を仕様書1件分に抑えるため）
+        retain_dataがFalseでcount_componentsがTrueの場合は、手放す前の解析結果から components の出現回数も数え、
+        viewer_dedupe_components で出現回数を数えるために仕様書を解析し直さないようにする
+        """
+        static_site_dir = Path(static_site_dir or CONFIG["static_site_dir"])
+        catalog = cls(static_site_dir)
+        catalog.retain_data = retain_data
+        if not static_site_dir.exists():
+            logger.warning(f"静的サイトディレクトリが存在しません: {static_site_dir}")
+            return catalog
+        parse_cache = get_parse_cache()
+        if CONFIG.get("bundle_refs", True):
+            catalog.resolver = RefResolver(static_site_dir, parse_cache)
+        entries = _parse_entries(static_site_dir, parse_cache, catalog.resolver)
+        if retain_data:
+            catalog.entries.extend(entries)
+        else:
+            if count_components:
+                from src.shared_components import SharedComponents
+                catalog.shared_components = SharedComponents()
+            build_search_index(catalog, _release_after_use(catalog, entries))
+        logger.info(f"合計 {len(catalog)} 件の仕様書を読み込みました (合計サイズ: {catalog.total_size} バイト)")
+        if parse_cache is not None:
+            parse_cache.evict()
+            parse_cache.report()
+            catalog.parse_stats = dict(parse_cache.stats)
+            increment("parse_cache_lookups", parse_cache.stats["hits"], result="hit")
+            increment("parse_cache_lookups", parse_cache.stats["misses"], result="miss")
+        if catalog.resolver is not None and catalog.resolver.stats["refs"]:
+            catalog.resolver.report()
+        return catalog
+
+def _parse_entries(static_site_dir, parse_cache, resolver=None):
+    """
+    仕様書を順に解析し、SpecEntryを1件ずつ返す
+    """
+    jobs = [(static_site_dir, *spec) for spec in discover_spec_files(static_site_dir)]
+    workers = min(get_build_workers(), len(jobs))
+    if workers > 1:
+        # 完了順ではなくjobsの順に結果を受け取るため、出力は逐次処理と同じになる
+        logger.info(f"{workers}プロセスで仕様書を解析します")
+        cache_settings = (parse_cache.cache_dir, parse_cache.max_bytes) if parse_cache is not None else None
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            chunksize = max(1, len(jobs) // (workers * 4))
+            settings = [(cache_settings, resolver is not None)] * len(jobs)
+            for entry, stats, resolver_stats, metrics in executor.map(_parse_spec_job, jobs, settings, chunksize=chunksize):
+                get_metrics().merge(metrics)
+                if parse_cache is not None:
+                    for name, value in stats.items():
+                        parse_cache.stats[name] += value
+                if resolver is not None:
+                    for name, value in resolver_stats.items():
+                        resolver.stats[name] += value
+                _log_warnings(entry)
+                yield entry
+    else:
+        for job in jobs:
+            entry = parse_spec_file(*job, parse_cache, resolver)
+            _log_warnings(entry)
+            yield entry
+
+def _log_warnings(entry):
+    for warning in entry.warnings:
+        logger.warning(f"{entry.path}: {warning}")
+
+def _release_after_use(catalog, entries):
+    """
+    SpecEntryをカタログに追加しながら返し、呼び出し側が使い終わったら解析結果を手放す
+    """
+    for entry in entries:
+        catalog.entries.append(entry)
+        yield entry
+        if catalog.shared_components is not None and entry.parsed:
+            catalog.shared_components.count(entry.data)
+        entry.release()
+
+def get_build_workers():
+    """
+    仕様書の解析に使うプロセス数を返す（build_workersがNoneの場合はCPU数）
+    """
+    workers = CONFIG.get("build_workers", 1)
+    return max(1, int(workers or os.cpu_count() or 1))
+
+def serialize_spec(data):
+    """
+    仕様書をビューアに埋め込むJSON文字列にする（日付などJSONにない型は文字列にする）
+    """
+    return json.dumps(data, default=str)
+
+def spec_description(data):
+    """
+    info.description を返す（ない場合は空文字列）
+    """
+    info = data.get("info") if isinstance(data, dict) else None
+    description = info.get("description") if isinstance(info, dict) else None
+    return description if isinstance(description, str) else ""
+
+def count_operations(data):
+    """
+    paths配下のオペレーション（HTTPメソッド）の数を返す
+    """
+    paths = data.get("paths") if isinstance(data, dict) else None
+    if not isinstance(paths, dict):
+        return 0
+    return sum(
+        1 for path_item in paths.values() if isinstance(path_item, dict)
+        for method in path_item if method in HTTP_METHODS
+    )
+
+def validate_spec(data):
+    """
+    OpenAPI仕様書として最低限の構造を持っているかを確認し、警告の一覧を返す
+    """
+    if not isinstance(data, dict):
+        return ["仕様書の最上位がマッピングではありません"]
+    warnings = []
+    if "openapi" not in data and "swagger" not in data:
+        warnings.append("openapi / swagger のバージョン指定がありません")
+    if not isinstance(data.get("info"), dict):
+        warnings.append("info がありません")
+    if not isinstance(data.get("paths", {}), dict):
+        warnings.append("paths がマッピングではありません")
+    return warnings
+
+def discover_spec_files(static_site_dir):
+    """
+    spec_pathに一致する仕様書を (リポジトリのディレクトリ, ファイル, 既定のタイトル) の順に列挙する
+    spec_pathの固定部分のディレクトリがないリポジトリは、従来通り直下の *.yml / *.yaml を対象にする
+    """
+    spec_pattern = CONFIG["spec_path"]
+    matches = compile_spec_pattern(spec_pattern)
+    prefix = static_prefix(spec_pattern)
+    for repo_dir in sorted(static_site_dir.iterdir()):
+        # 隠しディレクトリ（serveコマンドが圧縮した本文の保存先など）はリポジトリではない
+        if not repo_dir.is_dir() or repo_dir.name == "static" or repo_dir.name.startswith("."):
+            continue
+        search_dir = repo_dir / prefix
+        if search_dir.is_dir():
+            yml_files = sorted(
+                path for path in search_dir.rglob("*")
+                if path.is_file() and matches(path.relative_to(repo_dir).as_posix())
+            )
+            for spec_file in yml_files:
+                subpath = spec_file.parent.relative_to(repo_dir).as_posix()
+                subpath = "" if subpath == "." else subpath
+                yield repo_dir, spec_file, repo_dir.name + ("/" + subpath if subpath else "") + "/" + spec_file.stem
+        else:
+            for spec_file in sorted(list(repo_dir.glob("*.yml")) + list(repo_dir.glob("*.yaml"))):
+                yield repo_dir, spec_file, repo_dir.name
+
+def parse_spec_file(static_site_dir, repo_dir, spec_file, default_title, parse_cache=None, resolver=None):
+    """
+    仕様書を読み込んで解析し、SpecEntryを返す
+    parse_cacheを渡すと内容が変わっていない仕様書はYAMLの解析を省略する
+    resolverを渡すと外部ファイルへの $ref を解決して1ファイルで完結する仕様書にする
+    info.titleがあればタイトルに使用する
+    """
+    spec_path = str(spec_file.relative_to(static_site_dir))
+    try:
+        with open(spec_file, 'r', encoding='utf-8') as f:
+            content = f.read()
+        logger.info(f"仕様書を読み込みました: {spec_file.name} ({len(content)} バイト)")
+        with span("parse_spec", repo=repo_dir.name, spec=spec_path):
+            data = parse_cache.load(content) if parse_cache is not None else load_yaml(content)
+    except Exception as e:
+        logger.warning(f"仕様書の読み込み中にエラーが発生: {spec_file} - {e}")
+        increment("parse_errors")
+        return SpecEntry(repo_dir.name, spec_path, default_title, error=str(e), source=(repo_dir, spec_file, default_title))
+    increment("parsed_bytes", len(content))
+    warnings = validate_spec(data)
+    if resolver is not None:
+        with span("bundle_refs", repo=repo_dir.name, spec=spec_path):
+            data, bundle_warnings = resolver.bundle(spec_file, data)
+        warnings.extend(bundle_warnings)
+    title = default_title
+    if isinstance(data, dict) and isinstance(data.get("info"), dict) and "title" in data["info"]:
+        title = data["info"]["title"]
+    return SpecEntry(
+        repo_dir.name, spec_path, title, data, len(content),
+        warnings=warnings, source=(repo_dir, spec_file, default_title),
+    )
+
+# プロセスプールの各プロセスで使い回す $ref の解決処理（読み込んだ参照先ファイルを複数の仕様書で共有する）
+_worker_resolvers = {}
+
+def _parse_spec_job(job, settings):
+    """
+    プロセスプールで実行する解析処理。SpecEntryと、解析キャッシュ・$ref解決の統計、計測結果を返す
+    設定はプロセス間で共有されないため、解析キャッシュの設定と $ref を解決するかは引数で受け取る
+    """
+    cache_settings, bundle_refs = settings
+    # fork で親プロセスから引き継いだ計測結果を二重に数えないよう、1件ごとに作り直す
+    metrics = reset_metrics()
+    parse_cache = ParseCache(*cache_settings) if cache_settings else None
+    resolver = None
+    resolver_stats = {}
+    if bundle_refs:
+        resolver = _worker_resolvers.setdefault(job[0], RefResolver(job[0]))
+        resolver.parse_cache = parse_cache
+        before = dict(resolver.stats)
+    entry = parse_spec_file(*job, parse_cache, resolver)
+    if resolver is not None:
+        resolver_stats = {name: value - before[name] for name, value in resolver.stats.items()}
+    return entry, parse_cache.stats if parse_cache is not None else {}, resolver_stats, metrics.take()
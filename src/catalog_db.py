@@ -0,0 +1,289 @@
+import json
+import sqlite3
+import hashlib
+import logging
+from pathlib import Path
+from src.config import CONFIG
+from src.catalog import HTTP_METHODS
+
+logger = logging.getLogger('openapispec-collector')
+
+# スキーマを変更したら上げる（古い形式のファイルは作り直す）
+CATALOG_DB_VERSION = "1"
+
+# 検索できる項目の種類
+ITEM_KINDS = ("spec", "path", "operation", "parameter", "schema", "property")
+
+# trigramトークナイザは3文字未満の語を照合できないため、それより短い語は部分一致（LIKE）で探す
+FTS_MIN_QUERY_LENGTH = 3
+
+_fts_trigram_available = None
+
+SCHEMA_SQL = """
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS specs (
+    id INTEGER PRIMARY KEY,
+    path TEXT NOT NULL UNIQUE,
+    repo TEXT NOT NULL,
+    title TEXT,
+    version TEXT,
+    content_hash TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS items (
+    id INTEGER PRIMARY KEY,
+    spec_id INTEGER NOT NULL REFERENCES specs(id),
+    kind TEXT NOT NULL,
+    name TEXT NOT NULL,
+    location TEXT,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS items_spec ON items (spec_id);
+CREATE INDEX IF NOT EXISTS items_kind_name ON items (kind, name COLLATE NOCASE);
+"""
+
+# trigramトークナイザ（SQLite 3.34以降）が使える場合だけ作る全文検索索引
+FTS_SCHEMA_SQL = """
+CREATE VIRTUAL TABLE IF NOT EXISTS items_fts USING fts5 (
+    name, detail, content='items', content_rowid='id', tokenize='trigram'
+);
+CREATE TRIGGER IF NOT EXISTS items_insert AFTER INSERT ON items BEGIN
+    INSERT INTO items_fts (rowid, name, detail) VALUES (new.id, new.name, new.detail);
+END;
+CREATE TRIGGER IF NOT EXISTS items_delete AFTER DELETE ON items BEGIN
+    INSERT INTO items_fts (items_fts, rowid, name, detail) VALUES ('delete', old.id, old.name, old.detail);
+END;
+"""
+
+def fts_trigram_available():
+    """
+    SQLiteのFTS5でtrigramトークナイザが使えるかを返す
+    使えない場合（SQLite 3.34より前、FTS5なし）は全文検索索引を作らず、部分一致（LIKE）で検索する
+    """
+    global _fts_trigram_available
+    if _fts_trigram_available is None:
+        conn = sqlite3.connect(":memory:")
+        try:
+            conn.execute("CREATE VIRTUAL TABLE probe USING fts5 (name, tokenize='trigram')")
+            _fts_trigram_available = True
+        except sqlite3.OperationalError:
+            _fts_trigram_available = False
+            logger.warning(
+                f"SQLite {sqlite3.sqlite_version} ではFTS5のtrigramトークナイザが使えないため、"
+                "カタログは部分一致（LIKE）で検索します"
+            )
+        finally:
+            conn.close()
+    return _fts_trigram_available
+
+def get_catalog_db_path():
+    name = CONFIG.get("catalog_db_file")
+    return Path(CONFIG["static_site_dir"]) / name if name else None
+
+def content_hash(spec_json):
+    return hashlib.sha256(spec_json.encode("utf-8")).hexdigest()
+
+def _text(*values):
+    return " ".join(value for value in values if isinstance(value, str) and value)
+
+def _dict(value):
+    return value if isinstance(value, dict) else {}
+
+def spec_items(entry):
+    """
+    仕様書から検索する項目を (種類, 名前, 場所, 詳細) で順に返す
+    """
+    data = entry.data
+    info = _dict(data.get("info"))
+    yield "spec", entry.title, entry.path, _text(entry.repo, info.get("description"))
+    for path, path_item in _dict(data.get("paths")).items():
+        if not isinstance(path_item, dict):
+            continue
+        yield "path", path, "", ""
+        shared_parameters = path_item.get("parameters") if isinstance(path_item.get("parameters"), list) else []
+        for method, operation in path_item.items():
+            if method not in HTTP_METHODS or not isinstance(operation, dict):
+                continue
+            location = f"{method.upper()} {path}"
+            tags = " ".join(tag for tag in operation.get("tags") or [] if isinstance(tag, str))
+            yield "operation", location, operation.get("operationId") or "", _text(
+                operation.get("operationId"), operation.get("summary"), operation.get("description"), tags
+            )
+            parameters = operation.get("parameters") if isinstance(operation.get("parameters"), list) else []
+            for parameter in shared_parameters + parameters:
+                if isinstance(parameter, dict) and isinstance(parameter.get("name"), str):
+                    yield "parameter", parameter["name"], location, _text(parameter.get("in"), parameter.get("description"))
+    schemas = _dict(_dict(data.get("components")).get("schemas"))
+    for schema_name, schema in schemas.items():
+        schema = _dict(schema)
+        yield "schema", str(schema_name), "", _text(schema.get("description"))
+        for prop_name, prop in _dict(schema.get("properties")).items():
+            prop = _dict(prop)
+            prop_type = prop.get("type") if isinstance(prop.get("type"), str) else ""
+            yield "property", str(prop_name), str(schema_name), _text(prop_type, prop.get("description"))
+
+def connect(db_file):
+    """
+    カタログのデータベースを開く。形式が古い場合と、全文検索索引の有無が今のSQLiteと合わない場合は作り直す
+    """
+    db_file = Path(db_file)
+    db_file.parent.mkdir(exist_ok=True, parents=True)
+    fts = "trigram" if fts_trigram_available() else "none"
+    conn = sqlite3.connect(db_file)
+    try:
+        meta = dict(conn.execute("SELECT key, value FROM meta"))
+    except sqlite3.DatabaseError:
+        meta = None
+    if meta is not None and (meta.get("version"), meta.get("fts")) != (CATALOG_DB_VERSION, fts):
+        conn.close()
+        db_file.unlink()
+        conn = sqlite3.connect(db_file)
+    conn.executescript(SCHEMA_SQL + (FTS_SCHEMA_SQL if fts == "trigram" else ""))
+    conn.executemany(
+        "INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)", (("version", CATALOG_DB_VERSION), ("fts", fts))
+    )
+    conn.commit()
+    return conn
+
+def update_catalog_db(catalog, db_file=None):
+    """
+    カタログの仕様書をデータベースに反映する
+    内容（$ref解決後のJSON）のハッシュが変わった仕様書だけを入れ替え、なくなった仕様書を削除する
+    戻り値は {"added", "updated", "unchanged", "removed"} の件数
+    カタログはビルドの付加的な出力のため、SQLiteのエラーでは警告してカタログを作らずに続ける（戻り値はNone）
+    """
+    db_file = db_file or get_catalog_db_path()
+    stats = {"added": 0, "updated": 0, "unchanged": 0, "removed": 0}
+    if db_file is None:
+        return stats
+    try:
+        _update_catalog_db(catalog, db_file, stats)
+    except sqlite3.Error as e:
+        logger.warning(f"カタログのデータベースを更新できなかったため作成しません: {db_file}, エラー: {e}")
+        return None
+    logger.info(
+        f"カタログのデータベースを更新しました: {db_file} (追加 {stats['added']}件, 更新 {stats['updated']}件, "
+        f"変更なし {stats['unchanged']}件, 削除 {stats['removed']}件)"
+    )
+    return stats
+
+def _update_catalog_db(catalog, db_file, stats):
+    conn = connect(db_file)
+    try:
+        existing = {path: (spec_id, spec_hash) for spec_id, path, spec_hash in conn.execute(
+            "SELECT id, path, content_hash FROM specs"
+        )}
+        seen = set()
+        with conn:
+            for entry in catalog:
+                if entry.released:
+                    # 解析結果を手放した仕様書は登録済みの内容を残す
+                    seen.add(entry.path)
+                    continue
+                if not entry.parsed or not isinstance(entry.data, dict):
+                    continue
+                seen.add(entry.path)
+                spec_hash = content_hash(entry.json)
+                previous = existing.get(entry.path)
+                if previous is not None and previous[1] == spec_hash:
+                    stats["unchanged"] += 1
+                    continue
+                if previous is not None:
+                    _delete_spec(conn, previous[0])
+                    stats["updated"] += 1
+                else:
+                    stats["added"] += 1
+                _insert_spec(conn, entry, spec_hash)
+            for path in set(existing) - seen:
+                _delete_spec(conn, existing[path][0])
+                stats["removed"] += 1
+    finally:
+        conn.close()
+
+def _delete_spec(conn, spec_id):
+    conn.execute("DELETE FROM items WHERE spec_id = ?", (spec_id,))
+    conn.execute("DELETE FROM specs WHERE id = ?", (spec_id,))
+
+def _insert_spec(conn, entry, spec_hash):
+    info = _dict(entry.data.get("info"))
+    version = str(info["version"]) if info.get("version") is not None else None
+    spec_id = conn.execute(
+        "INSERT INTO specs (path, repo, title, version, content_hash) VALUES (?, ?, ?, ?, ?)",
+        (entry.path, entry.repo, entry.title, version, spec_hash),
+    ).lastrowid
+    conn.executemany(
+        "INSERT INTO items (spec_id, kind, name, location, detail) VALUES (?, ?, ?, ?, ?)",
+        ((spec_id, *item) for item in spec_items(entry)),
+    )
+
+def fts_query(text):
+    """
+    検索語を空白で区切り、それぞれを部分一致するフレーズとしてすべて含む FTS5 のクエリにする
+    """
+    return " AND ".join('"' + word.replace('"', '""') + '"' for word in text.split())
+
+def query_catalog_db(text, kind=None, repo=None, exact=False, limit=20, db_file=None):
+    """
+    名前・詳細に検索語を含む項目を返す（名前が完全に一致するものを先に並べる）
+    exact=Trueの場合は名前が一致する（大文字と小文字は区別しない）項目だけを返す
+    戻り値は {"kind", "name", "location", "detail", "spec", "repo", "title"} のリスト
+    """
+    db_file = Path(db_file or get_catalog_db_path())
+    if not db_file.exists():
+        raise FileNotFoundError(f"カタログのデータベースがありません: {db_file} (build を実行してください)")
+    conn = sqlite3.connect(f"file:{db_file}?mode=ro", uri=True)
+    try:
+        # 別の（新しい）SQLiteで作ったデータベースでも、今のSQLiteでtrigramが使えなければ部分一致で探す
+        has_fts = (
+            conn.execute("SELECT value FROM meta WHERE key = 'fts'").fetchone() == ("trigram",) and fts_trigram_available()
+        )
+        conditions = []
+        params = []
+        words = text.split()
+        if exact:
+            conditions.append("items.name = ? COLLATE NOCASE")
+            params.append(text.strip())
+            source = "items"
+        elif has_fts and words and all(len(word) >= FTS_MIN_QUERY_LENGTH for word in words):
+            source = "items_fts JOIN items ON items.id = items_fts.rowid"
+            conditions.append("items_fts MATCH ?")
+            params.append(fts_query(text))
+        else:
+            source = "items"
+            for word in words:
+                conditions.append("(items.name LIKE ? ESCAPE '\\' OR items.detail LIKE ? ESCAPE '\\')")
+                pattern = "%" + word.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+                params.extend([pattern, pattern])
+        if kind:
+            conditions.append("items.kind = ?")
+            params.append(kind)
+        if repo:
+            conditions.append("specs.repo = ?")
+            params.append(repo)
+        order = "items.name = ? COLLATE NOCASE DESC, " + ("bm25(items_fts)" if "MATCH" in " ".join(conditions) else "items.id")
+        params.append(text.strip())
+        rows = conn.execute(
+            f"SELECT items.kind, items.name, items.location, items.detail, specs.path, specs.repo, specs.title "
+            f"FROM {source} JOIN specs ON specs.id = items.spec_id "
+            f"WHERE {' AND '.join(conditions) or '1'} ORDER BY {order} LIMIT ?",
+            (*params, limit),
+        ).fetchall()
+    finally:
+        conn.close()
+    keys = ("kind", "name", "location", "detail", "spec", "repo", "title")
+    return [dict(zip(keys, row)) for row in rows]
+
+def format_query_results(results):
+    lines = []
+    for result in results:
+        location = f" ({result['location']})" if result["location"] else ""
+        detail = f" - {result['detail']}" if result["detail"] else ""
+        lines.append(f"{result['kind']:<9} {result['spec']}: {result['name']}{location}{detail}")
+    return "\n".join(lines)
+
+def print_query_results(results, as_json=False):
+    if as_json:
+        print(json.dumps(results, ensure_ascii=False, indent=2))
+    elif results:
+        print(format_query_results(results))
+    else:
+        print("一致する項目はありません")
@@ -0,0 +1,172 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from src.config import CONFIG
+from src import gh_utils
+from src import git_mirror
+from src.manifest import CollectManifest
+from src.scheduler import get_scheduler
+
+logger = logging.getLogger('openapispec-collector')
+
+class CollectionFailedError(Exception):
+    """
+    失敗したリポジトリが多すぎ、部分的なサイトを公開すべきでない場合に送出する
+    """
+
+def _submit_per_repo(api_repos, repo_executor, task, *args):
+    """
+    api_reposを順に読み進めながら各リポジトリの処理を投入する
+    api_reposがページ単位で取得するジェネレーターの場合、次ページの取得中にも前のページの処理が進む
+    戻り値はリポジトリ名の順序とFutureの対応表
+    """
+    repos = []
+    futures = {}
+    for repo in api_repos:
+        if repo in futures:
+            continue
+        repos.append(repo)
+        futures[repo] = repo_executor.submit(task, repo, *args)
+    return repos, futures
+
+def _collect_per_repo(api_repos, manifest, repo_executor, file_executor, fetch_specs):
+    """
+    リポジトリごとにfetch_specs（REST: fetch_openapi_specs, ミラー: fetch_openapi_specs_from_mirror）で収集する
+    """
+    repos, futures = _submit_per_repo(api_repos, repo_executor, fetch_specs, file_executor, True, manifest)
+    total = len(repos)
+    repo_files = {}
+    failed = {}
+    names = {future: repo for repo, future in futures.items()}
+    for done, future in enumerate(as_completed(names), 1):
+        repo = names[future]
+        try:
+            repo_files[repo] = future.result()
+            logger.info(f"[{done}/{total}] {repo}: {len(repo_files[repo])}件の仕様書を取得しました")
+        except Exception as e:
+            failed[repo] = str(e)
+            logger.error(f"[{done}/{total}] {repo}の処理中にエラーが発生しました: {e}")
+    return repos, repo_files, failed
+
+def _collect_with_graphql(api_repos, manifest, repo_executor, file_executor):
+    """
+    ツリーはリポジトリごとにRESTで取得し、変更のあるblobの本文は
+    複数リポジトリ分をまとめたGraphQLクエリで取得する
+    GraphQLで取得できなかったblob（大きすぎる・切り詰められたものなど）はRESTで取得する
+    """
+    backend = gh_utils.get_backend()
+    repos, futures = _submit_per_repo(api_repos, repo_executor, gh_utils.resolve_spec_blobs, backend, manifest)
+    total = len(repos)
+    repo_blobs = {}
+    failed = {}
+    names = {future: repo for repo, future in futures.items()}
+    for done, future in enumerate(as_completed(names), 1):
+        repo = names[future]
+        try:
+            repo_blobs[repo] = future.result()
+            manifest.retain(repo, [blob["path"] for blob in repo_blobs[repo]])
+            logger.info(f"[{done}/{total}] {repo}: {len(repo_blobs[repo])}件の仕様書が見つかりました")
+        except Exception as e:
+            failed[repo] = str(e)
+            logger.error(f"[{done}/{total}] {repo}のツリー取得中にエラーが発生しました: {e}")
+    pending = [
+        (repo, blob)
+        for repo in repos for blob in repo_blobs.get(repo, [])
+        if not manifest.is_current(repo, blob["path"], blob["sha"])
+    ]
+    batches, oversized = gh_utils.plan_graphql_batches(pending)
+    logger.info(
+        f"変更のある仕様書 {len(pending)}件をGraphQL {len(batches)}クエリで取得します "
+        f"(サイズ超過によりREST: {len(oversized)}件)"
+    )
+    texts = {}
+    for result in file_executor.map(lambda batch: gh_utils.fetch_blob_texts_graphql(batch, backend), batches):
+        texts.update(result)
+    save_futures = {
+        (repo, blob["path"]): file_executor.submit(
+            gh_utils.fetch_spec_blob, backend, repo, blob, manifest, texts.get((repo, blob["path"]))
+        )
+        for repo, blobs in repo_blobs.items() for blob in blobs
+    }
+    repo_files = {}
+    for repo, blobs in repo_blobs.items():
+        try:
+            files = [save_futures[(repo, blob["path"])].result() for blob in blobs]
+            repo_files[repo] = [spec_file for spec_file in files if spec_file]
+        except Exception as e:
+            failed[repo] = str(e)
+            logger.error(f"{repo}の仕様書取得中にエラーが発生しました: {e}")
+    return repos, repo_files, failed
+
+def collect_repositories(api_repos):
+    """
+    複数リポジトリの仕様書を並行して収集する
+    同時実行数は max_concurrent_repos / max_concurrent_files で制限し、
+    1リポジトリの失敗は他のリポジトリに影響させない
+    api_reposにはリストのほか、ページ単位で取得するジェネレーター（iter_api_repositories）も渡せる
+    戻り値のfilesは完了順ではなくapi_reposの順序（リポジトリ内はパス順）で並ぶ
+    収集マニフェストのblob SHAと比較し、新規・変更されたファイルだけを取得する
+    collect_mode が "graphql" の場合はblob本文をGraphQLでまとめて取得し、
+    "mirror" の場合はローカルのbareミラーから git cat-file --batch で読み出す
+    """
+    manifest = CollectManifest.load()
+    repo_workers = max(1, int(CONFIG.get("max_concurrent_repos", 1)))
+    file_workers = max(1, int(CONFIG.get("max_concurrent_files", 1)))
+    collect_mode = CONFIG.get("collect_mode", "rest")
+    logger.info(
+        f"仕様書の収集を開始します "
+        f"(方式: {collect_mode}, 同時リポジトリ数: {repo_workers}, 同時ファイル数: {file_workers})"
+    )
+    with ThreadPoolExecutor(max_workers=file_workers, thread_name_prefix="spec-file") as file_executor, \
+            ThreadPoolExecutor(max_workers=repo_workers, thread_name_prefix="spec-repo") as repo_executor:
+        if collect_mode == "graphql":
+            repos, repo_files, failed = _collect_with_graphql(api_repos, manifest, repo_executor, file_executor)
+        elif collect_mode == "rest":
+            repos, repo_files, failed = _collect_per_repo(
+                api_repos, manifest, repo_executor, file_executor, gh_utils.fetch_openapi_specs
+            )
+        elif collect_mode == "mirror":
+            repos, repo_files, failed = _collect_per_repo(
+                api_repos, manifest, repo_executor, file_executor, git_mirror.fetch_openapi_specs_from_mirror
+            )
+        else:
+            raise ValueError(f"未対応のcollect_modeです: {collect_mode}")
+    if repos:
+        # 対象から外れたリポジトリの仕様書を削除（失敗したリポジトリの仕様書は保持する）
+        manifest.retain(None, [], keep_repos=set(repos))
+        manifest.save()
+    total = len(repos)
+    files = [spec_file for repo in repos for spec_file in repo_files.get(repo, [])]
+    succeeded = [repo for repo in repos if repo_files.get(repo)]
+    empty = [repo for repo in repos if repo in repo_files and not repo_files[repo]]
+    logger.info(
+        f"収集結果: リポジトリ {total}件 (成功 {len(succeeded)}件, 仕様書なし {len(empty)}件, 失敗 {len(failed)}件), "
+        f"仕様書 {len(files)}件 (取得 {manifest.stats['fetched']}件, 変更なし {manifest.stats['unchanged']}件, "
+        f"削除 {manifest.stats['removed']}件)"
+    )
+    scheduler_stats = get_scheduler().stats
+    logger.info(
+        f"APIリクエスト: {scheduler_stats['requests']}回 (再試行 {scheduler_stats['retries']}回, "
+        f"レート制限 {scheduler_stats['throttled']}回, 失敗 {scheduler_stats['failures']}回)"
+    )
+    return {
+        "repos": repos,
+        "files": files,
+        "succeeded": succeeded,
+        "empty": empty,
+        "failed": failed,
+        **manifest.stats,
+    }
+
+def check_failure_threshold(result):
+    """
+    失敗したリポジトリの割合が max_failed_repo_ratio を超えていたら CollectionFailedError を送出する
+    """
+    total = len(result["repos"])
+    if not total or not result["failed"]:
+        return
+    ratio = len(result["failed"]) / total
+    if ratio > CONFIG.get("max_failed_repo_ratio", 0.1):
+        raise CollectionFailedError(
+            f"{total}件中{len(result['failed'])}件のリポジトリで収集に失敗しました "
+            f"({ratio:.0%} > {CONFIG.get('max_failed_repo_ratio', 0.1):.0%}): {', '.join(sorted(result['failed']))}"
+        )
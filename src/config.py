@@ -8,12 +8,169 @@ CONFIG = {
     # 対象リポジトリのパターン
     "repo_pattern": "xxx-api",
     
-    # 取得するリポジトリの上限
-    "repo_limit": 100,
+    # 対象とするリポジトリ数の上限（repo_patternに一致したものを数える。Noneの場合は無制限）
+    "repo_limit": None,
+
+    # リポジトリの探索方法 ("search": search APIで名前・トピックをサーバー側で絞り込む, "list": 一覧APIを全件走査)
+    "repo_discovery": "search",
+
+    # 対象とするリポジトリのトピック（すべてを含むリポジトリのみ対象）
+    "repo_topics": [],
+
+    # アーカイブ済みのリポジトリも対象にするか
+    "include_archived": False,
+
+    # リポジトリ一覧の1ページあたりの件数（最大100）
+    "repo_page_size": 100,
     
     # OpenAPI仕様書の相対パス
     "spec_path": "docs/paths/*.yml",
     
     # 静的サイトの出力先ディレクトリ
     "static_site_dir": "static_site",
+
+    # GitHubへのアクセス方法 ("http": 接続プール付きHTTPクライアント, "gh": ghコマンド)
+    "github_backend": "http",
+
+    # GitHub REST APIのベースURL（GitHub Enterpriseやテスト用スタブサーバーに切り替え可能）
+    "github_api_url": "https://api.github.com",
+
+    # GitHub GraphQL APIのURL（Noneの場合は github_api_url + "/graphql"）
+    "github_graphql_url": None,
+
+    # 仕様書本文の取得方式
+    # "rest": blobごとにREST, "graphql": 複数リポジトリ分をGraphQLでまとめて取得,
+    # "mirror": 既定のブランチだけのローカルのbareクローンを git fetch で更新し git cat-file --batch で読み出す
+    "collect_mode": "rest",
+
+    # mirrorモードのクローン（既定のブランチだけのbareクローン）の保存先、クローン元URL、部分クローンのフィルタ（Noneの場合はblobも取得する）
+    "mirror_cache_dir": ".mirror_cache",
+    "git_clone_url": "https://github.com/{organization}/{repo}.git",
+    "mirror_filter": "blob:none",
+
+    # GraphQLの1クエリで取得するblob数と合計バイト数の上限
+    "graphql_batch_size": 50,
+    "graphql_max_batch_bytes": 2000000,
+
+    # これより大きいblobはGraphQLでは取得せずRESTで取得する
+    "graphql_max_blob_bytes": 500000,
+
+    # HTTPリクエストのタイムアウト秒数
+    "http_timeout": 30,
+
+    # 前回の収集結果を残し、blob SHAが変わった仕様書だけを取得する
+    "incremental_collect": True,
+
+    # 収集マニフェストのファイル名（static_site_dir配下に保存）
+    "manifest_file": ".collect-manifest.json",
+
+    # GitHub APIへの同時リクエスト数の上限（レート制限に応じて自動で下げる）
+    "max_concurrent_requests": 16,
+
+    # 一時的なエラー・レート制限時の再試行回数と指数バックオフの基準/上限秒数
+    "max_retries": 5,
+    "retry_base_delay": 1.0,
+    "retry_max_delay": 60.0,
+
+    # X-RateLimit-Remainingが X-RateLimit-Limit のこの割合以下になったら、そのリソース（core / search / graphql）への
+    # リクエストをリセット時刻まで停止する（最大待機秒数）
+    "rate_limit_min_remaining_ratio": 0.01,
+    "rate_limit_max_wait": 900,
+
+    # 失敗したリポジトリの割合がこれを超えたら静的サイトを生成しない
+    "max_failed_repo_ratio": 0.1,
+
+    # 仕様書から他のファイルへの $ref を解決し、1ファイルで完結する仕様書にしてから埋め込む
+    # 参照先のファイル（spec_pathに一致しないもの）は収集後に取得し、blob SHAを ref_manifest_file に記録する
+    "bundle_refs": True,
+    "ref_manifest_file": ".ref-manifest.json",
+
+    # 仕様書の解析結果を内容のハッシュごとに保存するキャッシュの保存先（Noneの場合は使用しない）と合計サイズの上限
+    "parse_cache_dir": ".parse_cache",
+    "parse_cache_max_bytes": 256 * 1024 * 1024,
+
+    # index.html の出力方式 ("inline": 全仕様書を埋め込む, "split": 仕様書一覧だけを埋め込み、
+    # 各仕様書は static/specs 配下のJSONを表示時に読み込む。HTTPサーバーでの配信が必要)
+    "site_output_mode": "inline",
+
+    # 統合ビューアに埋め込む仕様書の圧縮方式 (None: 圧縮しない, "gzip" / "deflate": 仕様書ごとに圧縮して
+    # Base64で埋め込み、表示時にブラウザの DecompressionStream で展開する)
+    "viewer_payload_compression": None,
+
+    # 統合ビューアで、複数の仕様書に同じ内容でコピーされている components を1つにまとめて埋め込むか
+    "viewer_dedupe_components": False,
+
+    # watchコマンドで変更を確認する間隔（秒）
+    "watch_interval": 1.0,
+
+    # 仕様書・パス・操作・パラメータ・スキーマ・プロパティを全文検索できるSQLiteのカタログ
+    # （static_site_dir配下に保存し、queryコマンドで検索する。Noneの場合は作成しない）
+    "catalog_db_file": ".catalog.sqlite",
+
+    # 収集ごとの仕様書の差分（allでは収集後、diffコマンドで単独でも実行する）
+    # diff_state_dir: 前回の仕様書のMerkleハッシュとJSONの保存先（static_site_dirを削除しても残るよう外に置く）
+    # changelog_file: static_site_dir配下に書き出す変更履歴の名前（<名前>.json と <名前>.html）
+    # changelog_max_runs: 変更履歴に残す実行（変更のあったもの）の数
+    "diff_state_dir": ".spec_diff",
+    "changelog_file": "changelog",
+    "changelog_max_runs": 20,
+
+    # serveコマンドの待ち受けアドレスとポート
+    "serve_host": "127.0.0.1",
+    "serve_port": 8000,
+
+    # serveコマンドで応答（JSON化・圧縮済みの内容）をメモリに保持する合計サイズの上限（バイト）
+    # この1/8より大きいファイルは、圧縮した本文を static_site_dir/.serve_cache に保存する
+    "serve_cache_max_bytes": 64 * 1024 * 1024,
+
+    # serveコマンドの起動時に静的ファイルと仕様書一覧を圧縮しておく（Falseの場合は最初の要求時に圧縮する）
+    "serve_precompress": True,
+
+    # 段階・リポジトリ・仕様書ごとの所要時間とAPIリクエスト数などの計測結果の出力先
+    # metrics_file: static_site_dir配下に保存するJSON（Noneの場合は出力しない）
+    # metrics_textfile: node_exporter の textfile collector 向けのPrometheus形式のファイル（Noneの場合は出力しない）
+    "metrics_file": ".run-metrics.json",
+    "metrics_textfile": None,
+
+    # --profile を指定した場合にcProfileの結果を保存するファイル
+    "profile_file": "openapispec.prof",
+
+    # 仕様書の解析・JSON化に使うプロセス数（1: 逐次処理, None: CPU数）
+    "build_workers": 1,
+
+    # ビルド時に埋め込む外部アセット（バージョンはURLで固定）
+    # 内容は integrity（sha384-...）と照合する。integrityを指定しない場合は vendor_lock_file に記録した値と照合し、
+    # どちらにもない場合や一致しない場合はビルドが失敗する
+    "vendor_assets": {
+        "swagger_ui_css": {
+            "url": "https://cdn.jsdelivr.net/npm/swagger-ui-dist@5.17.14/swagger-ui.css",
+            "integrity": None,
+        },
+        "swagger_ui_js": {
+            "url": "https://cdn.jsdelivr.net/npm/swagger-ui-dist@5.17.14/swagger-ui-bundle.js",
+            "integrity": None,
+        },
+        "redoc_js": {
+            "url": "https://cdn.jsdelivr.net/npm/redoc@2.0.0/bundles/redoc.standalone.js",
+            "integrity": None,
+        },
+    },
+
+    # vendor --lock で取得した外部アセットのintegrityを記録するファイル（リポジトリにコミットする）
+    "vendor_lock_file": "vendor_assets.lock.json",
+
+    # コンパイル済みのテンプレート（Jinja2のバイトコード）の保存先（Noneの場合はディスクに保存しない）
+    "template_cache_dir": ".template_cache",
+
+    # 外部アセットのキャッシュの保存先
+    "vendor_cache_dir": ".vendor_cache",
+
+    # Trueの場合、ビルド時に外部アセットを取得せずキャッシュだけを使う（事前に vendor コマンドを実行する）
+    "vendor_offline": False,
+
+    # 同時に処理するリポジトリ数の上限
+    "max_concurrent_repos": 8,
+
+    # 同時に取得する仕様書ファイル数の上限（全リポジトリ合計）
+    "max_concurrent_files": 16,
 }
\ No newline at end of file
@@ -1,39 +1,163 @@
+import re
 import json
 import subprocess
 import base64
 import logging
 from pathlib import Path
 from src.config import CONFIG
+from src.github_client import get_http_backend
+from src.spec_glob import compile_spec_pattern
+from src.scheduler import get_scheduler, RetryableError
+from src.metrics import span, increment
 
 logger = logging.getLogger('openapispec-collector')
 
+GH_RETRYABLE_ERROR = re.compile(r"HTTP (429|5\d\d)|rate limit|timeout|connection reset", re.IGNORECASE)
+
+def _run_gh_subprocess(command):
+    try:
+        result = subprocess.run(command, capture_output=True, text=True, check=True)
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        if e.stderr and GH_RETRYABLE_ERROR.search(e.stderr):
+            raise RetryableError(
+                e.stderr.strip(),
+                rate_limited="rate limit" in e.stderr.lower() or "HTTP 429" in e.stderr,
+            ) from e
+        raise
+
 def run_gh_command(command):
     """
     ghコマンドを実行する関数
+    レート制限や一時的なエラーは共有スケジューラーで再試行する
     """
     logger.info(f"実行: {' '.join(command)}")
     try:
-        result = subprocess.run(command, capture_output=True, text=True, check=True)
-        return result.stdout
-    except subprocess.CalledProcessError as e:
+        api = "graphql" if command[2:3] == ["graphql"] else "rest"
+        output = get_scheduler().execute(lambda: _run_gh_subprocess(command), "graphql" if api == "graphql" else "core")
+        increment("github_api_requests", backend="gh", api=api)
+        increment("github_downloaded_bytes", len(output.encode("utf-8")) if output else 0, backend="gh")
+        return output
+    except (subprocess.CalledProcessError, RetryableError) as e:
+        increment("github_api_errors", backend="gh")
         logger.error(f"コマンド実行エラー: {e}")
-        logger.error(f"エラー出力: {e.stderr}")
+        logger.error(f"エラー出力: {getattr(e, 'stderr', e)}")
         raise
 
-def get_api_repositories():
+class GhCliBackend:
     """
-    GitHub上のxxx-apiというパターンに一致するリポジトリ一覧を取得
+    ghコマンドを都度起動してGitHub APIにアクセスするフォールバック用バックエンド
+    """
+
+    def iter_repository_pages(self, owner, name_filter="", topics=(), include_archived=False,
+                              per_page=100, discovery="search"):
+        """
+        gh repo list は名前で絞り込めずページ単位の取得もできないため、
+        トピックとアーカイブ状態だけをサーバー側で絞り込んだ結果を1ページとして返す
+        """
+        command = [
+            "gh", "repo", "list",
+            owner,
+            "--json", "name",
+            "--limit", str(CONFIG.get("gh_repo_list_limit", 1000))
+        ]
+        for topic in topics:
+            command.extend(["--topic", topic])
+        if not include_archived:
+            command.append("--no-archived")
+        output = run_gh_command(command)
+        yield [repo["name"] for repo in json.loads(output)]
+
+    def list_tree(self, owner, repo_name, ref="HEAD", etag=None):
+        """
+        ghコマンドでは条件付きリクエストを使わないため、ETagは常にNone
+        """
+        command = [
+            "gh", "api",
+            f"/repos/{owner}/{repo_name}/git/trees/{ref}?recursive=1",
+            "--jq", ".tree[] | select(.type == \"blob\") | [.path, .sha, .size] | @tsv"
+        ]
+        output = run_gh_command(command)
+        entries = []
+        for line in output.splitlines():
+            if line.strip():
+                path, sha, size = line.rstrip("\n").split("\t")
+                entries.append({"path": path, "sha": sha, "size": int(size) if size else None})
+        return entries, None
+
+    def fetch_blob(self, owner, repo_name, sha):
+        command = [
+            "gh", "api",
+            f"/repos/{owner}/{repo_name}/git/blobs/{sha}",
+            "--jq", ".content"
+        ]
+        encoded_content = run_gh_command(command)
+        return base64.b64decode(encoded_content).decode('utf-8')
+
+    def graphql(self, query, variables=None):
+        command = ["gh", "api", "graphql", "-f", f"query={query}"]
+        for name, value in (variables or {}).items():
+            command.extend(["-F", f"{name}={value}"])
+        payload = json.loads(run_gh_command(command))
+        for error in payload.get("errors") or []:
+            logger.warning(f"GraphQLエラー: {error.get('message')}")
+        return payload.get("data") or {}
+
+    def get_file_content(self, owner, repo_name, file_path):
+        file_command = [
+            "gh", "api",
+            f"/repos/{owner}/{repo_name}/contents/{file_path}",
+            "--jq", ".content"
+        ]
+        encoded_content = run_gh_command(file_command)
+        if not encoded_content:
+            return ""
+        return base64.b64decode(encoded_content.strip()).decode('utf-8')
+
+def get_backend():
+    """
+    CONFIG["github_backend"]に応じてGitHubアクセス用のバックエンドを返す
+    """
+    backend = CONFIG.get("github_backend", "http")
+    if backend == "gh":
+        return GhCliBackend()
+    if backend == "http":
+        return get_http_backend()
+    raise ValueError(f"未対応のgithub_backendです: {backend}")
+
+def iter_api_repositories():
+    """
+    repo_patternに一致するリポジトリ名をページ単位で取得しながら1件ずつ返すジェネレーター
+    呼び出し側は次のページの取得を待たずに、先に返されたリポジトリの処理を始められる
     """
     logger.info("APIリポジトリの取得を開始します")
-    command = [
-        "gh", "repo", "list",
+    limit = CONFIG.get("repo_limit")
+    pattern = CONFIG["repo_pattern"]
+    seen = set()
+    pages = get_backend().iter_repository_pages(
         CONFIG["organization"],
-        "--json", "name",
-        "--limit", str(CONFIG["repo_limit"])
-    ]
-    output = run_gh_command(command)
-    repos = json.loads(output)
-    api_repos = [repo["name"] for repo in repos if CONFIG["repo_pattern"] in repo["name"]]
+        name_filter=pattern,
+        topics=CONFIG.get("repo_topics") or (),
+        include_archived=CONFIG.get("include_archived", False),
+        per_page=int(CONFIG.get("repo_page_size", 100)),
+        discovery=CONFIG.get("repo_discovery", "search"),
+    )
+    for page_number, page in enumerate(pages, 1):
+        # search APIの名前検索は単語単位の一致のため、部分一致はここで確認する
+        matched = [name for name in page if pattern in name and name not in seen]
+        logger.info(f"リポジトリ一覧 {page_number}ページ目: {len(page)}件中{len(matched)}件が対象です")
+        for name in matched:
+            seen.add(name)
+            yield name
+            if limit and len(seen) >= limit:
+                logger.info(f"repo_limit({limit})に達したためリポジトリの取得を終了します")
+                return
+
+def get_api_repositories():
+    """
+    GitHub上のxxx-apiというパターンに一致するリポジトリ一覧を取得
+    """
+    api_repos = list(iter_api_repositories())
     logger.info(f"{len(api_repos)}個のAPIリポジトリが見つかりました")
     return api_repos
 
@@ -42,17 +166,11 @@ def fetch_openapi_spec(repo_name):
     指定されたリポジトリからOpenAPI仕様書を取得
     """
     logger.info(f"{repo_name}からOpenAPI仕様書を取得します")
-    command = [
-        "gh", "api",
-        f"/repos/{CONFIG['organization']}/{repo_name}/contents/{CONFIG['spec_path']}",
-        "--jq", ".content"
-    ]
     try:
-        encoded_content = run_gh_command(command)
-        if not encoded_content:
+        content = get_backend().get_file_content(CONFIG['organization'], repo_name, CONFIG['spec_path'])
+        if not content:
             logger.warning(f"{repo_name}の仕様書が見つかりませんでした")
             return None
-        content = base64.b64decode(encoded_content).decode('utf-8')
         static_site_dir = Path(CONFIG["static_site_dir"])
         repo_dir = static_site_dir / repo_name
         repo_dir.mkdir(exist_ok=True, parents=True)
@@ -65,54 +183,163 @@ def fetch_openapi_spec(repo_name):
         logger.error(f"{repo_name}の仕様書取得中にエラーが発生しました: {e}")
         return None
 
-def fetch_openapi_specs(repo_name):
+def resolve_spec_blobs(repo_name, backend=None, manifest=None):
+    """
+    リポジトリのHEADのツリーを1回のリクエストで取得し、spec_pathのglobに一致するblobの一覧を返す
+    戻り値は {"path", "sha", "size"} のリスト（パス順）
+    manifestを渡すと前回のツリーのETagで条件付きリクエストを送り、304なら前回の一覧を使い回す
+    """
+    backend = backend or get_backend()
+    cached = manifest.get_tree(repo_name) if manifest is not None else None
+    if cached and cached.get("spec_path") != CONFIG["spec_path"]:
+        cached = None
+    tree, etag = backend.list_tree(CONFIG['organization'], repo_name, etag=cached and cached["etag"])
+    if tree is None:
+        logger.info(f"{repo_name}のツリーに変更がないため前回の一覧を使います")
+        return [dict(blob) for blob in cached["blobs"]]
+    matches = compile_spec_pattern(CONFIG["spec_path"])
+    blobs = sorted((entry for entry in tree if matches(entry["path"])), key=lambda entry: entry["path"])
+    if manifest is not None:
+        manifest.record_tree(repo_name, etag, spec_path=CONFIG["spec_path"], blobs=blobs)
+    return blobs
+
+def fetch_spec_blob(backend, repo_name, blob, manifest=None, content=None):
+    """
+    1ファイル分の仕様書をblob SHAで取得して static_site 配下に保存する
+    manifestのblob SHAと一致するファイルは取得しない
+    contentに取得済みの本文（GraphQLでまとめて取得したものなど）を渡すとRESTでの取得を省略する
+    """
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    spec_file = static_site_dir / repo_name / blob["path"]
+    if manifest is not None and manifest.is_current(repo_name, blob["path"], blob["sha"]):
+        logger.info(f"{repo_name}/{blob['path']} は変更がないため取得をスキップします")
+        manifest.record(repo_name, blob["path"], blob["sha"], fetched=False)
+        increment("collected_files", result="unchanged")
+        return spec_file
+    if content is None:
+        with span("fetch_spec", repo=repo_name, spec=blob["path"]):
+            content = backend.fetch_blob(CONFIG['organization'], repo_name, blob["sha"])
+    if not content:
+        logger.warning(f"{repo_name}/{blob['path']} の仕様書が見つかりませんでした")
+        return None
+    spec_file.parent.mkdir(exist_ok=True, parents=True)
+    with open(spec_file, "w", encoding='utf-8') as f:
+        f.write(content)
+    if manifest is not None:
+        manifest.record(repo_name, blob["path"], blob["sha"])
+    increment("collected_files", result="fetched")
+    logger.info(f"{repo_name}/{blob['path']} の仕様書を正常に取得しました: {spec_file}")
+    return spec_file
+
+def fetch_openapi_specs(repo_name, executor=None, raise_errors=False, manifest=None):
     """
     指定されたリポジトリからspec_pathで指定されたパターンに一致するYAMLファイルをすべて取得し、
     それぞれを独立したAPI仕様書として保存する
     保存先は static_site/リポジトリ名/パス/ファイル名.yml
+    executorを渡すとファイル取得をそのスレッドプールで並行実行する（結果はパス順を維持）
+    raise_errors=Trueの場合はエラーを握りつぶさずに送出する
+    manifestを渡すと変更のあるファイルだけを取得し、上流で削除されたファイルを削除する
     """
-    import re
-    import requests
     logger.info(f"{repo_name}からOpenAPI仕様書群を取得します")
-    spec_pattern = CONFIG["spec_path"]  # 例: docs/*.yml, docs/path/*.yml
-    if "/" in spec_pattern:
-        dir_part, file_pattern = spec_pattern.rsplit("/", 1)
-    else:
-        dir_part, file_pattern = "", spec_pattern
-    # パターンを正規表現に変換
-    regex_pattern = re.escape(file_pattern).replace(r"\*", ".*") + "$"
-    command = [
-        "gh", "api",
-        f"/repos/{CONFIG['organization']}/{repo_name}/contents/{dir_part}",
-        "--jq", f".[] | select(.name | test(\"{regex_pattern}\")) | .name"
-    ]
+    with span("collect_repo", repo=repo_name):
+        return _fetch_openapi_specs(repo_name, executor, raise_errors, manifest)
+
+def _fetch_openapi_specs(repo_name, executor, raise_errors, manifest):
     try:
-        output = run_gh_command(command)
-        yml_files = [line.strip() for line in output.splitlines() if line.strip()]
-        if not yml_files:
-            logger.warning(f"{repo_name}/{dir_part}に{file_pattern}に一致するYAMLファイルが見つかりませんでした")
+        backend = get_backend()
+        blobs = resolve_spec_blobs(repo_name, backend, manifest)
+        if manifest is not None:
+            manifest.retain(repo_name, [blob["path"] for blob in blobs])
+        if not blobs:
+            logger.warning(f"{repo_name}に{CONFIG['spec_path']}に一致するYAMLファイルが見つかりませんでした")
             return []
-        static_site_dir = Path(CONFIG["static_site_dir"])
-        saved_files = []
-        for yml_file in yml_files:
-            spec_file = static_site_dir / repo_name / dir_part / yml_file
-            spec_file.parent.mkdir(exist_ok=True, parents=True)
-            file_command = [
-                "gh", "api",
-                f"/repos/{CONFIG['organization']}/{repo_name}/contents/{dir_part}/{yml_file}",
-                "--jq", ".content"
-            ]
-            print(f"[DEBUG] file_command: {file_command}")
-            encoded_content = run_gh_command(file_command)
-            if not encoded_content:
-                logger.warning(f"{repo_name}/{dir_part}/{yml_file} の仕様書が見つかりませんでした")
-                continue
-            content = base64.b64decode(encoded_content.strip()).decode('utf-8')
-            with open(spec_file, "w", encoding='utf-8') as f:
-                f.write(content)
-            logger.info(f"{repo_name}/{dir_part}/{yml_file} の仕様書を正常に取得しました: {spec_file}")
-            saved_files.append(spec_file)
-        return saved_files
+        if executor is None:
+            results = [fetch_spec_blob(backend, repo_name, blob, manifest) for blob in blobs]
+        else:
+            futures = [executor.submit(fetch_spec_blob, backend, repo_name, blob, manifest) for blob in blobs]
+            results = [future.result() for future in futures]
+        return [spec_file for spec_file in results if spec_file]
     except Exception as e:
         logger.error(f"{repo_name}の仕様書群取得中にエラーが発生しました: {e}")
+        if raise_errors:
+            raise
         return []
+
+def plan_graphql_batches(items):
+    """
+    (リポジトリ名, blob) のリストをGraphQLの1クエリで取得する単位に分割する
+    graphql_max_blob_bytesを超えるblobはGraphQLでは取得せず、2つ目の戻り値としてRESTに回す
+    """
+    max_objects = max(1, int(CONFIG.get("graphql_batch_size", 50)))
+    max_bytes = int(CONFIG.get("graphql_max_batch_bytes", 2_000_000))
+    max_blob_bytes = int(CONFIG.get("graphql_max_blob_bytes", 500_000))
+    batches = []
+    oversized = []
+    batch = []
+    batch_bytes = 0
+    for repo_name, blob in items:
+        size = blob.get("size") or 0
+        if size > max_blob_bytes:
+            oversized.append((repo_name, blob))
+            continue
+        if batch and (len(batch) >= max_objects or batch_bytes + size > max_bytes):
+            batches.append(batch)
+            batch = []
+            batch_bytes = 0
+        batch.append((repo_name, blob))
+        batch_bytes += size
+    if batch:
+        batches.append(batch)
+    return batches, oversized
+
+def build_blob_query(batch):
+    """
+    複数リポジトリのblobを object(expression: "HEAD:path") で取得するクエリを組み立てる
+    戻り値はクエリ文字列と、エイリアス (rN, fM) から (リポジトリ名, パス) への対応表
+    """
+    repos = {}
+    for repo_name, blob in batch:
+        repos.setdefault(repo_name, []).append(blob)
+    lines = ["query {"]
+    aliases = {}
+    for repo_index, (repo_name, blobs) in enumerate(repos.items()):
+        lines.append(
+            f"  r{repo_index}: repository(owner: {json.dumps(CONFIG['organization'])}, name: {json.dumps(repo_name)}) {{"
+        )
+        for file_index, blob in enumerate(blobs):
+            expression = json.dumps(f"HEAD:{blob['path']}")
+            lines.append(
+                f"    f{file_index}: object(expression: {expression}) {{ ... on Blob {{ oid text isBinary isTruncated }} }}"
+            )
+            aliases[(f"r{repo_index}", f"f{file_index}")] = (repo_name, blob["path"])
+        lines.append("  }")
+    lines.append("}")
+    return "\n".join(lines), aliases
+
+def fetch_blob_texts_graphql(batch, backend=None):
+    """
+    1回のGraphQLクエリでbatchのblob本文を取得し {(リポジトリ名, パス): 本文} を返す
+    取得できなかったもの（切り詰め・バイナリ・エラー）や、ツリーの取得後にHEADが進んで
+    oidがツリーのblob SHAと一致しないものは結果に含めず、呼び出し側でRESTに回す
+    """
+    backend = backend or get_backend()
+    query, aliases = build_blob_query(batch)
+    try:
+        with span("graphql_batch"):
+            data = backend.graphql(query)
+    except Exception as e:
+        logger.warning(f"GraphQLでの一括取得に失敗したためRESTで取得します ({len(batch)}件): {e}")
+        return {}
+    shas = {(repo_name, blob["path"]): blob["sha"] for repo_name, blob in batch}
+    texts = {}
+    for (repo_alias, file_alias), key in aliases.items():
+        blob = (data.get(repo_alias) or {}).get(file_alias)
+        if not blob or blob.get("isBinary") or blob.get("isTruncated") or blob.get("text") is None:
+            logger.info(f"{key[0]}/{key[1]} はGraphQLで取得できなかったためRESTで取得します")
+            continue
+        if blob.get("oid") != shas[key]:
+            logger.info(f"{key[0]}/{key[1]} はGraphQLで取得したblob ({blob.get('oid')}) がツリーのblob SHAと異なるためRESTで取得します")
+            continue
+        texts[key] = blob["text"]
+    logger.info(f"GraphQLで {len(texts)}/{len(batch)} 件の仕様書を取得しました")
+    return texts
@@ -0,0 +1,190 @@
+import shutil
+import logging
+import subprocess
+from pathlib import Path
+from src.config import CONFIG
+from src.spec_glob import compile_spec_pattern
+
+logger = logging.getLogger('openapispec-collector')
+
+def run_git_command(args, git_dir=None, input_text=None):
+    """
+    gitコマンドを実行して標準出力を返す
+    """
+    command = ["git"] + (["--git-dir", str(git_dir)] if git_dir else []) + args
+    logger.info(f"実行: {' '.join(command)}")
+    try:
+        result = subprocess.run(command, capture_output=True, check=True, input=input_text)
+        return result.stdout
+    except subprocess.CalledProcessError as e:
+        logger.error(f"コマンド実行エラー: {e}")
+        logger.error(f"エラー出力: {e.stderr.decode('utf-8', 'replace')}")
+        raise
+
+def get_mirror_dir(repo_name):
+    return Path(CONFIG.get("mirror_cache_dir", ".mirror_cache")) / f"{repo_name}.git"
+
+def get_clone_url(repo_name):
+    template = CONFIG.get("git_clone_url", "https://github.com/{organization}/{repo}.git")
+    return template.format(organization=CONFIG["organization"], repo=repo_name)
+
+def update_mirror(repo_name):
+    """
+    リポジトリの既定のブランチだけを持つbareクローンを作成または git fetch で最新化し、そのディレクトリを返す
+    （--mirror ではプルリクエストなどすべての参照を取得してしまうため使わない）
+    mirror_filterを指定するとblobを持たない部分クローンとして作成する
+    """
+    mirror_dir = get_mirror_dir(repo_name)
+    if (mirror_dir / "HEAD").exists():
+        if _is_full_mirror(mirror_dir):
+            # 以前の git clone --mirror で作成したものは、既定のブランチだけのクローンに作り直す
+            logger.info(f"{repo_name}のミラーを既定のブランチだけのクローンに作り直します")
+            shutil.rmtree(mirror_dir)
+        else:
+            head_ref = run_git_command(["symbolic-ref", "HEAD"], git_dir=mirror_dir).decode("utf-8").strip()
+            # bareクローンには取得する参照の設定がないため、リモートの既定のブランチを明示して取得する
+            run_git_command(["fetch", "--quiet", "--no-tags", "origin", f"+HEAD:{head_ref}"], git_dir=mirror_dir)
+            return mirror_dir
+    mirror_dir.parent.mkdir(exist_ok=True, parents=True)
+    args = ["clone", "--bare", "--single-branch", "--no-tags", "--quiet"]
+    if CONFIG.get("mirror_filter"):
+        args.append(f"--filter={CONFIG['mirror_filter']}")
+    run_git_command(args + [get_clone_url(repo_name), str(mirror_dir)])
+    return mirror_dir
+
+def _is_full_mirror(mirror_dir):
+    output = run_git_command(["config", "--bool", "--default", "false", "remote.origin.mirror"], git_dir=mirror_dir)
+    return output.strip() == b"true"
+
+def list_mirror_blobs(mirror_dir):
+    """
+    ミラーのHEADのツリーを再帰的に列挙し、{"path", "sha", "size"} のリストで返す
+    """
+    output = run_git_command(["ls-tree", "-r", "-z", "HEAD"], git_dir=mirror_dir)
+    blobs = []
+    for record in output.decode("utf-8").split("\0"):
+        if not record:
+            continue
+        meta, path = record.split("\t", 1)
+        _, object_type, sha = meta.split()
+        if object_type == "blob":
+            blobs.append({"path": path, "sha": sha, "size": None})
+    return blobs
+
+def find_missing_blobs(mirror_dir, shas):
+    """
+    部分クローンに存在しないblobを返す（調べるのは渡したSHAだけで、クローン全体は列挙しない）
+    cat-file --batch-check は存在しないblobを1つずつ取得してしまうため、
+    取得しない rev-list --missing=print に標準入力でSHAを渡し、存在するblobだけを出力させる
+    """
+    if not shas:
+        return []
+    output = run_git_command(
+        ["rev-list", "--objects", "--no-walk", "--missing=print", "--ignore-missing", "--stdin"],
+        git_dir=mirror_dir,
+        input_text=("\n".join(shas) + "\n").encode("ascii"),
+    )
+    present = {
+        line.split(" ", 1)[0] for line in output.decode("utf-8").splitlines()
+        if line and not line.startswith("?")
+    }
+    return [sha for sha in shas if sha not in present]
+
+def prefetch_missing_blobs(mirror_dir, shas):
+    """
+    部分クローンに存在しないblobを1回の git fetch でまとめて取得する
+    （cat-fileに任せるとblobごとに個別のfetchが走るため）
+    """
+    wanted = find_missing_blobs(mirror_dir, shas)
+    if not wanted:
+        return 0
+    run_git_command(
+        ["-c", "fetch.negotiationAlgorithm=noop", "fetch", "origin", "--no-tags", "--no-write-fetch-head",
+         "--recurse-submodules=no", f"--filter={CONFIG.get('mirror_filter') or 'blob:none'}", "--stdin"],
+        git_dir=mirror_dir,
+        input_text=("\n".join(wanted) + "\n").encode("ascii"),
+    )
+    return len(wanted)
+
+class CatFileBatch:
+    """
+    1つの git cat-file --batch プロセスで複数のblobを順に読み出す
+    """
+
+    def __init__(self, mirror_dir):
+        self.process = subprocess.Popen(
+            ["git", "--git-dir", str(mirror_dir), "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+        )
+
+    def read(self, sha):
+        self.process.stdin.write(f"{sha}\n".encode("ascii"))
+        self.process.stdin.flush()
+        header = self.process.stdout.readline().decode("ascii").split()
+        if len(header) < 3 or header[1] == "missing":
+            return None
+        content = self.process.stdout.read(int(header[2]))
+        self.process.stdout.read(1)
+        return content
+
+    def close(self):
+        self.process.stdin.close()
+        self.process.wait()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+def fetch_openapi_specs_from_mirror(repo_name, executor=None, raise_errors=False, manifest=None):
+    """
+    fetch_openapi_specs() と同じ static_site/リポジトリ名/パス の構成で、
+    ローカルのbareミラーから仕様書を取得する
+    blobの読み出しはリポジトリごとに1つの cat-file --batch プロセスで行うため、executorは使用しない
+    """
+    logger.info(f"{repo_name}のミラーからOpenAPI仕様書群を取得します")
+    try:
+        mirror_dir = update_mirror(repo_name)
+        matches = compile_spec_pattern(CONFIG["spec_path"])
+        blobs = sorted(
+            (blob for blob in list_mirror_blobs(mirror_dir) if matches(blob["path"])),
+            key=lambda blob: blob["path"],
+        )
+        if manifest is not None:
+            manifest.retain(repo_name, [blob["path"] for blob in blobs])
+        if not blobs:
+            logger.warning(f"{repo_name}に{CONFIG['spec_path']}に一致するYAMLファイルが見つかりませんでした")
+            return []
+        static_site_dir = Path(CONFIG["static_site_dir"])
+        pending = [
+            blob for blob in blobs
+            if manifest is None or not manifest.is_current(repo_name, blob["path"], blob["sha"])
+        ]
+        if pending and CONFIG.get("mirror_filter"):
+            prefetch_missing_blobs(mirror_dir, [blob["sha"] for blob in pending])
+        saved_files = []
+        with CatFileBatch(mirror_dir) as cat_file:
+            for blob in blobs:
+                spec_file = static_site_dir / repo_name / blob["path"]
+                if blob not in pending:
+                    manifest.record(repo_name, blob["path"], blob["sha"], fetched=False)
+                    saved_files.append(spec_file)
+                    continue
+                content = cat_file.read(blob["sha"])
+                if content is None:
+                    logger.warning(f"{repo_name}/{blob['path']} のblobがミラーに見つかりませんでした")
+                    continue
+                spec_file.parent.mkdir(exist_ok=True, parents=True)
+                spec_file.write_bytes(content)
+                if manifest is not None:
+                    manifest.record(repo_name, blob["path"], blob["sha"])
+                logger.info(f"{repo_name}/{blob['path']} の仕様書をミラーから取得しました: {spec_file}")
+                saved_files.append(spec_file)
+        return saved_files
+    except Exception as e:
+        logger.error(f"{repo_name}のミラーからの仕様書取得中にエラーが発生しました: {e}")
+        if raise_errors:
+            raise
+        return []
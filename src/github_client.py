@@ -0,0 +1,236 @@
+import os
+import logging
+import subprocess
+import threading
+from src.config import CONFIG
+from src.scheduler import get_scheduler
+from src.metrics import increment
+
+logger = logging.getLogger('openapispec-collector')
+
+# search APIで取得できる検索結果の上限
+SEARCH_RESULT_LIMIT = 1000
+
+def resolve_github_token():
+    """
+    GitHub APIのトークンを取得する
+    環境変数 GITHUB_TOKEN / GH_TOKEN を優先し、なければ gh auth token を一度だけ試す
+    """
+    for name in ("GITHUB_TOKEN", "GH_TOKEN"):
+        if os.environ.get(name):
+            return os.environ[name]
+    try:
+        result = subprocess.run(["gh", "auth", "token"], capture_output=True, text=True, check=True)
+        return result.stdout.strip() or None
+    except (OSError, subprocess.CalledProcessError):
+        logger.warning("GitHubトークンが見つかりませんでした。未認証でAPIにアクセスします")
+        return None
+
+def http_error():
+    """
+    requests.HTTPError を返す（送信済みでrequestsは読み込まれているため、ここで読み込んでも遅くならない）
+    """
+    import requests
+    return requests.HTTPError
+
+class HttpBackend:
+    """
+    requests.Sessionの接続プールを使ってGitHub REST APIへ直接アクセスするバックエンド
+    ファイル本体は raw メディアタイプで取得するためbase64のデコードは不要
+    requestsは変更のない collect などの起動を速くするため、最初のリクエストを送る時に読み込む
+    """
+
+    def __init__(self, base_url, token=None, pool_size=10, timeout=30, graphql_url=None):
+        self.base_url = base_url.rstrip("/")
+        self.graphql_url = graphql_url or f"{self.base_url}/graphql"
+        self.timeout = timeout
+        self.token = token
+        self.pool_size = pool_size
+        self._session = None
+        self._session_lock = threading.Lock()
+
+    @property
+    def session(self):
+        """
+        接続プール付きの requests.Session（最初に使う時に作る）
+        """
+        if self._session is not None:
+            return self._session
+        with self._session_lock:
+            if self._session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                session.headers.update({
+                    "Accept": "application/vnd.github+json",
+                    "X-GitHub-Api-Version": "2022-11-28",
+                    "User-Agent": "openapispec-collector",
+                })
+                if self.token:
+                    session.headers["Authorization"] = f"Bearer {self.token}"
+                self._session = session
+            return self._session
+
+    def _send(self, send, resource="core"):
+        """
+        レート制限に応じた送信タイミングの調整と再試行は共有スケジューラーに任せる
+        """
+        return get_scheduler().execute(send, resource)
+
+    def request(self, path, params=None, headers=None, resource="core"):
+        """
+        GETリクエストを送信し、エラー時は例外を送出する
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        logger.info(f"実行: GET {url}")
+        response = self._send(lambda: self.session.get(url, params=params, headers=headers, timeout=self.timeout), resource)
+        increment("github_api_requests", backend="http", api="rest", status=response.status_code)
+        increment("github_downloaded_bytes", len(response.content), backend="http")
+        if response.status_code >= 400:
+            logger.error(f"APIリクエストエラー: {response.status_code} {url}")
+            logger.error(f"エラー出力: {response.text[:500]}")
+            response.raise_for_status()
+        return response
+
+    def get_json(self, path, params=None, resource="core"):
+        return self.request(path, params=params, resource=resource).json()
+
+    def get_raw(self, path):
+        """
+        rawメディアタイプで取得し本文を返す
+        """
+        response = self.request(path, headers={"Accept": "application/vnd.github.raw"})
+        response.encoding = "utf-8"
+        return response.text
+
+    def graphql(self, query, variables=None):
+        """
+        GraphQLクエリを送信してdataを返す（部分的なエラーは警告としてログに出す）
+        """
+        logger.info(f"実行: POST {self.graphql_url} ({len(query)} 文字)")
+        response = self._send(lambda: self.session.post(
+            self.graphql_url,
+            json={"query": query, "variables": variables or {}},
+            timeout=self.timeout,
+        ), "graphql")
+        increment("github_api_requests", backend="http", api="graphql", status=response.status_code)
+        increment("github_downloaded_bytes", len(response.content), backend="http")
+        if response.status_code >= 400:
+            logger.error(f"GraphQLリクエストエラー: {response.status_code} {self.graphql_url}")
+            logger.error(f"エラー出力: {response.text[:500]}")
+            response.raise_for_status()
+        payload = response.json()
+        for error in payload.get("errors") or []:
+            logger.warning(f"GraphQLエラー: {error.get('message')}")
+        return payload.get("data") or {}
+
+    def _iter_listing_pages(self, owner, topics, include_archived, per_page):
+        """
+        組織（見つからなければユーザー）のリポジトリ一覧をページごとに取得する
+        一覧APIは名前で絞り込めないため、トピックとアーカイブ状態だけをここで判定する
+        """
+        endpoint = f"/orgs/{owner}/repos"
+        page = 1
+        while True:
+            try:
+                repos = self.get_json(endpoint, params={"per_page": per_page, "page": page, "type": "all"})
+            except http_error() as e:
+                if e.response is not None and e.response.status_code == 404 and endpoint.startswith("/orgs/"):
+                    endpoint = f"/users/{owner}/repos"
+                    continue
+                raise
+            yield [
+                repo["name"] for repo in repos
+                if (include_archived or not repo.get("archived"))
+                and set(topics) <= set(repo.get("topics") or [])
+            ]
+            if len(repos) < per_page:
+                return
+            page += 1
+
+    def iter_repository_pages(self, owner, name_filter="", topics=(), include_archived=False,
+                              per_page=100, discovery="search"):
+        """
+        リポジトリ名をページ単位で返すジェネレーター
+        discovery="search" では名前・トピック・アーカイブ状態をsearch APIのクエリでサーバー側に絞り込む
+        検索結果がsearch APIの上限(1000件)を超える場合は一覧APIに切り替える
+        """
+        if discovery != "search":
+            yield from self._iter_listing_pages(owner, topics, include_archived, per_page)
+            return
+        qualifiers = [f"org:{owner}"]
+        if name_filter:
+            qualifiers.append(f"{name_filter} in:name")
+        qualifiers.extend(f"topic:{topic}" for topic in topics)
+        if not include_archived:
+            qualifiers.append("archived:false")
+        page = 1
+        while True:
+            try:
+                result = self.get_json("/search/repositories", params={
+                    "q": " ".join(qualifiers), "per_page": per_page, "page": page,
+                }, resource="search")
+            except http_error() as e:
+                if page == 1 and qualifiers[0].startswith("org:") and e.response is not None and e.response.status_code == 422:
+                    qualifiers[0] = f"user:{owner}"
+                    continue
+                raise
+            if page == 1 and result.get("total_count", 0) > SEARCH_RESULT_LIMIT:
+                logger.warning(
+                    f"検索結果が{result['total_count']}件あり search API の上限を超えるため、一覧APIで取得します"
+                )
+                yield from self._iter_listing_pages(owner, topics, include_archived, per_page)
+                return
+            items = result.get("items", [])
+            yield [item["name"] for item in items]
+            if len(items) < per_page or page * per_page >= result.get("total_count", 0):
+                return
+            page += 1
+
+    def list_tree(self, owner, repo_name, ref="HEAD", etag=None):
+        """
+        refのGitツリーを再帰的に1回のリクエストで取得し、blobを {"path", "sha", "size"} のリストで返す
+        戻り値は (blobのリスト, ETag)。etagを指定して304が返った場合、blobのリストはNoneになる
+        """
+        headers = {"If-None-Match": etag} if etag else None
+        response = self.request(f"/repos/{owner}/{repo_name}/git/trees/{ref}", params={"recursive": "1"}, headers=headers)
+        if response.status_code == 304:
+            return None, etag
+        tree = response.json()
+        if tree.get("truncated"):
+            logger.warning(f"{repo_name}のツリーが大きすぎるため一部のみ取得されました")
+        blobs = [
+            {"path": entry["path"], "sha": entry["sha"], "size": entry.get("size")}
+            for entry in tree.get("tree", []) if entry.get("type") == "blob"
+        ]
+        # 切り詰められたツリーは次回も取得し直す
+        return blobs, None if tree.get("truncated") else response.headers.get("ETag")
+
+    def fetch_blob(self, owner, repo_name, sha):
+        return self.get_raw(f"/repos/{owner}/{repo_name}/git/blobs/{sha}")
+
+    def get_file_content(self, owner, repo_name, file_path):
+        return self.get_raw(f"/repos/{owner}/{repo_name}/contents/{file_path}")
+
+_backend_lock = threading.Lock()
+_http_backends = {}
+
+def get_http_backend():
+    """
+    設定ごとに1つのHttpBackendを共有し、接続を再利用する
+    """
+    base_url = CONFIG.get("github_api_url", "https://api.github.com")
+    with _backend_lock:
+        if base_url not in _http_backends:
+            pool_size = int(CONFIG.get("max_concurrent_repos", 1)) + int(CONFIG.get("max_concurrent_files", 1))
+            _http_backends[base_url] = HttpBackend(
+                base_url,
+                token=resolve_github_token(),
+                pool_size=pool_size,
+                timeout=CONFIG.get("http_timeout", 30),
+                graphql_url=CONFIG.get("github_graphql_url"),
+            )
+        return _http_backends[base_url]
@@ -0,0 +1,127 @@
+import json
+import logging
+import threading
+from pathlib import Path
+from src.config import CONFIG
+
+logger = logging.getLogger('openapispec-collector')
+
+MANIFEST_VERSION = 2
+
+def get_manifest_path():
+    return Path(CONFIG["static_site_dir"]) / CONFIG.get("manifest_file", ".collect-manifest.json")
+
+class CollectManifest:
+    """
+    収集済み仕様書のリポジトリ・パス・blob SHAと、リポジトリごとのツリーのETagを記録するマニフェスト
+    specsのキーは static_site からの相対パス（リポジトリ名/ファイルパス）、treesのキーはリポジトリ名
+    複数スレッドから更新されるため操作はロックで保護する
+    """
+
+    def __init__(self, path, specs=None, trees=None):
+        self.path = Path(path)
+        self.specs = specs or {}
+        self.trees = trees or {}
+        self.lock = threading.Lock()
+        self.stats = {"fetched": 0, "unchanged": 0, "removed": 0}
+
+    @classmethod
+    def load(cls, path=None):
+        path = Path(path) if path else get_manifest_path()
+        if not path.exists():
+            return cls(path)
+        try:
+            with open(path, "r", encoding='utf-8') as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                logger.warning(f"マニフェストのバージョンが異なるため破棄します: {path}")
+                return cls(path)
+            return cls(path, data.get("specs", {}), data.get("trees", {}))
+        except Exception as e:
+            logger.warning(f"マニフェストの読み込みに失敗したため全件を再取得します: {path}, エラー: {e}")
+            return cls(path)
+
+    def save(self):
+        self.path.parent.mkdir(exist_ok=True, parents=True)
+        with self.lock:
+            data = {
+                "version": MANIFEST_VERSION,
+                "specs": dict(sorted(self.specs.items())),
+                "trees": dict(sorted(self.trees.items())),
+            }
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(data, f, ensure_ascii=False, indent=1)
+        tmp_path.replace(self.path)
+
+    def get(self, repo_name, file_path):
+        with self.lock:
+            return self.specs.get(f"{repo_name}/{file_path}")
+
+    def blobs(self, repo_name):
+        """
+        repo_nameについて記録したファイルを {パス: {"path", "sha"}} で返す
+        """
+        with self.lock:
+            return {
+                entry["path"]: {"path": entry["path"], "sha": entry["sha"]}
+                for entry in self.specs.values() if entry["repo"] == repo_name
+            }
+
+    def is_current(self, repo_name, file_path, sha):
+        """
+        SHAが記録と一致し、ローカルにファイルが残っていればTrue
+        """
+        entry = self.get(repo_name, file_path)
+        if not entry or not sha or entry.get("sha") != sha:
+            return False
+        return (self.path.parent / repo_name / file_path).exists()
+
+    def record(self, repo_name, file_path, sha, fetched=True):
+        with self.lock:
+            self.specs[f"{repo_name}/{file_path}"] = {
+                "repo": repo_name,
+                "path": file_path,
+                "sha": sha,
+            }
+            self.stats["fetched" if fetched else "unchanged"] += 1
+
+    def get_tree(self, repo_name):
+        with self.lock:
+            return self.trees.get(repo_name)
+
+    def record_tree(self, repo_name, etag, **fields):
+        """
+        ツリーのETagを記録する（ETagがない場合は記録を消し、次回は条件なしで取得する）
+        fieldsには304の時に使い回す内容（一致したblobの一覧など）を指定する
+        """
+        with self.lock:
+            if etag:
+                self.trees[repo_name] = {"etag": etag, **fields}
+            else:
+                self.trees.pop(repo_name, None)
+
+    def retain(self, repo_name, file_paths, keep_repos=None):
+        """
+        repo_nameについてfile_paths以外の記録とファイルを削除する
+        repo_nameにNoneを指定するとkeep_reposに含まれないリポジトリの記録をすべて削除する
+        """
+        file_paths = set(file_paths)
+        with self.lock:
+            stale = [
+                key for key, entry in self.specs.items()
+                if (repo_name is not None and entry["repo"] == repo_name and entry["path"] not in file_paths)
+                or (repo_name is None and entry["repo"] not in keep_repos)
+            ]
+            for key in stale:
+                del self.specs[key]
+                self.stats["removed"] += 1
+            if repo_name is None:
+                for stale_repo in [repo for repo in self.trees if repo not in keep_repos]:
+                    del self.trees[stale_repo]
+        for key in stale:
+            spec_file = self.path.parent / key
+            if spec_file.exists():
+                logger.info(f"上流で削除された仕様書を削除します: {spec_file}")
+                spec_file.unlink()
+        return stale
@@ -0,0 +1,207 @@
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from src.config import CONFIG
+
+logger = logging.getLogger('openapispec-collector')
+
+# Prometheusのメトリクス名の接頭辞
+METRIC_PREFIX = "openapispec"
+
+# 仕様書ごとのラベルはJSONにだけ出力する（Prometheusでは系列が増えすぎるため合計する）
+PROMETHEUS_DROPPED_LABELS = ("spec",)
+
+def _label_key(labels):
+    return tuple(sorted((name, str(value)) for name, value in labels.items()))
+
+class RunMetrics:
+    """
+    1回の実行の計測結果をスレッド間で共有して集計する
+    spansは (名前, ラベル) ごとの区間の回数・合計秒数・最大秒数、countersは (名前, ラベル) ごとの合計値
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.started = time.time()
+        self.spans = {}
+        self.counters = {}
+
+    def observe(self, name, seconds, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            span = self.spans.setdefault(key, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+            span["count"] += 1
+            span["seconds"] += seconds
+            span["max_seconds"] = max(span["max_seconds"], seconds)
+
+    def increment(self, name, value=1, **labels):
+        key = (name, _label_key(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + value
+
+    def take(self):
+        """
+        集計結果を (spans, counters) で返して空にする（プロセスプールの各プロセスから親に渡すため）
+        """
+        with self.lock:
+            spans, counters = self.spans, self.counters
+            self.spans, self.counters = {}, {}
+        return spans, counters
+
+    def merge(self, taken):
+        spans, counters = taken
+        with self.lock:
+            for key, other in spans.items():
+                span = self.spans.setdefault(key, {"count": 0, "seconds": 0.0, "max_seconds": 0.0})
+                span["count"] += other["count"]
+                span["seconds"] += other["seconds"]
+                span["max_seconds"] = max(span["max_seconds"], other["max_seconds"])
+            for key, value in counters.items():
+                self.counters[key] = self.counters.get(key, 0) + value
+
+    def span_seconds(self, name, **labels):
+        """
+        名前が一致し、指定したラベルをすべて持つ区間の合計秒数を返す
+        """
+        with self.lock:
+            return sum(
+                span["seconds"] for (span_name, key), span in self.spans.items()
+                if span_name == name and set(_label_key(labels)) <= set(key)
+            )
+
+    def counter_value(self, name, **labels):
+        with self.lock:
+            return sum(
+                value for (counter_name, key), value in self.counters.items()
+                if counter_name == name and set(_label_key(labels)) <= set(key)
+            )
+
+    def to_dict(self):
+        with self.lock:
+            spans = [
+                {"name": name, "labels": dict(key), "count": span["count"],
+                 "seconds": round(span["seconds"], 6), "max_seconds": round(span["max_seconds"], 6)}
+                for (name, key), span in sorted(self.spans.items())
+            ]
+            counters = [
+                {"name": name, "labels": dict(key), "value": value}
+                for (name, key), value in sorted(self.counters.items())
+            ]
+        return {
+            "started": self.started,
+            "elapsed_seconds": round(time.time() - self.started, 6),
+            "spans": spans,
+            "counters": counters,
+        }
+
+    def to_prometheus(self):
+        """
+        node_exporter の textfile collector 形式にする
+        区間は <接頭辞>_<名前>_seconds_total / _count / _seconds_max、カウンターは <接頭辞>_<名前>_total
+        """
+        data = self.to_dict()
+        series = {}
+        for item in data["spans"]:
+            labels = {name: value for name, value in item["labels"].items() if name not in PROMETHEUS_DROPPED_LABELS}
+            key = _label_key(labels)
+            base = f"{METRIC_PREFIX}_{item['name']}"
+            for suffix, value, merge in (
+                ("_seconds_total", item["seconds"], sum),
+                ("_count", item["count"], sum),
+                ("_seconds_max", item["max_seconds"], max),
+            ):
+                metric = series.setdefault(base + suffix, {"type": "gauge" if merge is max else "counter", "values": {}})
+                values = metric["values"]
+                values[key] = merge([values[key], value]) if key in values else value
+        for item in data["counters"]:
+            labels = {name: value for name, value in item["labels"].items() if name not in PROMETHEUS_DROPPED_LABELS}
+            key = _label_key(labels)
+            metric = series.setdefault(f"{METRIC_PREFIX}_{item['name']}_total", {"type": "counter", "values": {}})
+            metric["values"][key] = metric["values"].get(key, 0) + item["value"]
+        lines = []
+        for name, metric in sorted(series.items()):
+            lines.append(f"# TYPE {name} {metric['type']}")
+            for key, value in sorted(metric["values"].items()):
+                label_text = ",".join(f'{label}="{_escape_label(label_value)}"' for label, label_value in key)
+                lines.append(f"{name}{{{label_text}}} {value}" if label_text else f"{name} {value}")
+        lines.append(f"# TYPE {METRIC_PREFIX}_last_run_timestamp_seconds gauge")
+        lines.append(f"{METRIC_PREFIX}_last_run_timestamp_seconds {self.started}")
+        return "\n".join(lines) + "\n"
+
+def _escape_label(value):
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+_metrics_lock = threading.Lock()
+_metrics = None
+
+def get_metrics():
+    """
+    プロセス内で共有するRunMetricsを返す
+    """
+    global _metrics
+    with _metrics_lock:
+        if _metrics is None:
+            _metrics = RunMetrics()
+        return _metrics
+
+def reset_metrics():
+    """
+    計測結果を破棄して新しいRunMetricsを返す
+    """
+    global _metrics
+    with _metrics_lock:
+        _metrics = RunMetrics()
+        return _metrics
+
+@contextmanager
+def span(name, **labels):
+    """
+    with の区間の所要時間を記録する（例外で抜けた場合も記録する）
+    """
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        get_metrics().observe(name, time.perf_counter() - started, **labels)
+
+def increment(name, value=1, **labels):
+    get_metrics().increment(name, value, **labels)
+
+def _atomic_write(path, text):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_file = path.with_name(path.name + ".tmp")
+    with open(tmp_file, "w", encoding='utf-8') as f:
+        f.write(text)
+    # textfile collector が書き込み途中のファイルを読まないよう置き換える
+    tmp_file.replace(path)
+
+def get_metrics_file():
+    name = CONFIG.get("metrics_file")
+    return Path(CONFIG["static_site_dir"]) / name if name else None
+
+def write_metrics_report(metrics=None):
+    """
+    計測結果を metrics_file（JSON）と metrics_textfile（Prometheus形式）に書き出し、段階ごとの所要時間をログに出す
+    """
+    metrics = metrics or get_metrics()
+    stages = ", ".join(
+        f"{item['labels']['stage']} {item['seconds']:.2f}秒"
+        for item in metrics.to_dict()["spans"] if item["name"] == "stage"
+    )
+    if stages:
+        logger.info(
+            f"段階ごとの所要時間: {stages} / APIリクエスト {metrics.counter_value('github_api_requests')}回 "
+            f"({metrics.counter_value('github_downloaded_bytes')} バイト), "
+            f"出力 {metrics.counter_value('rendered_bytes')} バイト"
+        )
+    metrics_file = get_metrics_file()
+    if metrics_file is not None and metrics_file.parent.exists():
+        _atomic_write(metrics_file, json.dumps(metrics.to_dict(), ensure_ascii=False, indent=2) + "\n")
+        logger.info(f"計測結果を保存しました: {metrics_file}")
+    textfile = CONFIG.get("metrics_textfile")
+    if textfile:
+        _atomic_write(Path(textfile), metrics.to_prometheus())
+        logger.info(f"計測結果をPrometheus形式で保存しました: {textfile}")
@@ -0,0 +1,129 @@
+import os
+import time
+import pickle
+import hashlib
+import logging
+import threading
+from pathlib import Path
+import yaml
+from src.config import CONFIG
+
+logger = logging.getLogger('openapispec-collector')
+
+# libyamlが使える環境ではCで実装されたローダーを使う
+YAML_LOADER = getattr(yaml, "CSafeLoader", yaml.SafeLoader)
+
+# キャッシュの形式を変えたらキーが変わるように更新する
+PARSE_CACHE_VERSION = 2
+
+def load_yaml(content):
+    """
+    yaml.safe_load と同じ結果を、可能であればlibyamlで高速に返す
+    """
+    return yaml.load(content, Loader=YAML_LOADER)
+
+class ParseCache:
+    """
+    仕様書の解析結果を内容のハッシュをキーにしてpickleで保存するキャッシュ
+    合計サイズが max_bytes を超えたら、最後に使われてから時間の経ったものから削除する
+    pickleで保存するため、キャッシュから読み込んだ結果も load_yaml と同じ形（数値のキーや日付を含む）になる
+    キャッシュは仕様書と同じくローカルで作ったものだけを読み込む前提とする
+    """
+
+    def __init__(self, cache_dir, max_bytes=256 * 1024 * 1024):
+        self.cache_dir = Path(cache_dir)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "parse_seconds": 0.0, "saved_seconds": 0.0}
+
+    def _cache_file(self, key):
+        return self.cache_dir / key[:2] / f"{key}.pickle"
+
+    @staticmethod
+    def content_key(content):
+        digest = hashlib.sha256(f"v{PARSE_CACHE_VERSION}:{YAML_LOADER.__name__}\0".encode("utf-8"))
+        digest.update(content.encode("utf-8"))
+        return digest.hexdigest()
+
+    def load(self, content):
+        """
+        contentを解析した結果を返す。キャッシュにあればYAMLの解析を省略する
+        """
+        key = self.content_key(content)
+        cache_file = self._cache_file(key)
+        try:
+            with open(cache_file, "rb") as f:
+                cached = pickle.load(f)
+            os.utime(cache_file)
+            with self.lock:
+                self.stats["hits"] += 1
+                self.stats["saved_seconds"] += cached["parse_seconds"]
+            return cached["data"]
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.warning(f"解析キャッシュを読み込めなかったため再解析します: {cache_file}, エラー: {e}")
+        started = time.perf_counter()
+        data = load_yaml(content)
+        elapsed = time.perf_counter() - started
+        with self.lock:
+            self.stats["misses"] += 1
+            self.stats["parse_seconds"] += elapsed
+        try:
+            encoded = pickle.dumps({"parse_seconds": elapsed, "data": data}, protocol=pickle.HIGHEST_PROTOCOL)
+        except RecursionError:
+            # 入れ子が深すぎる仕様書はキャッシュしない
+            return data
+        self._store(cache_file, encoded)
+        return data
+
+    def _store(self, cache_file, encoded):
+        try:
+            cache_file.parent.mkdir(exist_ok=True, parents=True)
+            tmp_file = cache_file.with_suffix(f".{threading.get_ident()}.tmp")
+            with open(tmp_file, "wb") as f:
+                f.write(encoded)
+            tmp_file.replace(cache_file)
+        except OSError as e:
+            logger.warning(f"解析キャッシュを保存できませんでした: {cache_file}, エラー: {e}")
+
+    def evict(self):
+        """
+        合計サイズが max_bytes 以下になるまで、最終使用日時の古いキャッシュから削除する
+        """
+        if not self.cache_dir.exists():
+            return 0
+        files = []
+        for cache_file in self.cache_dir.glob("*/*.pickle"):
+            try:
+                stat = cache_file.stat()
+            except FileNotFoundError:
+                continue
+            files.append((stat.st_mtime, stat.st_size, cache_file))
+        total = sum(size for _, size, _ in files)
+        removed = 0
+        for _, size, cache_file in sorted(files, key=lambda item: item[0]):
+            if total <= self.max_bytes:
+                break
+            cache_file.unlink(missing_ok=True)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"解析キャッシュを {removed} 件削除しました (残り {total} バイト)")
+        return removed
+
+    def report(self):
+        logger.info(
+            f"解析キャッシュ: ヒット {self.stats['hits']}件, ミス {self.stats['misses']}件, "
+            f"解析時間 {self.stats['parse_seconds']:.2f}秒, 省略した解析時間 {self.stats['saved_seconds']:.2f}秒 "
+            f"(YAMLローダー: {YAML_LOADER.__name__})"
+        )
+
+def get_parse_cache():
+    """
+    設定に従ってParseCacheを作成する。parse_cache_dirがNoneの場合はNoneを返す
+    """
+    cache_dir = CONFIG.get("parse_cache_dir", ".parse_cache")
+    if not cache_dir:
+        return None
+    return ParseCache(cache_dir, int(CONFIG.get("parse_cache_max_bytes", 256 * 1024 * 1024)))
@@ -0,0 +1,226 @@
+import sys
+import time
+import random
+import logging
+import threading
+from src.config import CONFIG
+
+logger = logging.getLogger('openapispec-collector')
+
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+# X-RateLimit-Limit がない応答で想定する上限（REST APIのcoreの上限）
+DEFAULT_RATE_LIMIT = 5000
+
+class RetryableError(Exception):
+    """
+    再試行すべき一時的なエラー（ghコマンドのレート制限など）
+    retry_afterに待機秒数が分かっていれば指定する
+    """
+
+    def __init__(self, message, retry_after=None, rate_limited=False):
+        super().__init__(message)
+        self.retry_after = retry_after
+        self.rate_limited = rate_limited
+
+def retryable_errors():
+    """
+    再試行する例外のクラスを返す
+    requestsはHTTPバックエンドで最初に送信する時に読み込むため、読み込まれていなければその例外も送出されない
+    """
+    requests = sys.modules.get("requests")
+    if requests is None:
+        return (RetryableError,)
+    return (RetryableError, requests.ConnectionError, requests.Timeout)
+
+def _header_float(headers, name):
+    try:
+        return float(headers[name])
+    except (KeyError, TypeError, ValueError):
+        return None
+
+def is_rate_limited(response):
+    """
+    プライマリ/セカンダリレート制限による応答かどうかを判定する
+    """
+    if response.status_code == 429:
+        return True
+    if response.status_code != 403:
+        return False
+    if "Retry-After" in response.headers or response.headers.get("X-RateLimit-Remaining") == "0":
+        return True
+    return "rate limit" in response.text.lower()
+
+class RequestScheduler:
+    """
+    すべてのGitHub APIリクエストが共有するスケジューラー
+    X-RateLimit-Remaining/Reset と Retry-After に応じて同時実行数と送信タイミングを調整し、
+    一時的なエラーはジッター付き指数バックオフで再試行する
+    レート制限はリソース（core / search / graphql など）ごとに上限が異なるため、停止はリソースごとに行い、
+    停止する残り回数の閾値は X-RateLimit-Limit に min_remaining_ratio を掛けて決める
+    """
+
+    def __init__(self, max_concurrency=8, max_retries=5, base_delay=1.0, max_delay=60.0,
+                 min_remaining_ratio=0.01, max_wait=900.0):
+        self.max_concurrency = max(1, max_concurrency)
+        self.limit = self.max_concurrency
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.min_remaining_ratio = min_remaining_ratio
+        self.max_wait = max_wait
+        self.active = 0
+        # リソース -> 停止を解除する時刻（time.monotonic()）
+        self.paused_until = {}
+        self.successes = 0
+        self.stats = {"requests": 0, "retries": 0, "throttled": 0, "failures": 0}
+        self.condition = threading.Condition()
+
+    def _acquire(self, resource):
+        with self.condition:
+            while True:
+                wait = self.paused_until.get(resource, 0.0) - time.monotonic()
+                if wait <= 0 and self.active < self.limit:
+                    self.active += 1
+                    self.stats["requests"] += 1
+                    return
+                self.condition.wait(timeout=wait if wait > 0 else None)
+
+    def _release(self):
+        with self.condition:
+            self.active -= 1
+            self.condition.notify_all()
+
+    def _pause(self, resource, seconds, reason):
+        seconds = min(max(seconds, 0.0), self.max_wait)
+        with self.condition:
+            self.paused_until[resource] = max(self.paused_until.get(resource, 0.0), time.monotonic() + seconds)
+            self.condition.notify_all()
+        logger.warning(f"{reason}: {seconds:.1f}秒間 {resource} へのリクエストを停止します")
+
+    def min_remaining(self, limit):
+        """
+        リクエストを停止する残り回数の閾値（searchの30回のような小さい上限では使い切るまで停止しない）
+        """
+        return int((limit or DEFAULT_RATE_LIMIT) * self.min_remaining_ratio)
+
+    def _throttle(self):
+        """
+        レート制限を受けたら同時実行数を半分にする
+        """
+        with self.condition:
+            self.limit = max(1, self.limit // 2)
+            self.successes = 0
+            self.stats["throttled"] += 1
+        logger.warning(f"レート制限のため同時リクエスト数を {self.limit} に下げます")
+
+    def _on_success(self):
+        """
+        成功が同時実行数分続いたら同時実行数を1つ戻す
+        """
+        with self.condition:
+            self.successes += 1
+            if self.limit < self.max_concurrency and self.successes >= self.limit:
+                self.limit += 1
+                self.successes = 0
+                self.condition.notify_all()
+
+    def _backoff(self, attempt, retry_after=None):
+        delay = random.uniform(0, min(self.max_delay, self.base_delay * (2 ** attempt)))
+        return max(delay, retry_after or 0.0)
+
+    def _observe_rate_limit(self, headers, resource):
+        remaining = _header_float(headers, "X-RateLimit-Remaining")
+        reset = _header_float(headers, "X-RateLimit-Reset")
+        if remaining is None:
+            return
+        resource = headers.get("X-RateLimit-Resource") or resource
+        min_remaining = self.min_remaining(_header_float(headers, "X-RateLimit-Limit"))
+        if remaining <= min_remaining and reset:
+            self._pause(resource, reset - time.time(), f"{resource} のレート制限の残り回数が {int(remaining)} 回です")
+        elif remaining <= min_remaining * 4 and self.limit > 1:
+            with self.condition:
+                self.limit = max(1, self.limit // 2)
+            logger.info(f"レート制限の残り回数が少ないため同時リクエスト数を {self.limit} に下げます")
+
+    def execute(self, send, resource="core"):
+        """
+        send()を実行し、結果を返す
+        resourceはレート制限のリソース（応答の X-RateLimit-Resource があればそちらを使う）
+        send()はrequests.Responseを返すか、一時的な失敗ではRetryableErrorや接続エラーを送出する
+        再試行しても成功しない場合は最後の応答を返すか例外を送出する
+        """
+        attempt = 0
+        while True:
+            self._acquire(resource)
+            try:
+                result = send()
+                error = None
+            except retryable_errors() as e:
+                result = None
+                error = e
+            finally:
+                self._release()
+            if error is None and not hasattr(result, "status_code"):
+                self._on_success()
+                return result
+            if error is None:
+                self._observe_rate_limit(result.headers, resource)
+                rate_limited = is_rate_limited(result)
+                if not rate_limited and result.status_code not in RETRY_STATUS_CODES:
+                    self._on_success()
+                    return result
+                retry_after = _header_float(result.headers, "Retry-After")
+                if retry_after is None and rate_limited and result.headers.get("X-RateLimit-Remaining") == "0":
+                    reset = _header_float(result.headers, "X-RateLimit-Reset")
+                    retry_after = reset - time.time() if reset else None
+                reason = f"HTTP {result.status_code}"
+            else:
+                rate_limited = getattr(error, "rate_limited", False)
+                retry_after = getattr(error, "retry_after", None)
+                reason = str(error)
+            if attempt >= self.max_retries:
+                with self.condition:
+                    self.stats["failures"] += 1
+                logger.error(f"{self.max_retries}回再試行しましたが失敗しました: {reason}")
+                if error is not None:
+                    raise error
+                return result
+            delay = self._backoff(attempt, retry_after)
+            if rate_limited:
+                self._throttle()
+                self._pause(resource, delay, f"レート制限を受けました ({reason})")
+            else:
+                logger.warning(f"一時的なエラーのため {delay:.1f}秒後に再試行します ({attempt + 1}/{self.max_retries}): {reason}")
+                time.sleep(delay)
+            with self.condition:
+                self.stats["retries"] += 1
+            attempt += 1
+
+_scheduler_lock = threading.Lock()
+_scheduler = None
+
+def get_scheduler():
+    """
+    プロセス内で共有するRequestSchedulerを返す
+    """
+    global _scheduler
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = RequestScheduler(
+                max_concurrency=int(CONFIG.get("max_concurrent_requests", 16)),
+                max_retries=int(CONFIG.get("max_retries", 5)),
+                base_delay=float(CONFIG.get("retry_base_delay", 1.0)),
+                max_delay=float(CONFIG.get("retry_max_delay", 60.0)),
+                min_remaining_ratio=float(CONFIG.get("rate_limit_min_remaining_ratio", 0.01)),
+                max_wait=float(CONFIG.get("rate_limit_max_wait", 900.0)),
+            )
+        return _scheduler
+
+def reset_scheduler():
+    """
+    設定を変更した後などに共有スケジューラーを作り直す
+    """
+    global _scheduler
+    with _scheduler_lock:
+        _scheduler = None
@@ -0,0 +1,302 @@
+import re
+import logging
+from bisect import bisect_left
+from collections import defaultdict
+
+logger = logging.getLogger('openapispec-collector')
+
+SEARCH_INDEX_VERSION = 1
+
+# 検索スコアの重み（一致した項目ごとに加算する）
+SEARCH_FIELD_WEIGHTS = {
+    "title": 100,
+    "path": 80,
+    "operation_id": 70,
+    "summary": 60,
+    "schema": 60,
+    "tag": 50,
+    "description": 50,
+    "property": 50,
+    "operation_description": 40,
+    "schema_description": 40,
+    "version": 30,
+    "property_description": 30,
+}
+
+SEARCH_METHODS = ("get", "post", "put", "delete", "patch")
+
+# 1つの項目シャードに入れる項目数
+ITEMS_PER_SHARD = 1000
+
+WORD_PATTERN = re.compile(r"[^\W_]+")
+CJK_PATTERN = re.compile(r"[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+")
+CAMEL_PATTERN = re.compile(r"[A-Z]+(?![a-z])|[A-Z]?[a-z]+|[0-9]+")
+
+def tokenize(text):
+    """
+    索引に登録する語の集合を返す
+    英数字は単語全体とキャメルケースの各部分（2文字以上）、日本語は2文字ずつのn-gramにする
+    検索語は search.js の tokenizeQuery() で同じ規則で分割し、前方一致で照合する
+    """
+    terms = set()
+    for word in WORD_PATTERN.findall(text):
+        for part in CJK_PATTERN.split(word):
+            for term in [part] + CAMEL_PATTERN.findall(part):
+                term = term.lower()
+                if len(term) >= 2:
+                    terms.add(term)
+        for run in CJK_PATTERN.findall(word):
+            if len(run) == 1:
+                terms.add(run)
+            terms.update(run[i:i + 2] for i in range(len(run) - 1))
+    return terms
+
+def shard_key(term):
+    """
+    語の先頭文字から語シャードの名前を決める（search.js の searchShardKey() と同じ規則）
+    """
+    first = term[0]
+    if first.isascii() and first.isalnum():
+        return first
+    return "x" + format(ord(first) % 16, "x")
+
+class SearchIndexBuilder:
+    """
+    仕様書ごとの検索項目と、語 -> (仕様書, 重み, 項目) の転置索引を組み立てる
+    仕様書を差し替える場合（watchコマンド）は、古い項目をNoneにして新しい項目を末尾に追加し、
+    他の仕様書の番号を変えないことで変更のあるシャードだけを書き出せるようにする
+    """
+
+    def __init__(self):
+        self.specs = []
+        self.items = []
+        self.postings = defaultdict(set)
+        # 仕様書のパス -> 仕様書の番号、仕様書の番号 -> 登録した項目の番号・語
+        self.spec_indexes = {}
+        self.spec_items = defaultdict(list)
+        self.spec_terms = defaultdict(set)
+
+    def add_item(self, spec_index, field, text, item):
+        """
+        検索結果に表示する項目を追加し、textを field の重みで索引に登録する
+        itemは [パス, 値, スニペットの元になる文字列, HTTPメソッド(, オペレーション一覧)]
+        """
+        item_index = len(self.items)
+        self.items.append(item)
+        self.spec_items[spec_index].append(item_index)
+        self.index_text(spec_index, item_index, field, text)
+        return item_index
+
+    def index_text(self, spec_index, item_index, field, text):
+        if not isinstance(text, str) or not text:
+            return
+        weight = SEARCH_FIELD_WEIGHTS[field]
+        for term in tokenize(text):
+            self.postings[term].add((spec_index, weight, item_index))
+            self.spec_terms[spec_index].add(term)
+
+    def remove_spec(self, path):
+        """
+        仕様書の項目と語の出現位置を取り除く（仕様書の番号は空けたままにする）
+        """
+        spec_index = self.spec_indexes.pop(path, None)
+        if spec_index is None:
+            return
+        for term in self.spec_terms.pop(spec_index, ()):
+            postings = {posting for posting in self.postings[term] if posting[0] != spec_index}
+            if postings:
+                self.postings[term] = postings
+            else:
+                del self.postings[term]
+        for item_index in self.spec_items.pop(spec_index, ()):
+            self.items[item_index] = None
+        self.specs[spec_index] = None
+
+    def add_spec(self, entry):
+        data = entry.data
+        self.remove_spec(entry.path)
+        spec_index = len(self.specs)
+        self.spec_indexes[entry.path] = spec_index
+        info = data.get("info") if isinstance(data.get("info"), dict) else {}
+        description = info.get("description") if isinstance(info.get("description"), str) else ""
+        self.specs.append([entry.path, entry.title, entry.repo, description[:150] + ("..." if len(description) > 150 else "")])
+        self.add_item(spec_index, "title", entry.title, ["info.title", entry.title, entry.title, ""])
+        if description:
+            self.add_item(spec_index, "description", description, ["info.description", description, description, ""])
+        if info.get("version") is not None:
+            version = str(info["version"])
+            self.add_item(spec_index, "version", version, ["info.version", version, f"バージョン: {version}", ""])
+        paths = data.get("paths") if isinstance(data.get("paths"), dict) else {}
+        for path, path_item in paths.items():
+            if not isinstance(path_item, dict):
+                continue
+            operations = [
+                (method, operation) for method, operation in path_item.items()
+                if method in SEARCH_METHODS and isinstance(operation, dict)
+            ]
+            summaries = [
+                [method.upper(), operation.get("summary") or "", operation.get("operationId") or ""]
+                for method, operation in operations
+            ]
+            self.add_item(spec_index, "path", path, [f"paths.{path}", path, f"エンドポイント: {path}", "", summaries])
+            for method, operation in operations:
+                method_upper = method.upper()
+                label = operation.get("summary") or operation.get("operationId") or f"{method_upper} 操作"
+                item_index = self.add_item(
+                    spec_index, "summary", operation.get("summary"),
+                    [f"paths.{path}.{method}", f"{method_upper} {path}", label, method_upper],
+                )
+                self.index_text(spec_index, item_index, "operation_id", operation.get("operationId"))
+                self.index_text(spec_index, item_index, "operation_description", operation.get("description"))
+                for tag in operation.get("tags") or []:
+                    self.index_text(spec_index, item_index, "tag", tag)
+        components = data.get("components") if isinstance(data.get("components"), dict) else {}
+        schemas = components.get("schemas") if isinstance(components.get("schemas"), dict) else {}
+        for schema_name, schema in schemas.items():
+            schema = schema if isinstance(schema, dict) else {}
+            prefix = f"components.schemas.{schema_name}"
+            self.add_item(spec_index, "schema", schema_name, [prefix, schema_name, f"スキーマ: {schema_name}", ""])
+            if isinstance(schema.get("description"), str):
+                self.add_item(
+                    spec_index, "schema_description", schema["description"],
+                    [f"{prefix}.description", schema["description"], f"{schema_name}: {schema['description']}", ""],
+                )
+            properties = schema.get("properties") if isinstance(schema.get("properties"), dict) else {}
+            for prop_name, prop in properties.items():
+                prop = prop if isinstance(prop, dict) else {}
+                self.add_item(
+                    spec_index, "property", prop_name,
+                    [f"{prefix}.properties.{prop_name}", prop_name, f"{schema_name}.{prop_name}: {prop.get('type') or 'any'}", ""],
+                )
+                if isinstance(prop.get("description"), str):
+                    self.add_item(
+                        spec_index, "property_description", prop["description"],
+                        [f"{prefix}.properties.{prop_name}.description", prop["description"],
+                         f"{schema_name}.{prop_name}: {prop['description']}", ""],
+                    )
+
+    def build(self):
+        """
+        シャードの名前 -> 内容 の辞書を返す
+        index: 仕様書一覧と語シャードの一覧, terms-<先頭文字>: 語と出現位置, items-<番号>: 検索結果に表示する項目
+        """
+        term_shards = defaultdict(dict)
+        for term in sorted(self.postings):
+            term_shards[f"terms-{shard_key(term)}"][term] = [
+                value for posting in sorted(self.postings[term]) for value in posting
+            ]
+        shards = {
+            "index": {
+                "version": SEARCH_INDEX_VERSION,
+                "itemsPerShard": ITEMS_PER_SHARD,
+                "specs": self.specs,
+                "termShards": sorted(term_shards),
+            }
+        }
+        for name, terms in sorted(term_shards.items()):
+            shards[name] = {"terms": list(terms), "postings": list(terms.values())}
+        for start in range(0, len(self.items), ITEMS_PER_SHARD):
+            shards[f"items-{start // ITEMS_PER_SHARD}"] = self.items[start:start + ITEMS_PER_SHARD]
+        return shards
+
+def build_search_index(catalog, entries=None):
+    """
+    カタログの仕様書から検索索引のシャードを作成する
+    同じカタログから index.html と統合ビューアを生成する場合に備えて結果をカタログに保持する
+    entriesを渡すとカタログの代わりにそれを順に登録する（解析しながら索引を作る場合）
+    """
+    if catalog.search_index is not None:
+        return catalog.search_index
+    builder = SearchIndexBuilder()
+    for entry in catalog if entries is None else entries:
+        if entry.parsed and isinstance(entry.data, dict):
+            builder.add_spec(entry)
+    catalog.search_builder = builder
+    catalog.search_index = builder.build()
+    logger.info(
+        f"検索索引を作成しました: 仕様書 {len(builder.specs)}件, 語 {len(builder.postings)}件, "
+        f"項目 {len(builder.items)}件, シャード {len(catalog.search_index)}件"
+    )
+    return catalog.search_index
+
+def tokenize_query(query):
+    """
+    検索語を search.js の tokenizeQuery() と同じ規則で分割する（出現順で重複なし）
+    """
+    tokens = []
+    def add(token):
+        if token not in tokens:
+            tokens.append(token)
+    for word in WORD_PATTERN.findall(query.lower()):
+        for part in CJK_PATTERN.split(word):
+            if len(part) >= 2:
+                add(part)
+        for run in CJK_PATTERN.findall(word):
+            if len(run) == 1:
+                add(run)
+            for i in range(len(run) - 1):
+                add(run[i:i + 2])
+    return tokens
+
+class SearchIndexReader:
+    """
+    SearchIndexBuilder の索引をサーバー側で検索する（serveコマンドの検索API）
+    search.js の searchAllSpecs() と同じ規則で照合・スコア付けし、項目は索引のまま返す
+    """
+
+    def __init__(self, builder):
+        self.builder = builder
+        self.terms = sorted(builder.postings)
+
+    def token_hits(self, token):
+        """
+        tokenで前方一致する語の出現位置を集め、仕様書 -> (項目 -> 重み) で返す
+        """
+        hits = {}
+        seen = set()
+        for term in self.terms[bisect_left(self.terms, token):]:
+            if not term.startswith(token):
+                break
+            for spec_index, weight, item_index in sorted(self.builder.postings[term]):
+                if (item_index, weight) in seen:
+                    continue
+                seen.add((item_index, weight))
+                items = hits.setdefault(spec_index, {})
+                items[item_index] = items.get(item_index, 0) + weight
+        return hits
+
+    def search(self, query, max_matches=15):
+        query = query.strip()
+        tokens = tokenize_query(query) if len(query) >= 2 else []
+        if not tokens:
+            return []
+        spec_hits = None
+        for token in tokens:
+            token_hits = self.token_hits(token)
+            if spec_hits is None:
+                spec_hits = token_hits
+                continue
+            for spec_index in list(spec_hits):
+                if spec_index not in token_hits:
+                    del spec_hits[spec_index]
+                    continue
+                items = spec_hits[spec_index]
+                for item_index, weight in token_hits[spec_index].items():
+                    items[item_index] = items.get(item_index, 0) + weight
+        results = []
+        for spec_index, items in spec_hits.items():
+            spec_path, title, repo, description = self.builder.specs[spec_index]
+            ranked = sorted(items.items(), key=lambda hit: (-hit[1], hit[0]))
+            matches = [self.builder.items[item_index] for item_index, _ in ranked]
+            results.append({
+                "specPath": spec_path,
+                "title": title,
+                "repo": repo,
+                "description": description,
+                "matches": matches[:max_matches],
+                "totalMatches": len(matches),
+                "titleMatch": any(item[0] == "info.title" for item in matches),
+                "queryScore": sum(weight for _, weight in ranked),
+            })
+        results.sort(key=lambda result: -result["queryScore"])
+        return results
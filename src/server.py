@@ -0,0 +1,472 @@
+import gzip
+import json
+import time
+import hashlib
+import logging
+import mimetypes
+import threading
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import parse_qs, unquote, urlsplit
+from src.config import CONFIG
+from src.catalog import SpecCatalog
+from src.catalog_db import ITEM_KINDS, query_catalog_db, get_catalog_db_path
+from src.metrics import increment
+from src.parse_cache import get_parse_cache
+from src.search_index import SearchIndexBuilder, SearchIndexReader
+
+try:
+    import brotli
+except ImportError:
+    # brotliは任意の依存パッケージ（requirements.txtには含めない）。ない環境ではgzipだけを用意する
+    brotli = None
+
+logger = logging.getLogger('openapispec-collector')
+
+# これより小さい応答は圧縮しない
+MIN_COMPRESS_BYTES = 1024
+
+COMPRESSIBLE_TYPES = ("text/", "application/json", "application/javascript", "image/svg+xml")
+
+# 応答キャッシュの上限のこの割合（1/LARGE_FILE_RATIO）より大きいファイルは、本文をメモリに保持しない
+LARGE_FILE_RATIO = 8
+
+# 大きいファイルを圧縮した本文の保存先（static_site_dir配下。隠しディレクトリのため配信しない）
+SERVE_VARIANTS_DIR = ".serve_cache"
+
+# Accept-Encodingで同じ優先度の場合に選ぶ順
+COMPRESSORS = {"gzip": lambda body: gzip.compress(body, 9, mtime=0)}
+if brotli is not None:
+    COMPRESSORS = {"br": lambda body: brotli.compress(body, quality=11), **COMPRESSORS}
+
+def content_type_for(path):
+    content_type = mimetypes.guess_type(path.name)[0] or "application/octet-stream"
+    if content_type.startswith("text/") or content_type in ("application/json", "application/javascript"):
+        content_type += "; charset=utf-8"
+    return content_type
+
+class CachedResponse:
+    """
+    応答の本文と、圧縮した本文を符号化方式ごとに保持する
+    ETagは圧縮前の本文のSHA-256から作る強いETagで、圧縮した本文には符号化方式を付けた別のETagを使う
+    圧縮はクライアントが受け付ける符号化方式だけ、最初に必要になったときに1回だけ行う
+    （serveコマンドでは SpecServer.precompress() で起動時にすべての符号化方式を作っておく）
+    """
+
+    def __init__(self, body, content_type, status=200):
+        self.status = status
+        self.content_type = content_type
+        self.body = body
+        self.length = len(body)
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        # 符号化方式 -> 圧縮した本文（圧縮しても小さくならなかった場合はNone）
+        self.variants = {}
+        self.lock = threading.Lock()
+        # 圧縮した本文を追加したときに、増えたバイト数を応答キャッシュに伝える
+        self.on_grow = None
+
+    @property
+    def size(self):
+        return self.length + sum(len(variant) for variant in self.variants.values() if variant is not None)
+
+    @property
+    def compressible(self):
+        return self.length >= MIN_COMPRESS_BYTES and self.content_type.startswith(COMPRESSIBLE_TYPES)
+
+    def etag(self, encoding):
+        return f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+
+    def negotiate(self, accept_encoding):
+        """
+        Accept-Encodingに応じて (符号化方式, ETag) を返す（本文は圧縮しない）
+        """
+        candidates = []
+        if self.compressible:
+            accepted = parse_accept_encoding(accept_encoding)
+            candidates = [
+                encoding for encoding in COMPRESSORS
+                if self.variants.get(encoding, True) is not None and accepted.get(encoding, accepted.get("*", 0)) > 0
+            ]
+        if candidates:
+            encoding = max(candidates, key=lambda name: accepted.get(name, accepted.get("*", 0)))
+        else:
+            encoding = "identity"
+        return encoding, self.etag(encoding)
+
+    def select(self, accept_encoding):
+        """
+        Accept-Encodingに応じて (符号化方式, 本文, ETag) を返す
+        """
+        encoding, _ = self.negotiate(accept_encoding)
+        return self.encoded(encoding)
+
+    def encoded(self, encoding):
+        """
+        符号化方式の (符号化方式, 本文, ETag) を返す。圧縮しても小さくならない場合は圧縮しない本文を返す
+        """
+        if encoding != "identity":
+            body = self.compressed(encoding)
+            if body is not None:
+                return encoding, body, self.etag(encoding)
+        return "identity", self.read(), self.etag("identity")
+
+    def read(self):
+        return self.body
+
+    def compressed(self, encoding):
+        with self.lock:
+            if encoding not in self.variants:
+                compressed = COMPRESSORS[encoding](self.read())
+                self.variants[encoding] = compressed if len(compressed) < self.length else None
+                if self.variants[encoding] is not None and self.on_grow is not None:
+                    self.on_grow(len(compressed))
+            return self.variants[encoding]
+
+class FileResponse(CachedResponse):
+    """
+    メモリに保持するには大きいファイルの応答
+    本文は都度ファイルから読み、圧縮した本文は variants_dir に保存して次回以降（再起動後も）使う
+    メモリにはETagなどだけを保持するため、304の確認では本文を読まない
+    """
+
+    def __init__(self, file_path, content_type, variants_dir):
+        self.file_path = Path(file_path)
+        digest = hashlib.sha256()
+        with open(self.file_path, "rb") as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b""):
+                digest.update(chunk)
+        super().__init__(b"", content_type)
+        self.length = self.file_path.stat().st_size
+        self.digest = digest.hexdigest()[:32]
+        self.variants_dir = Path(variants_dir)
+        # 同じファイルの古い内容を圧縮したものを見つけて消せるよう、パスのハッシュを名前の先頭に付ける
+        self.name_prefix = hashlib.sha256(str(self.file_path).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def size(self):
+        return 0
+
+    def read(self):
+        return self.file_path.read_bytes()
+
+    def variant_path(self, encoding, digest=None):
+        return self.variants_dir / f"{self.name_prefix}-{digest or self.digest}.{encoding}"
+
+    def compressed(self, encoding):
+        with self.lock:
+            if encoding not in self.variants:
+                variant_path = self.variant_path(encoding)
+                if not variant_path.exists():
+                    compressed = COMPRESSORS[encoding](self.read())
+                    # 小さくならない場合は空のファイルで記録する
+                    body = compressed if len(compressed) < self.length else b""
+                    self.variants_dir.mkdir(exist_ok=True, parents=True)
+                    for stale in self.variants_dir.glob(f"{self.name_prefix}-*.{encoding}"):
+                        stale.unlink(missing_ok=True)
+                    temp_path = variant_path.with_suffix(f".{encoding}.tmp")
+                    temp_path.write_bytes(body)
+                    temp_path.replace(variant_path)
+                self.variants[encoding] = variant_path if variant_path.stat().st_size else None
+            variant_path = self.variants[encoding]
+        return variant_path.read_bytes() if variant_path is not None else None
+
+def json_response(data, status=200):
+    return CachedResponse(json.dumps(data, ensure_ascii=False).encode("utf-8"), "application/json; charset=utf-8", status)
+
+def error_response(status, message):
+    return json_response({"error": message}, status)
+
+def parse_accept_encoding(header):
+    """
+    Accept-Encodingを 符号化方式 -> q値 の辞書にする
+    """
+    accepted = {}
+    for part in (header or "").split(","):
+        name, _, params = part.strip().partition(";")
+        if not name:
+            continue
+        quality = 1.0
+        for param in params.split(";"):
+            key, _, value = param.strip().partition("=")
+            if key == "q":
+                try:
+                    quality = float(value)
+                except ValueError:
+                    quality = 0.0
+        accepted[name.strip().lower()] = quality
+    return accepted
+
+def etag_matches(if_none_match, etag):
+    if if_none_match is None:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # If-None-Match は弱い比較で照合する
+    return any(tag.strip().removeprefix("W/") == etag for tag in if_none_match.split(","))
+
+class ResponseCache:
+    """
+    応答を合計サイズの上限まで保持し、上限を超えたら最後に使われた日時の古いものから捨てる
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        self.responses = OrderedDict()
+        self.total_bytes = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key):
+        with self.lock:
+            response = self.responses.get(key)
+            if response is None:
+                self.stats["misses"] += 1
+                return None
+            self.responses.move_to_end(key)
+            self.stats["hits"] += 1
+            return response
+
+    def put(self, key, response):
+        if response.size > self.max_bytes:
+            return
+        with self.lock:
+            previous = self.responses.pop(key, None)
+            if previous is not None:
+                self.total_bytes -= previous.size
+                previous.on_grow = None
+            self.responses[key] = response
+            self.total_bytes += response.size
+            response.on_grow = lambda added: self._grow(key, response, added)
+            self._evict()
+
+    def _grow(self, key, response, added):
+        """
+        保持している応答に圧縮した本文が追加されたら、合計サイズに加えて上限を超えた分を捨てる
+        """
+        with self.lock:
+            if self.responses.get(key) is response:
+                self.total_bytes += added
+                self._evict()
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self.responses.popitem(last=False)
+            self.total_bytes -= evicted.size
+            evicted.on_grow = None
+            self.stats["evictions"] += 1
+
+    def report(self):
+        logger.info(
+            f"応答キャッシュ: ヒット {self.stats['hits']}件, ミス {self.stats['misses']}件, "
+            f"破棄 {self.stats['evictions']}件, 保持 {len(self.responses)}件 ({self.total_bytes} バイト)"
+        )
+
+class SpecServer:
+    """
+    静的サイトと、仕様書・検索のAPIを返す
+    仕様書一覧と検索索引は起動時のカタログを使い、仕様書のJSONと静的ファイルはファイルが変わったら作り直す
+      /api/specs           仕様書一覧
+      /api/specs/<パス>    仕様書のJSON（$ref解決後）
+      /api/search?q=       統合ビューアと同じ形式の横断検索（search.js から使う）
+      /api/query?q=        カタログのデータベースの検索（kind, repo, exact, limit を指定できる）
+    """
+
+    def __init__(self, static_site_dir=None, cache_max_bytes=None):
+        self.static_site_dir = Path(static_site_dir or CONFIG["static_site_dir"])
+        self.cache = ResponseCache(cache_max_bytes or CONFIG.get("serve_cache_max_bytes", 64 * 1024 * 1024))
+        # 仕様書の解析結果は保持せず、要求された仕様書だけを解析してJSONを応答キャッシュに保持する
+        self.catalog = SpecCatalog.load(self.static_site_dir, retain_data=False)
+        self.entries = {entry.path: entry for entry in self.catalog}
+        self.search = SearchIndexReader(self.catalog.search_builder or SearchIndexBuilder())
+        self.parse_cache = get_parse_cache()
+        self.parse_lock = threading.Lock()
+
+    def precompress(self):
+        """
+        静的ファイルと仕様書一覧を応答キャッシュに入れ、すべての符号化方式で圧縮しておく
+        最初の要求で圧縮を待たせないため、serveコマンドの起動時に1回だけ呼び出す
+        仕様書ごとのJSONのAPIは要求された仕様書だけを解析するため、最初の要求時に圧縮する
+        """
+        started = time.perf_counter()
+        paths = ["/api/specs"] + [
+            "/" + file_path.relative_to(self.static_site_dir).as_posix()
+            for file_path in sorted(self.static_site_dir.rglob("*"))
+            if file_path.is_file() and not any(
+                part.startswith(".") for part in file_path.relative_to(self.static_site_dir).parts
+            )
+        ]
+        evictions = self.cache.stats["evictions"]
+        compressed = 0
+        for path in paths:
+            response = self.handle(path, {})
+            if response.status != 200 or not response.compressible:
+                continue
+            try:
+                for encoding in COMPRESSORS:
+                    response.compressed(encoding)
+            except Exception as e:
+                logger.warning(f"{path} を事前に圧縮できませんでした: {e}")
+                continue
+            compressed += 1
+        logger.info(f"{compressed}件の応答を事前に圧縮しました ({time.perf_counter() - started:.2f}秒)")
+        if self.cache.stats["evictions"] > evictions:
+            logger.warning(
+                "応答キャッシュに収まらず、事前に圧縮した応答の一部を破棄しました "
+                "(serve_cache_max_bytes を大きくすると最初の要求でも圧縮を待ちません)"
+            )
+        return compressed
+
+    def cached(self, key, produce):
+        response = self.cache.get(key)
+        increment("serve_cache_lookups", result="miss" if response is None else "hit")
+        if response is None:
+            response = produce()
+            if response.status == 200:
+                self.cache.put(key, response)
+        return response
+
+    def handle(self, path, query):
+        """
+        要求されたパスとクエリの応答を返す
+        """
+        if path == "/api/specs":
+            return self.cached(("specs",), lambda: json_response(self.catalog.summaries()))
+        if path.startswith("/api/specs/"):
+            return self.spec_json(path[len("/api/specs/"):])
+        if path == "/api/search":
+            text = query.get("q", [""])[0]
+            return self.cached(("search", text), lambda: json_response(self.search.search(text)))
+        if path == "/api/query":
+            return self.catalog_query(query)
+        if path.startswith("/api/"):
+            return error_response(404, f"APIがありません: {path}")
+        return self.static_file(path)
+
+    def spec_json(self, spec_path):
+        entry = self.entries.get(spec_path)
+        if entry is None or not entry.parsed:
+            return error_response(404, f"仕様書がありません: {spec_path}")
+        spec_file = entry.source[1]
+        try:
+            stat = spec_file.stat()
+        except FileNotFoundError:
+            return error_response(404, f"仕様書がありません: {spec_path}")
+        def produce():
+            with self.parse_lock:
+                spec_json = entry.load_json(self.static_site_dir, self.parse_cache, self.catalog.resolver)
+            if spec_json is None:
+                return error_response(500, f"仕様書を解析できませんでした: {spec_path}")
+            return CachedResponse(spec_json.encode("utf-8"), "application/json; charset=utf-8")
+        return self.cached(("spec", spec_path, stat.st_mtime_ns, stat.st_size), produce)
+
+    def catalog_query(self, query):
+        text = query.get("q", [""])[0].strip()
+        kind = query.get("kind", [None])[0]
+        if not text:
+            return error_response(400, "検索語（q）を指定してください")
+        if kind is not None and kind not in ITEM_KINDS:
+            return error_response(400, f"kind には {', '.join(ITEM_KINDS)} のいずれかを指定してください")
+        try:
+            limit = int(query.get("limit", ["20"])[0])
+        except ValueError:
+            return error_response(400, "limit には数値を指定してください")
+        db_file = get_catalog_db_path()
+        if db_file is None or not db_file.exists():
+            return error_response(404, "カタログのデータベースがありません (build を実行してください)")
+        stat = db_file.stat()
+        repo = query.get("repo", [None])[0]
+        exact = query.get("exact", [""])[0] not in ("", "0", "false")
+        return self.cached(
+            ("query", text, kind, repo, exact, limit, stat.st_mtime_ns, stat.st_size),
+            lambda: json_response(query_catalog_db(text, kind=kind, repo=repo, exact=exact, limit=limit, db_file=db_file)),
+        )
+
+    def static_file(self, path):
+        parts = [part for part in path.strip("/").split("/") if part]
+        # 隠しファイル（カタログのデータベース・計測結果など）と親ディレクトリへの参照は返さない
+        if any(part.startswith(".") for part in parts):
+            return error_response(404, f"ファイルがありません: {path}")
+        file_path = self.static_site_dir.joinpath(*parts)
+        if file_path.is_dir():
+            file_path = file_path / "index.html"
+        if not file_path.is_file():
+            return error_response(404, f"ファイルがありません: {path}")
+        stat = file_path.stat()
+        def produce():
+            # メモリに保持しきれない大きさのファイルは、圧縮した本文をディスクに保存する
+            if stat.st_size * LARGE_FILE_RATIO > self.cache.max_bytes:
+                return FileResponse(file_path, content_type_for(file_path), self.static_site_dir / SERVE_VARIANTS_DIR)
+            return CachedResponse(file_path.read_bytes(), content_type_for(file_path))
+        return self.cached(("file", file_path, stat.st_mtime_ns, stat.st_size), produce)
+
+class _SpecRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def do_GET(self):
+        self.respond(send_body=True)
+
+    def do_HEAD(self):
+        self.respond(send_body=False)
+
+    def respond(self, send_body):
+        url = urlsplit(self.path)
+        try:
+            response = self.server.app.handle(unquote(url.path), parse_qs(url.query))
+        except Exception as e:
+            logger.error(f"{self.path} の応答中にエラーが発生しました: {e}")
+            response = error_response(500, str(e))
+        encoding, etag = response.negotiate(self.headers.get("Accept-Encoding"))
+        if response.status == 200 and etag_matches(self.headers.get("If-None-Match"), etag):
+            # 本文を読んだり圧縮したりせずに304を返す
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Vary", "Accept-Encoding")
+            self.end_headers()
+            return
+        encoding, body, etag = response.encoded(encoding)
+        self.send_response(response.status)
+        self.send_header("Content-Type", response.content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        if response.status == 200:
+            self.send_header("ETag", etag)
+            # 毎回ETagで確認し、変わっていなければ304で本文を送らない
+            self.send_header("Cache-Control", "no-cache")
+        if encoding != "identity":
+            self.send_header("Content-Encoding", encoding)
+        self.end_headers()
+        if send_body:
+            self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} - {format % args}")
+
+def create_server(host=None, port=None, static_site_dir=None):
+    """
+    静的サイトのHTTPサーバーを作成する（port=0の場合は空いているポートを使う）
+    """
+    host = host or CONFIG.get("serve_host", "127.0.0.1")
+    port = CONFIG.get("serve_port", 8000) if port is None else port
+    server = ThreadingHTTPServer((host, port), _SpecRequestHandler)
+    server.daemon_threads = True
+    server.app = SpecServer(static_site_dir)
+    if CONFIG.get("serve_precompress", True):
+        server.app.precompress()
+    return server
+
+def serve(host=None, port=None):
+    """
+    静的サイトをHTTPで配信する（serveコマンド）
+    """
+    server = create_server(host, port)
+    host, port = server.server_address[:2]
+    encodings = ", ".join(COMPRESSORS)
+    logger.info(f"http://{host}:{port}/ で配信しています (圧縮: {encodings}, Ctrl+Cで終了)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        logger.info("配信を終了します")
+    finally:
+        server.server_close()
+        server.app.cache.report()
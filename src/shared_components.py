@@ -0,0 +1,110 @@
+import json
+import hashlib
+import logging
+from collections import Counter
+from src.catalog import serialize_spec
+
+logger = logging.getLogger('openapispec-collector')
+
+# 共有テーブルへの参照に置き換えた components の値（viewer.js の rehydrateSpec() で元に戻す）
+SHARED_COMPONENT_KEY = "x-openapispec-shared"
+
+def component_subtrees(spec):
+    """
+    components.<種類>.<名前> の値を (種類, 名前, JSON文字列) で順に返す
+    """
+    components = spec.get("components") if isinstance(spec, dict) else None
+    if not isinstance(components, dict):
+        return
+    for section, items in components.items():
+        if not isinstance(items, dict):
+            continue
+        for name, subtree in items.items():
+            yield section, name, serialize_spec(subtree)
+
+def content_key(subtree_json):
+    return hashlib.sha256(subtree_json.encode("utf-8")).hexdigest()[:16]
+
+def marker_size(key):
+    return len(serialize_spec({SHARED_COMPONENT_KEY: key}))
+
+class SharedComponents:
+    """
+    複数の仕様書に同じ内容でコピーされている components を内容のハッシュで1つにまとめる
+    scan() / count() で全仕様書の出現回数を数え、dedupe() で共有するものを参照に置き換える
+    """
+
+    def __init__(self):
+        self.counts = Counter()
+        self.sizes = {}
+        self.table = {}
+        self.stats = {"raw": 0, "deduped": 0, "references": 0}
+
+    def count(self, spec):
+        """
+        解析済みの仕様書1件について、components の値ごとに出現回数を数える
+        """
+        for _, _, subtree_json in component_subtrees(spec):
+            key = content_key(subtree_json)
+            self.counts[key] += 1
+            self.sizes[key] = len(subtree_json)
+        return self
+
+    def scan(self, spec_jsons):
+        """
+        (パス, JSON文字列) を順に受け取り、components の値ごとに出現回数を数える
+        """
+        for _, spec_json in spec_jsons:
+            self.count(json.loads(spec_json))
+        return self
+
+    def is_shared(self, key):
+        """
+        共有テーブルに入れた方が小さくなる（参照に置き換えて減る分がテーブルの分より大きい）場合にTrue
+        """
+        count = self.counts[key]
+        size = self.sizes.get(key, 0)
+        return count > 1 and count * (size - marker_size(key)) > size + len(key) + 4
+
+    def dedupe(self, spec_jsons):
+        """
+        (パス, JSON文字列) を順に受け取り、共有する components を参照に置き換えたJSON文字列を返す
+        置き換えた値は共有テーブル（self.table）に1回だけ追加する
+        """
+        for path, spec_json in spec_jsons:
+            self.stats["raw"] += len(spec_json)
+            spec = json.loads(spec_json)
+            replaced = False
+            for section, name, subtree_json in list(component_subtrees(spec)):
+                key = content_key(subtree_json)
+                if not self.is_shared(key):
+                    continue
+                if key not in self.table:
+                    self.table[key] = subtree_json
+                    self.stats["deduped"] += len(json.dumps(key)) + 2 + len(subtree_json)
+                spec["components"][section][name] = {SHARED_COMPONENT_KEY: key}
+                self.stats["references"] += 1
+                replaced = True
+            deduped_json = serialize_spec(spec) if replaced else spec_json
+            self.stats["deduped"] += len(deduped_json)
+            yield path, deduped_json
+
+    def iter_table_json(self):
+        """
+        共有テーブルを {ハッシュ: 値} のJSONとして返す（dedupe() をすべて処理した後に呼び出す）
+        """
+        yield "{"
+        separator = ""
+        for key, subtree_json in self.table.items():
+            yield f"{separator}{json.dumps(key)}: {subtree_json}"
+            separator = ", "
+        yield "}"
+
+    def report(self):
+        saved = self.stats["raw"] - self.stats["deduped"]
+        logger.info(
+            f"仕様書間で共通のcomponentsを {len(self.table)} 件共有しました "
+            f"(参照 {self.stats['references']} 件): {self.stats['raw']} バイト -> {self.stats['deduped']} バイト "
+            f"({saved} バイト削減)"
+        )
+        return saved
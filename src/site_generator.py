@@ -1,13 +1,20 @@
 import os
+import gzip
+import zlib
 import json
 import shutil
 import base64
 import logging
+import threading
 from pathlib import Path
-import yaml
-import requests
-from jinja2 import Environment, FileSystemLoader
+from jinja2 import Environment, FileSystemLoader, FileSystemBytecodeCache
 from src.config import CONFIG
+from src.catalog import SpecCatalog, SPEC_PAYLOAD_DIR
+from src.search_index import build_search_index
+from src.catalog_db import update_catalog_db
+from src.shared_components import SharedComponents
+from src.vendor_assets import VendorAssetError, get_vendor_cache, load_vendor_asset
+from src.metrics import span, increment
 
 logger = logging.getLogger('openapispec-collector')
 
@@ -17,9 +24,186 @@ TEMPLATES_DIR = STATIC_ASSETS_DIR / "templates"
 CSS_DIR = STATIC_ASSETS_DIR / "css"
 JS_DIR = STATIC_ASSETS_DIR / "js"
 
-def generate_static_site():
+_template_lock = threading.Lock()
+_template_environments = {}
+
+def get_template_environment():
+    """
+    テンプレートの環境をプロセス内で共有し、コンパイル済みのテンプレートを使い回す
+    template_cache_dir を指定すると、コンパイル結果をディスクにも保存して次回以降の実行で使い回す
+    （テンプレートを変更した場合は内容のチェックサムが変わるためコンパイルし直す）
+    """
+    cache_dir = CONFIG.get("template_cache_dir")
+    with _template_lock:
+        if cache_dir not in _template_environments:
+            bytecode_cache = None
+            if cache_dir:
+                Path(cache_dir).mkdir(exist_ok=True, parents=True)
+                bytecode_cache = FileSystemBytecodeCache(str(cache_dir))
+            _template_environments[cache_dir] = Environment(
+                loader=FileSystemLoader(TEMPLATES_DIR), bytecode_cache=bytecode_cache
+            )
+        return _template_environments[cache_dir]
+
+def script_json(data):
+    """
+    <script>内に埋め込むJSON文字列を返す（</script> で途切れないようにする）
+    """
+    return json.dumps(data, ensure_ascii=False).replace("</", "<\\/")
+
+# 検索索引のシャードを置くディレクトリ（static_site からの相対パス）
+SEARCH_INDEX_DIR = "static/search"
+
+def search_shard_script(name, data):
+    """
+    検索索引のシャードを、読み込むと registerSearchShard() を呼び出すスクリプトにする
+    <script>で読み込むため、file:// で開いた場合も段階的に読み込める
+    """
+    return f"registerSearchShard({json.dumps(name)}, {script_json(data)});\n"
+
+def write_search_shards(search_dir, shards, previous=None):
+    """
+    検索索引のシャードを書き出し、{シャードの名前: スクリプト} を返す
+    previousに前回書き出したスクリプトを渡すと、内容が変わったシャードだけを書き出し、なくなったシャードを削除する
+    """
+    search_dir.mkdir(exist_ok=True, parents=True)
+    previous = previous or {}
+    scripts = {}
+    for name, data in shards.items():
+        scripts[name] = search_shard_script(name, data)
+        if previous.get(name) != scripts[name]:
+            with open(search_dir / f"{name}.js", "w", encoding='utf-8') as f:
+                f.write(scripts[name])
+    for name in set(previous) - set(scripts):
+        (search_dir / f"{name}.js").unlink(missing_ok=True)
+    return scripts
+
+def write_search_index(catalog, static_site_dir):
+    """
+    検索索引のシャードを static/search 配下に書き出す
+    """
+    search_dir = static_site_dir / SEARCH_INDEX_DIR
+    if search_dir.exists():
+        shutil.rmtree(search_dir)
+    scripts = write_search_shards(search_dir, build_search_index(catalog))
+    total_size = sum(len(script.encode("utf-8")) for script in scripts.values())
+    increment("rendered_bytes", total_size, output="search_index")
+    logger.info(f"検索索引を書き出しました: {search_dir} (合計サイズ: {total_size} バイト)")
+    return scripts
+
+def write_spec_payloads(catalog, static_site_dir):
+    """
+    分割出力用に、仕様書ごとのJSONと仕様書一覧（catalog.json）を static/specs 配下に書き出す
+    前回のビルドで書き出したJSONは削除してから書き出す
+    """
+    payload_dir = static_site_dir / SPEC_PAYLOAD_DIR
+    if payload_dir.exists():
+        shutil.rmtree(payload_dir)
+    total_size = 0
+    for entry in catalog:
+        if entry.parsed:
+            total_size += write_spec_payload(static_site_dir, entry)
+    summaries = write_catalog_summaries(catalog, static_site_dir)
+    increment("rendered_bytes", total_size, output="spec_payloads")
+    logger.info(f"仕様書ごとのJSONを {len(summaries)} 件書き出しました (合計サイズ: {total_size} バイト): {payload_dir}")
+    return summaries
+
+# 統合ビューアに埋め込む仕様書の圧縮方式（ブラウザの DecompressionStream の形式名 -> 圧縮処理）
+PAYLOAD_COMPRESSORS = {
+    "gzip": lambda data: gzip.compress(data, mtime=0),
+    "deflate": lambda data: zlib.compress(data, 9),
+}
+
+def get_payload_compression():
+    """
+    viewer_payload_compression の設定を返す（未対応の方式の場合は圧縮しない）
+    """
+    compression = CONFIG.get("viewer_payload_compression")
+    if compression and compression not in PAYLOAD_COMPRESSORS:
+        logger.warning(f"未対応の圧縮方式のため仕様書を圧縮せずに埋め込みます: {compression}")
+        return None
+    return compression or None
+
+def iter_specs_json(spec_jsons):
+    """
+    (パス, JSON文字列) から {パス: 仕様書} のJSONを、仕様書1件ずつに分けて順に返す
+    """
+    yield "{"
+    separator = ""
+    for path, spec_json in spec_jsons:
+        yield f"{separator}{json.dumps(path)}: {spec_json}"
+        separator = ", "
+    yield "}"
+
+def iter_compressed_specs_json(spec_jsons, compression, sizes):
+    """
+    仕様書ごとに圧縮してBase64にした {パス: 文字列} のJSONを、仕様書1件ずつに分けて順に返す
+    sizesの raw / compressed に圧縮前と圧縮後（Base64）のバイト数を加算する
+    """
+    compress = PAYLOAD_COMPRESSORS[compression]
+    yield "{"
+    separator = ""
+    for path, spec_json in spec_jsons:
+        raw = spec_json.encode("utf-8")
+        packed = base64.b64encode(compress(raw)).decode("ascii")
+        sizes["raw"] += len(raw)
+        sizes["compressed"] += len(packed)
+        yield f'{separator}{json.dumps(path)}: "{packed}"'
+        separator = ", "
+    yield "}"
+
+def write_spec_payload(static_site_dir, entry):
+    """
+    分割出力用に1件の仕様書のJSONを書き出し、サイズを返す
+    """
+    payload_file = static_site_dir / entry.payload_path
+    payload_file.parent.mkdir(exist_ok=True, parents=True)
+    with open(payload_file, "w", encoding='utf-8') as f:
+        f.write(entry.json)
+    return len(entry.json)
+
+def write_catalog_summaries(catalog, static_site_dir):
+    """
+    分割出力用に仕様書一覧（catalog.json）を書き出し、一覧を返す
+    """
+    summaries = catalog.summaries()
+    payload_dir = static_site_dir / SPEC_PAYLOAD_DIR
+    payload_dir.mkdir(exist_ok=True, parents=True)
+    with open(payload_dir / "catalog.json", "w", encoding='utf-8') as f:
+        json.dump(summaries, f, ensure_ascii=False)
+    return summaries
+
+def generate_static_site(catalog=None):
+    """
+    index.html を生成する
+    catalogを渡すと、generate_integrated_viewer() と仕様書の解析結果を共有する
+    site_output_mode が "split" の場合は仕様書を index.html に埋め込まず、
+    仕様書一覧だけを埋め込んで各仕様書は表示時にJSONを読み込む
+    """
     static_site_dir = Path(CONFIG["static_site_dir"])
     logger.info("静的サイトの生成を開始します")
+    if catalog is None:
+        with span("build_step", step="load"):
+            catalog = SpecCatalog.load(static_site_dir)
+    if CONFIG.get("site_output_mode", "inline") == "split":
+        with span("build_step", step="spec_payloads"):
+            catalog_json = script_json(write_spec_payloads(catalog, static_site_dir))
+    else:
+        catalog_json = None
+    with span("build_step", step="search_index"):
+        write_search_index(catalog, static_site_dir)
+    with span("build_step", step="catalog_db"):
+        update_catalog_db(catalog)
+    with span("build_step", step="render"):
+        render_index_html(catalog, static_site_dir, catalog_json)
+    logger.info(f"静的サイトが {static_site_dir} に生成されました")
+    return len(catalog)
+
+def render_index_html(catalog, static_site_dir, catalog_json=None):
+    """
+    index.html と、CSS・Swagger UI / ReDoc のページを書き出す
+    catalog_json（分割出力の仕様書一覧）を渡すと仕様書は埋め込まず、仕様書一覧だけを埋め込む
+    """
     static_css_dir = static_site_dir / "static" / "css"
     static_css_dir.mkdir(exist_ok=True, parents=True)
     try:
@@ -27,75 +211,21 @@ def generate_static_site():
         logger.info(f"CSSファイルをコピーしました: {static_css_dir / 'styles.css'}")
     except Exception as e:
         logger.error(f"CSSファイルのコピー中にエラーが発生しました: {e}")
-    env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
-    template = env.get_template("index.html")
-    specs = []
-    api_specs = {}
-    for repo_dir in static_site_dir.iterdir():
-        if repo_dir.is_dir() and repo_dir.name != "static":
-            spec_pattern = CONFIG["spec_path"]
-            if "/" in spec_pattern:
-                dir_part, file_pattern = spec_pattern.rsplit("/", 1)
-            else:
-                dir_part, file_pattern = "", spec_pattern
-            search_dir = repo_dir / dir_part if dir_part else repo_dir
-            if search_dir.exists() and search_dir.is_dir():
-                yml_files = list(search_dir.rglob(file_pattern))
-                for spec_file in yml_files:
-                    repo_name = repo_dir.name
-                    rel_path = spec_file.relative_to(static_site_dir)
-                    spec_path = str(rel_path)
-                    # サブパス部分を安全に抽出
-                    subpath = str(rel_path.parent)[len(repo_name):].lstrip("/")
-                    title = repo_name + ("/" + subpath if subpath else "") + "/" + spec_file.stem
-                    spec_data = None
-                    try:
-                        with open(spec_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            spec_data = yaml.safe_load(content)
-                            if spec_data and 'info' in spec_data and 'title' in spec_data['info']:
-                                title = spec_data['info']['title']
-                            api_specs[spec_path] = spec_data
-                    except Exception as e:
-                        logger.warning(f"{spec_file}からタイトル情報を抽出できませんでした: {e}")
-                    swagger_link = f"swagger-ui.html?url={spec_path}"
-                    redoc_link = f"redoc.html?url={spec_path}"
-                    specs.append({
-                        "title": title,
-                        "repo": repo_name,
-                        "path": spec_path,
-                        "data": json.dumps(spec_data),
-                        "swagger_link": swagger_link,
-                        "redoc_link": redoc_link
-                    })
-            else:
-                # 従来通りrepo直下のymlもサポート
-                yml_files = list(repo_dir.glob("*.yml")) + list(repo_dir.glob("*.yaml"))
-                for spec_file in yml_files:
-                    repo_name = repo_dir.name
-                    rel_path = spec_file.relative_to(static_site_dir)
-                    spec_path = str(rel_path)
-                    title = repo_name
-                    spec_data = None
-                    try:
-                        with open(spec_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            spec_data = yaml.safe_load(content)
-                            if spec_data and 'info' in spec_data and 'title' in spec_data['info']:
-                                title = spec_data['info']['title']
-                            api_specs[spec_path] = spec_data
-                    except Exception as e:
-                        logger.warning(f"{spec_file}からタイトル情報を抽出できませんでした: {e}")
-                    swagger_link = f"swagger-ui.html?url={spec_path}"
-                    redoc_link = f"redoc.html?url={spec_path}"
-                    specs.append({
-                        "title": title,
-                        "repo": repo_name,
-                        "path": spec_path,
-                        "data": json.dumps(spec_data),
-                        "swagger_link": swagger_link,
-                        "redoc_link": redoc_link
-                    })
+    template = get_template_environment().get_template("index.html")
+    if catalog_json is not None:
+        specs = []
+    else:
+        specs = [
+            {
+                "title": entry.title,
+                "repo": entry.repo,
+                "path": entry.path,
+                "data": entry.json,
+                "swagger_link": f"swagger-ui.html?url={entry.path}",
+                "redoc_link": f"redoc.html?url={entry.path}"
+            }
+            for entry in catalog
+        ]
     redoc_template_path = TEMPLATES_DIR / "redoc.html"
     redoc_template_base64 = ""
     try:
@@ -104,14 +234,7 @@ def generate_static_site():
             redoc_template_base64 = base64.b64encode(redoc_template.encode('utf-8')).decode('utf-8')
     except Exception as e:
         logger.error(f"ReDocテンプレート読み込み中にエラーが発生: {e}")
-    swagger_ui_css = ""
-    try:
-        swagger_ui_css_url = "https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui.css"
-        response = requests.get(swagger_ui_css_url)
-        if response.status_code == 200:
-            swagger_ui_css = response.text
-    except Exception as e:
-        logger.warning(f"Swagger UI CSSの読み込みに失敗しました: {e}")
+    swagger_ui_css = load_vendor_asset("swagger_ui_css")
     custom_css = ""
     try:
         css_path = CSS_DIR / "styles.css"
@@ -133,8 +256,12 @@ def generate_static_site():
         except Exception as e:
             logger.error(f"JavaScriptファイルの読み込み中にエラーが発生しました: {file_path}, エラー: {e}")
             js_content[name] = f"/* Error loading: {file_path}, {str(e)} */"
+    changelog_name = CONFIG.get("changelog_file") or "changelog"
+    changelog_url = f"{changelog_name}.html" if (static_site_dir / f"{changelog_name}.html").exists() else None
     rendered_html = template.render(
         specs=specs,
+        changelog_url=changelog_url,
+        catalog_json=catalog_json,
         redoc_template_base64=redoc_template_base64,
         swagger_ui_css=swagger_ui_css,
         custom_css=custom_css,
@@ -142,90 +269,39 @@ def generate_static_site():
     )
     with open(static_site_dir / "index.html", "w", encoding='utf-8') as f:
         f.write(rendered_html)
+    increment("rendered_bytes", os.path.getsize(static_site_dir / "index.html"), output="index.html")
     shutil.copy2(TEMPLATES_DIR / "swagger-ui.html", static_site_dir / "swagger-ui.html")
     shutil.copy2(TEMPLATES_DIR / "redoc.html", static_site_dir / "redoc.html")
-    logger.info(f"静的サイトが {static_site_dir} に生成されました")
-    return len(specs)
 
-def generate_integrated_viewer():
+def generate_integrated_viewer(catalog=None):
+    """
+    スタンドアローンの統合ビューアを生成する
+    catalogを省略すると static_site の仕様書をその場で解析する（解析結果は保持せず、埋め込む時に読み込み直す）
+    テンプレートは少しずつ描画してそのままファイルに書き込み、仕様書も1件ずつJSONにして書き込むため、
+    HTML全体や全仕様書のJSONを一度にメモリに持たない
+    """
     logger.info(f"統合ビューアの生成を開始します [出力先: {CONFIG['static_site_dir']}]")
     static_site_dir = Path(CONFIG["static_site_dir"])
     if not static_site_dir.exists():
         logger.warning(f"静的サイトディレクトリが存在しません: {static_site_dir}")
         static_site_dir.mkdir(exist_ok=True, parents=True)
         logger.info(f"静的サイトディレクトリを作成しました: {static_site_dir}")
-    api_specs = {}
-    total_size = 0
-    spec_count = 0
-    for repo_dir in static_site_dir.iterdir():
-        if repo_dir.is_dir() and repo_dir.name != "static":
-            spec_pattern = CONFIG["spec_path"]
-            if "/" in spec_pattern:
-                dir_part, file_pattern = spec_pattern.rsplit("/", 1)
-            else:
-                dir_part, file_pattern = "", spec_pattern
-            search_dir = repo_dir / dir_part if dir_part else repo_dir
-            if search_dir.exists() and search_dir.is_dir():
-                yml_files = list(search_dir.rglob(file_pattern))
-                for spec_file in yml_files:
-                    repo_name = repo_dir.name
-                    rel_path = spec_file.relative_to(static_site_dir)
-                    spec_path = str(rel_path)
-                    try:
-                        with open(spec_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            size = len(content)
-                            logger.info(f"仕様書を読み込みました: {spec_file.name} ({size} バイト)")
-                            total_size += size
-                            spec_count += 1
-                            spec_data = yaml.safe_load(content)
-                            api_specs[spec_path] = spec_data
-                    except Exception as e:
-                        logger.error(f"仕様書の読み込み中にエラーが発生: {spec_file} - {e}")
-            else:
-                # 従来通りrepo直下のymlもサポート
-                yml_files = list(repo_dir.glob("*.yml")) + list(repo_dir.glob("*.yaml"))
-                for spec_file in yml_files:
-                    repo_name = repo_dir.name
-                    rel_path = spec_file.relative_to(static_site_dir)
-                    spec_path = str(rel_path)
-                    try:
-                        with open(spec_file, 'r', encoding='utf-8') as f:
-                            content = f.read()
-                            size = len(content)
-                            logger.info(f"仕様書を読み込みました: {spec_file.name} ({size} バイト)")
-                            total_size += size
-                            spec_count += 1
-                            spec_data = yaml.safe_load(content)
-                            api_specs[spec_path] = spec_data
-                    except Exception as e:
-                        logger.error(f"仕様書の読み込み中にエラーが発生: {spec_file} - {e}")
-    logger.info(f"合計 {spec_count} 件の仕様書を読み込みました (合計サイズ: {total_size} バイト)")
+    if catalog is None:
+        with span("build_step", step="load"):
+            catalog = SpecCatalog.load(
+                static_site_dir, retain_data=False, count_components=CONFIG.get("viewer_dedupe_components", False)
+            )
     try:
-        env = Environment(loader=FileSystemLoader(TEMPLATES_DIR))
+        env = get_template_environment()
         redoc_template_path = TEMPLATES_DIR / "redoc.html"
         with open(redoc_template_path, 'r', encoding='utf-8') as f:
             redoc_template = f.read()
             redoc_template_base64 = base64.b64encode(redoc_template.encode('utf-8')).decode('utf-8')
-        external_resources = {
-            "swagger_ui_css": "https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui.css",
-            "swagger_ui_js": "https://cdn.jsdelivr.net/npm/swagger-ui-dist@5/swagger-ui-bundle.js",
-            "redoc_js": "https://cdn.jsdelivr.net/npm/redoc@2.0.0/bundles/redoc.standalone.js"
+        vendor_cache = get_vendor_cache()
+        resource_contents = {
+            name: load_vendor_asset(name, vendor_cache)
+            for name in ("swagger_ui_css", "swagger_ui_js", "redoc_js")
         }
-        resource_contents = {}
-        for name, url in external_resources.items():
-            try:
-                logger.info(f"外部リソースを取得中: {url}")
-                response = requests.get(url)
-                if response.status_code == 200:
-                    resource_contents[name] = response.text
-                    logger.info(f"外部リソースを取得しました: {name} ({len(response.text)} バイト)")
-                else:
-                    logger.warning(f"リソースの取得に失敗しました: {url}, ステータスコード: {response.status_code}")
-                    resource_contents[name] = f"/* Failed to load: {url} */"
-            except Exception as e:
-                logger.error(f"リソース取得中にエラーが発生しました: {url}, エラー: {e}")
-                resource_contents[name] = f"/* Error loading: {url}, {str(e)} */"
         js_files = {
             "js_search": JS_DIR / "search.js",
             "js_viewer": JS_DIR / "viewer.js",
@@ -247,24 +323,68 @@ def generate_integrated_viewer():
         except Exception as e:
             logger.error(f"CSSファイルの読み込み中にエラーが発生しました: {css_path}, エラー: {e}")
             resource_contents["custom_css"] = f"/* Error loading: {css_path}, {str(e)} */"
+        # スタンドアローンのため検索索引のシャードもすべて埋め込む
+        resource_contents["search_index_js"] = (
+            search_shard_script(name, data) for name, data in build_search_index(catalog).items()
+        )
         template = env.get_template("api-spec-viewer.html")
+        spec_jsons = catalog.iter_spec_json()
+        shared_components = None
+        if CONFIG.get("viewer_dedupe_components", False):
+            # 出現回数を数えてから、埋め込み時に共有するcomponentsを参照に置き換える
+            # （カタログの読み込み時に数えていればそれを使い、仕様書を解析し直さない）
+            shared_components = catalog.shared_components
+            if shared_components is None:
+                shared_components = SharedComponents().scan(catalog.iter_spec_json())
+            spec_jsons = shared_components.dedupe(spec_jsons)
+        compression = get_payload_compression()
+        payload_sizes = {"raw": 0, "compressed": 0}
+        if compression:
+            # 仕様書一覧だけはそのまま埋め込み、各仕様書は表示時に展開する
+            api_specs_json = iter_compressed_specs_json(spec_jsons, compression, payload_sizes)
+            catalog_json = script_json(catalog.summaries())
+        else:
+            api_specs_json = iter_specs_json(spec_jsons)
+            catalog_json = None
         context = {
-            "api_specs_json": json.dumps(api_specs),
+            "api_specs_json": api_specs_json,
+            # 共有テーブルは仕様書をすべて埋め込んだ後に出力する
+            "shared_components_json": shared_components.iter_table_json() if shared_components else None,
+            "catalog_json": catalog_json,
+            "payload_compression": compression,
             "redoc_template_base64": redoc_template_base64,
             **resource_contents
         }
-        rendered_html = template.render(**context)
         viewer_file = static_site_dir / "api-spec-viewer.html"
         logger.info(f"統合ビューアを保存します: {viewer_file}")
         if not viewer_file.parent.exists():
             logger.warning(f"親ディレクトリが存在しません: {viewer_file.parent}")
             viewer_file.parent.mkdir(parents=True, exist_ok=True)
             logger.info(f"親ディレクトリを作成しました: {viewer_file.parent}")
-        with open(viewer_file, "w", encoding='utf-8') as f:
-            f.write(rendered_html)
+        # 途中で失敗しても前回の統合ビューアを壊さないよう、一時ファイルに書き込んでから置き換える
+        tmp_file = viewer_file.with_suffix(".tmp")
+        try:
+            with span("build_step", step="viewer_render"), open(tmp_file, "w", encoding='utf-8') as f:
+                for chunk in template.generate(**context):
+                    f.write(chunk)
+            tmp_file.replace(viewer_file)
+        finally:
+            if tmp_file.exists():
+                tmp_file.unlink()
+        if shared_components:
+            shared_components.report()
+        if compression:
+            ratio = payload_sizes["compressed"] / payload_sizes["raw"] if payload_sizes["raw"] else 0
+            logger.info(
+                f"埋め込む仕様書を{compression}で圧縮しました: {payload_sizes['raw']} バイト -> "
+                f"{payload_sizes['compressed']} バイト (Base64込み, {ratio:.1%})"
+            )
         file_size = os.path.getsize(viewer_file)
+        increment("rendered_bytes", file_size, output="api-spec-viewer.html")
         logger.info(f"統合ビューアを保存しました: {viewer_file} (サイズ: {file_size} バイト)")
         return viewer_file
+    except VendorAssetError:
+        raise
     except MemoryError as e:
         logger.error(f"メモリ不足エラー: {e}")
         logger.error("API仕様データが大きすぎる可能性があります。データサイズを減らして再試行してください。")
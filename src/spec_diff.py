@@ -0,0 +1,545 @@
+import json
+import shutil
+import hashlib
+import logging
+from datetime import datetime, timezone
+from pathlib import Path
+from src.config import CONFIG
+from src.catalog import HTTP_METHODS
+from src.bundler import resolve_pointer
+from src.catalog_db import content_hash
+from src.metrics import increment
+
+logger = logging.getLogger('openapispec-collector')
+
+# 保存するハッシュの形式を変えたら上げる（古い形式の場合は基準を取り直す）
+SPEC_DIFF_VERSION = 1
+
+HASHES_FILE = "hashes.json"
+SNAPSHOT_DIR = "specs"
+HISTORY_FILE = "changelog.json"
+
+SCHEMA_REF_PREFIX = "#/components/schemas/"
+
+def leaf_hash(value):
+    """
+    部分木の内容（キーの順序によらない正規化したJSON）のハッシュ
+    """
+    text = json.dumps(value, sort_keys=True, ensure_ascii=False, separators=(",", ":"), default=str)
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+def node_hash(children):
+    """
+    子の 名前 -> ハッシュ からMerkle木の節のハッシュを作る
+    """
+    digest = hashlib.sha256()
+    for name, child in sorted(children.items()):
+        digest.update(f"{name}\0{child}\n".encode("utf-8"))
+    return digest.hexdigest()
+
+def _dict(value):
+    return value if isinstance(value, dict) else {}
+
+def spec_tree(data):
+    """
+    仕様書のMerkle木を作る
+    paths: パス -> {hash, shared（パス共通の項目）, operations: HTTPメソッド -> hash}, schemas: スキーマ名 -> hash,
+    other: paths と components.schemas 以外のハッシュ。各節のハッシュは子のハッシュから作る
+    """
+    paths = {}
+    for path, path_item in _dict(data.get("paths")).items():
+        path_item = _dict(path_item)
+        operations = {method: leaf_hash(value) for method, value in path_item.items() if method in HTTP_METHODS}
+        shared = leaf_hash({key: value for key, value in path_item.items() if key not in HTTP_METHODS})
+        paths[path] = {
+            "hash": node_hash({"shared": shared, **{f"operation:{method}": value for method, value in operations.items()}}),
+            "shared": shared,
+            "operations": operations,
+        }
+    components = _dict(data.get("components"))
+    schemas = {name: leaf_hash(schema) for name, schema in _dict(components.get("schemas")).items()}
+    other = {key: value for key, value in data.items() if key != "paths"}
+    if components:
+        other["components"] = {key: value for key, value in components.items() if key != "schemas"}
+    tree = {
+        "paths_hash": node_hash({path: node["hash"] for path, node in paths.items()}),
+        "schemas_hash": node_hash(schemas),
+        "other": leaf_hash(other),
+        "paths": paths,
+        "schemas": schemas,
+    }
+    tree["hash"] = node_hash({"paths": tree["paths_hash"], "schemas": tree["schemas_hash"], "other": tree["other"]})
+    return tree
+
+def _resolve(data, node):
+    """
+    仕様書内の $ref（#/...）を参照先に置き換える（解決できない場合はそのまま返す）
+    """
+    node = _dict(node)
+    ref = node.get("$ref")
+    if isinstance(ref, str) and ref.startswith("#"):
+        try:
+            return _dict(resolve_pointer(data, ref[1:]))
+        except KeyError:
+            return node
+    return node
+
+def _schema_type(schema):
+    schema = _dict(schema)
+    if isinstance(schema.get("$ref"), str):
+        return schema["$ref"]
+    return schema.get("type") if isinstance(schema.get("type"), str) else None
+
+def _parameters(data, path_item, operation):
+    """
+    パス共通とオペレーションのパラメータを (in, name) -> パラメータ で返す（オペレーション側を優先する）
+    """
+    parameters = {}
+    for source in (path_item, operation):
+        for parameter in source.get("parameters") if isinstance(source.get("parameters"), list) else []:
+            parameter = _resolve(data, parameter)
+            if isinstance(parameter.get("name"), str):
+                parameters[(parameter.get("in"), parameter["name"])] = parameter
+    return parameters
+
+def _required(schema):
+    required = schema.get("required")
+    return {name for name in required if isinstance(name, str)} if isinstance(required, list) else set()
+
+class ChangeDetails:
+    """
+    1つの変更の内訳を、互換性を壊すものとそうでないものに分けて集める
+    """
+
+    def __init__(self):
+        self.items = []
+
+    def add(self, message, breaking):
+        self.items.append({"message": message, "breaking": breaking})
+
+    @property
+    def breaking(self):
+        return any(item["breaking"] for item in self.items)
+
+def compare_operation(old_data, old_path_item, old_operation, new_data, new_path_item, new_operation):
+    details = ChangeDetails()
+    old_parameters = _parameters(old_data, old_path_item, old_operation)
+    new_parameters = _parameters(new_data, new_path_item, new_operation)
+    for key in sorted(set(old_parameters) | set(new_parameters), key=str):
+        label = f"パラメータ {key[1]} ({key[0]})"
+        old, new = old_parameters.get(key), new_parameters.get(key)
+        if new is None:
+            details.add(f"{label} が削除されました", True)
+        elif old is None:
+            required = bool(new.get("required"))
+            details.add(f"{'必須の' if required else '任意の'}{label} が追加されました", required)
+        else:
+            if not old.get("required") and new.get("required"):
+                details.add(f"{label} が必須になりました", True)
+            elif old.get("required") and not new.get("required"):
+                details.add(f"{label} が任意になりました", False)
+            old_type = _schema_type(old.get("schema"))
+            new_type = _schema_type(new.get("schema"))
+            if old_type != new_type:
+                details.add(f"{label} の型が {old_type} から {new_type} に変わりました", True)
+    old_body = _resolve(old_data, old_operation.get("requestBody")) if "requestBody" in old_operation else None
+    new_body = _resolve(new_data, new_operation.get("requestBody")) if "requestBody" in new_operation else None
+    if old_body is not None and new_body is None:
+        details.add("リクエストボディが削除されました", True)
+    elif old_body is None and new_body is not None:
+        required = bool(new_body.get("required"))
+        details.add(f"{'必須の' if required else '任意の'}リクエストボディが追加されました", required)
+    elif old_body is not None:
+        if not old_body.get("required") and new_body.get("required"):
+            details.add("リクエストボディが必須になりました", True)
+        for media_type in sorted(set(_dict(old_body.get("content"))) - set(_dict(new_body.get("content")))):
+            details.add(f"リクエストボディの {media_type} が削除されました", True)
+        _compare_content(details, "リクエストボディ", old_data, old_body, new_data, new_body, "request")
+    old_responses = {str(status): response for status, response in _dict(old_operation.get("responses")).items()}
+    new_responses = {str(status): response for status, response in _dict(new_operation.get("responses")).items()}
+    for status in sorted(set(old_responses) - set(new_responses)):
+        details.add(f"レスポンス {status} が削除されました", True)
+    for status in sorted(set(new_responses) - set(old_responses)):
+        details.add(f"レスポンス {status} が追加されました", False)
+    for status in sorted(set(old_responses) & set(new_responses)):
+        old_response = _resolve(old_data, old_responses[status])
+        new_response = _resolve(new_data, new_responses[status])
+        for media_type in sorted(set(_dict(old_response.get("content"))) - set(_dict(new_response.get("content")))):
+            details.add(f"レスポンス {status} の {media_type} が削除されました", True)
+        _compare_content(details, f"レスポンス {status}", old_data, old_response, new_data, new_response, "response")
+    if new_operation.get("deprecated") and not old_operation.get("deprecated"):
+        details.add("非推奨になりました", False)
+    return details
+
+def _compare_content(details, label, old_data, old_owner, new_data, new_owner, direction):
+    """
+    リクエストボディ・レスポンスの両方にあるメディアタイプごとに、スキーマの変更を details に加える
+    directionはリクエストボディなら "request"、レスポンスなら "response"
+    """
+    old_content, new_content = _dict(old_owner.get("content")), _dict(new_owner.get("content"))
+    for media_type in sorted(set(old_content) & set(new_content)):
+        _compare_schema(
+            details, old_data, _dict(old_content[media_type]).get("schema"),
+            new_data, _dict(new_content[media_type]).get("schema"), direction, f"{label} ({media_type}) の",
+        )
+
+def _breaking(direction, request, response):
+    """
+    クライアントが送る側（request）・受け取る側（response）それぞれで互換性を壊すかから、
+    directionの向き（Noneの場合は両方に使われうるため、どちらか一方でも壊せば壊す）での結果を返す
+    """
+    if direction == "request":
+        return request
+    if direction == "response":
+        return response
+    return request or response
+
+def _property_path(path):
+    """
+    入れ子のプロパティ名の列を "profile.address" / "tags[].label" の形にする（"[]" は配列の要素）
+    """
+    text = ""
+    for part in path:
+        text += part if part == "[]" or not text else f".{part}"
+    return text
+
+def compare_schema(old_schema, new_schema, old_data=None, new_data=None, direction=None):
+    details = ChangeDetails()
+    _compare_schema(details, old_data, old_schema, new_data, new_schema, direction)
+    if not details.items:
+        details.add("説明などが変更されました", False)
+    return details
+
+def _compare_schema(details, old_data, old_schema, new_data, new_schema, direction=None, prefix="", path=(), seen=frozenset()):
+    """
+    スキーマ（$ref解決後）の変更を details に加え、両方にあるプロパティと配列の items もたどる
+    必須・任意の変更と列挙値の追加・削除は、クライアントが送るか受け取るか（direction）で互換性の有無が逆になる
+    同じ $ref を指すスキーマは参照先のスキーマの変更として記録されるため比べない
+    """
+    old_schema, new_schema = _dict(old_schema), _dict(new_schema)
+    refs = (old_schema.get("$ref"), new_schema.get("$ref"))
+    if refs[0] is not None and refs[0] == refs[1]:
+        return
+    if refs != (None, None):
+        # 再帰的なスキーマで同じ組み合わせを何度もたどらない
+        if refs in seen:
+            return
+        seen = seen | {refs}
+    old_schema, new_schema = _resolve(_dict(old_data), old_schema), _resolve(_dict(new_data), new_schema)
+    where = f"{prefix}プロパティ {_property_path(path)} の" if path else prefix
+    if _schema_type(old_schema) != _schema_type(new_schema):
+        details.add(f"{where}型が {_schema_type(old_schema)} から {_schema_type(new_schema)} に変わりました", True)
+        return
+    old_properties, new_properties = _dict(old_schema.get("properties")), _dict(new_schema.get("properties"))
+    old_required, new_required = _required(old_schema), _required(new_schema)
+    for name in sorted(set(old_properties) | set(new_properties)):
+        child = _property_path(path + (name,))
+        if name not in new_properties:
+            details.add(f"{prefix}プロパティ {child} が削除されました", True)
+        elif name not in old_properties:
+            required = name in new_required
+            details.add(
+                f"{prefix}{'必須の' if required else ''}プロパティ {child} が追加されました",
+                _breaking(direction, required, False),
+            )
+        else:
+            if name in new_required and name not in old_required:
+                details.add(f"{prefix}プロパティ {child} が必須になりました", _breaking(direction, True, False))
+            elif name in old_required and name not in new_required:
+                details.add(f"{prefix}プロパティ {child} が任意になりました", _breaking(direction, False, True))
+            _compare_schema(
+                details, old_data, old_properties[name], new_data, new_properties[name],
+                direction, prefix, path + (name,), seen,
+            )
+    if "items" in old_schema and "items" in new_schema:
+        _compare_schema(
+            details, old_data, old_schema["items"], new_data, new_schema["items"], direction, prefix, path + ("[]",), seen,
+        )
+    old_enum = old_schema.get("enum") if isinstance(old_schema.get("enum"), list) else None
+    new_enum = new_schema.get("enum") if isinstance(new_schema.get("enum"), list) else None
+    if old_enum is not None and new_enum is not None:
+        removed = [value for value in old_enum if value not in new_enum]
+        added = [value for value in new_enum if value not in old_enum]
+        if removed:
+            details.add(f"{where}列挙値 {', '.join(map(str, removed))} が削除されました", _breaking(direction, True, False))
+        if added:
+            details.add(f"{where}列挙値 {', '.join(map(str, added))} が追加されました", _breaking(direction, False, True))
+
+def _referenced_schemas(data, roots):
+    """
+    roots から $ref をたどって参照される components.schemas の名前を返す（スキーマから参照されるスキーマも含む）
+    """
+    found = set()
+    visited = set()
+    pending = list(roots)
+    while pending:
+        node = pending.pop()
+        if isinstance(node, list):
+            pending.extend(node)
+            continue
+        if not isinstance(node, dict):
+            continue
+        ref = node.get("$ref")
+        if isinstance(ref, str) and ref.startswith("#") and ref not in visited:
+            visited.add(ref)
+            if ref.startswith(SCHEMA_REF_PREFIX):
+                found.add(ref[len(SCHEMA_REF_PREFIX):].replace("~1", "/").replace("~0", "~"))
+            try:
+                pending.append(resolve_pointer(data, ref[1:]))
+            except KeyError:
+                pass
+        pending.extend(node.values())
+    return found
+
+def schema_directions(data):
+    """
+    components.schemas の名前 -> 使われている向き（パラメータ・リクエストボディなら "request"、レスポンスなら "response"）
+    """
+    request_roots, response_roots = [], []
+    for path_item in _dict(data.get("paths")).values():
+        path_item = _dict(path_item)
+        request_roots.append(path_item.get("parameters"))
+        for method, operation in path_item.items():
+            if method in HTTP_METHODS:
+                operation = _dict(operation)
+                request_roots.extend([operation.get("parameters"), operation.get("requestBody")])
+                response_roots.append(operation.get("responses"))
+    directions = {}
+    for direction, roots in (("request", request_roots), ("response", response_roots)):
+        for name in _referenced_schemas(data, roots):
+            directions.setdefault(name, set()).add(direction)
+    return directions
+
+def schema_direction(name, old_directions, new_directions):
+    """
+    前回・今回のどちらかで片方の向きだけに使われていればその向き、それ以外（両方・どこからも参照されない）はNone
+    """
+    directions = old_directions.get(name, set()) | new_directions.get(name, set())
+    return next(iter(directions)) if len(directions) == 1 else None
+
+class SpecDiff:
+    """
+    前回の実行時に保存したMerkle木と比べ、変更のあった仕様書・パス・オペレーション・スキーマを集める
+    仕様書のJSON全体のハッシュが同じ仕様書は木を作らずに飛ばし、ハッシュの変わった部分木だけをたどる
+    変更の内容を分類する場合だけ、前回保存した仕様書のJSONを読み込む
+    """
+
+    def __init__(self, state_dir):
+        self.state_dir = Path(state_dir)
+        self.changes = []
+        self.stats = {"specs": 0, "unchanged": 0, "subtrees": 0}
+
+    def record(self, entry, kind, target, change, details):
+        self.changes.append({
+            "spec": entry["path"],
+            "repo": entry["repo"],
+            "title": entry["title"],
+            "kind": kind,
+            "target": target,
+            "change": change,
+            "breaking": details.breaking,
+            "details": details.items,
+        })
+
+    def simple_details(self, message, breaking):
+        details = ChangeDetails()
+        details.add(message, breaking)
+        return details
+
+    def load_snapshot(self, spec_path):
+        return json.loads((self.state_dir / SNAPSHOT_DIR / f"{spec_path}.json").read_text(encoding='utf-8'))
+
+    def compare_spec(self, spec, old_tree, new_tree, old_data, new_data):
+        if old_tree["paths_hash"] != new_tree["paths_hash"]:
+            self.compare_paths(spec, old_tree["paths"], new_tree["paths"], old_data, new_data)
+        if old_tree["schemas_hash"] != new_tree["schemas_hash"]:
+            old_schemas = _dict(_dict(old_data.get("components")).get("schemas"))
+            new_schemas = _dict(_dict(new_data.get("components")).get("schemas"))
+            old_directions, new_directions = schema_directions(old_data), schema_directions(new_data)
+            for name in sorted(set(old_tree["schemas"]) | set(new_tree["schemas"])):
+                old_hash, new_hash = old_tree["schemas"].get(name), new_tree["schemas"].get(name)
+                if old_hash == new_hash:
+                    continue
+                self.stats["subtrees"] += 1
+                if new_hash is None:
+                    self.record(spec, "schema", name, "removed", self.simple_details("スキーマが削除されました", True))
+                elif old_hash is None:
+                    self.record(spec, "schema", name, "added", self.simple_details("スキーマが追加されました", False))
+                else:
+                    self.record(spec, "schema", name, "modified", compare_schema(
+                        old_schemas[name], new_schemas[name], old_data, new_data,
+                        schema_direction(name, old_directions, new_directions),
+                    ))
+        if old_tree["other"] != new_tree["other"]:
+            self.stats["subtrees"] += 1
+            details = ChangeDetails()
+            old_version = _dict(old_data.get("info")).get("version")
+            new_version = _dict(new_data.get("info")).get("version")
+            if old_version != new_version:
+                details.add(f"バージョンが {old_version} から {new_version} に変わりました", False)
+            for key in ("servers", "security"):
+                if old_data.get(key) != new_data.get(key):
+                    details.add(f"{key} が変更されました", False)
+            if not details.items:
+                details.add("info などが変更されました", False)
+            self.record(spec, "spec", spec["path"], "modified", details)
+
+    def compare_paths(self, spec, old_paths, new_paths, old_data, new_data):
+        for path in sorted(set(old_paths) | set(new_paths)):
+            old_node, new_node = old_paths.get(path), new_paths.get(path)
+            if old_node is not None and new_node is not None and old_node["hash"] == new_node["hash"]:
+                continue
+            self.stats["subtrees"] += 1
+            if new_node is None:
+                self.record(spec, "path", path, "removed", self.simple_details("パスが削除されました", True))
+                continue
+            if old_node is None:
+                self.record(spec, "path", path, "added", self.simple_details("パスが追加されました", False))
+                continue
+            old_path_item = _dict(_dict(old_data.get("paths")).get(path))
+            new_path_item = _dict(_dict(new_data.get("paths")).get(path))
+            shared_changed = old_node["shared"] != new_node["shared"]
+            recorded = len(self.changes)
+            for method in HTTP_METHODS:
+                old_hash, new_hash = old_node["operations"].get(method), new_node["operations"].get(method)
+                # パス共通のパラメータが変わった場合は、すべてのオペレーションを比べる
+                if old_hash == new_hash and not (shared_changed and new_hash is not None):
+                    continue
+                target = f"{method.upper()} {path}"
+                self.stats["subtrees"] += 1
+                if new_hash is None:
+                    self.record(spec, "operation", target, "removed", self.simple_details("オペレーションが削除されました", True))
+                elif old_hash is None:
+                    self.record(spec, "operation", target, "added", self.simple_details("オペレーションが追加されました", False))
+                else:
+                    details = compare_operation(
+                        old_data, old_path_item, _dict(old_path_item.get(method)),
+                        new_data, new_path_item, _dict(new_path_item.get(method)),
+                    )
+                    if not details.items and old_hash != new_hash:
+                        details.add("説明などが変更されました", False)
+                    if details.items:
+                        self.record(spec, "operation", target, "modified", details)
+            if len(self.changes) == recorded:
+                self.record(spec, "path", path, "modified", self.simple_details("説明などが変更されました", False))
+
+def get_state_dir():
+    return Path(CONFIG.get("diff_state_dir") or ".spec_diff")
+
+def load_state(state_dir):
+    hashes_file = state_dir / HASHES_FILE
+    if not hashes_file.exists():
+        return None
+    try:
+        state = json.loads(hashes_file.read_text(encoding='utf-8'))
+    except (OSError, ValueError) as e:
+        logger.warning(f"前回の仕様書のハッシュを読み込めませんでした: {e}")
+        return None
+    return state if state.get("version") == SPEC_DIFF_VERSION else None
+
+def diff_catalog(catalog, state_dir=None):
+    """
+    前回の実行からの仕様書の変更を集め、今回の仕様書のハッシュとJSONを保存する
+    戻り値は今回の実行の変更履歴（前回の記録がない場合は baseline が True で変更は空）
+    """
+    state_dir = Path(state_dir or get_state_dir())
+    state = load_state(state_dir)
+    baseline = state is None
+    if baseline:
+        shutil.rmtree(state_dir / SNAPSHOT_DIR, ignore_errors=True)
+        state = {"version": SPEC_DIFF_VERSION, "specs": {}}
+    diff = SpecDiff(state_dir)
+    previous = state["specs"]
+    current = {}
+    snapshot_dir = state_dir / SNAPSHOT_DIR
+    for entry in catalog:
+        if entry.released or not entry.parsed or not isinstance(entry.data, dict):
+            # 解析できない仕様書は前回の記録を残し、直ったときに前回と比べる
+            if entry.path in previous:
+                current[entry.path] = previous[entry.path]
+            continue
+        diff.stats["specs"] += 1
+        spec = {"path": entry.path, "repo": entry.repo, "title": entry.title}
+        content = content_hash(entry.json)
+        old = previous.get(entry.path)
+        if old is not None and old["content"] == content:
+            diff.stats["unchanged"] += 1
+            current[entry.path] = old
+            continue
+        # 前回のスナップショットと同じく、ビューアに埋め込むJSONの形（キーは文字列、日付などは文字列）で比べる
+        data = json.loads(entry.json)
+        tree = spec_tree(data)
+        current[entry.path] = {"content": content, "repo": entry.repo, "title": entry.title, "tree": tree}
+        if old is None:
+            if not baseline:
+                diff.record(spec, "spec", entry.path, "added", diff.simple_details("仕様書が追加されました", False))
+        elif old["tree"]["hash"] != tree["hash"]:
+            diff.compare_spec(spec, old["tree"], tree, diff.load_snapshot(entry.path), data)
+        snapshot_file = snapshot_dir / f"{entry.path}.json"
+        snapshot_file.parent.mkdir(parents=True, exist_ok=True)
+        snapshot_file.write_text(entry.json, encoding='utf-8')
+    for spec_path in sorted(set(previous) - set(current)):
+        old = previous[spec_path]
+        spec = {"path": spec_path, "repo": old["repo"], "title": old["title"]}
+        diff.record(spec, "spec", spec_path, "removed", diff.simple_details("仕様書が削除されました", True))
+        (snapshot_dir / f"{spec_path}.json").unlink(missing_ok=True)
+    state_dir.mkdir(parents=True, exist_ok=True)
+    state["specs"] = current
+    (state_dir / HASHES_FILE).write_text(json.dumps(state, ensure_ascii=False), encoding='utf-8')
+    breaking = sum(1 for change in diff.changes if change["breaking"])
+    increment("spec_changes", breaking, breaking="true")
+    increment("spec_changes", len(diff.changes) - breaking, breaking="false")
+    logger.info(
+        f"仕様書の差分: 仕様書 {diff.stats['specs']}件 (変更なし {diff.stats['unchanged']}件), "
+        f"比較した部分木 {diff.stats['subtrees']}件, 変更 {len(diff.changes)}件 (互換性なし {breaking}件)"
+        + (" - 前回の記録がないため基準として保存しました" if baseline else "")
+    )
+    return {
+        "generated": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "baseline": baseline,
+        "summary": {
+            "specs": diff.stats["specs"],
+            "changed_specs": len({change["spec"] for change in diff.changes}),
+            "breaking": breaking,
+            "non_breaking": len(diff.changes) - breaking,
+        },
+        "changes": diff.changes,
+    }
+
+def write_changelog(run, static_site_dir=None, state_dir=None):
+    """
+    変更のあった実行を変更履歴に追加し、static_site_dir に <changelog_file>.json と .html を書き出す
+    変更履歴は diff_state_dir に保存し、新しい順に changelog_max_runs 件まで残す
+    """
+    from src.site_generator import get_template_environment
+    static_site_dir = Path(static_site_dir or CONFIG["static_site_dir"])
+    state_dir = Path(state_dir or get_state_dir())
+    history_file = state_dir / HISTORY_FILE
+    try:
+        runs = json.loads(history_file.read_text(encoding='utf-8'))["runs"] if history_file.exists() else []
+    except (OSError, ValueError, KeyError) as e:
+        logger.warning(f"変更履歴を読み込めませんでした: {e}")
+        runs = []
+    if run["changes"]:
+        runs = [run] + runs[:max(CONFIG.get("changelog_max_runs", 20) - 1, 0)]
+    changelog = json.dumps({"runs": runs}, ensure_ascii=False, indent=2, default=str) + "\n"
+    state_dir.mkdir(parents=True, exist_ok=True)
+    history_file.write_text(changelog, encoding='utf-8')
+    name = CONFIG.get("changelog_file") or "changelog"
+    static_site_dir.mkdir(parents=True, exist_ok=True)
+    (static_site_dir / f"{name}.json").write_text(changelog, encoding='utf-8')
+    html = get_template_environment().get_template("changelog.html").render(runs=runs, json_url=f"{name}.json")
+    (static_site_dir / f"{name}.html").write_text(html, encoding='utf-8')
+    logger.info(f"変更履歴を書き出しました: {static_site_dir / (name + '.html')}")
+    return runs
+
+def generate_changelog(catalog=None):
+    """
+    前回の実行からの仕様書の差分を取り、変更履歴を書き出す（diffコマンド、allでは収集後に実行する）
+    """
+    from src.catalog import SpecCatalog
+    if catalog is None:
+        catalog = SpecCatalog.load()
+    run = diff_catalog(catalog)
+    write_changelog(run)
+    return run
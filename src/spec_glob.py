@@ -0,0 +1,77 @@
+import re
+from functools import lru_cache
+
+GLOB_SPECIAL_CHARS = "*?[{"
+
+def glob_to_regex(pattern):
+    """
+    spec_pathのglobパターンを正規表現に変換する
+    対応する記法: * (区切り文字以外), ** (0個以上のディレクトリ), ?, [abc], [!abc], {a,b}
+    """
+    out = []
+    depth = 0
+    i = 0
+    n = len(pattern)
+    while i < n:
+        c = pattern[i]
+        if c == "*":
+            segment_start = i == 0 or pattern[i - 1] == "/"
+            if pattern.startswith("**", i) and segment_start:
+                if i + 2 == n:
+                    out.append(".*")
+                    i += 2
+                    continue
+                if pattern[i + 2] == "/":
+                    out.append("(?:[^/]+/)*")
+                    i += 3
+                    continue
+            while i + 1 < n and pattern[i + 1] == "*":
+                i += 1
+            out.append("[^/]*")
+        elif c == "?":
+            out.append("[^/]")
+        elif c == "[":
+            end = pattern.find("]", i + 2 if pattern.startswith("[!", i) else i + 1)
+            if end == -1:
+                out.append(re.escape(c))
+            else:
+                body = pattern[i + 1:end]
+                negate = body.startswith("!")
+                body = body[1:] if negate else body
+                out.append(("[^/" if negate else "[") + body.replace("\\", "\\\\") + "]")
+                i = end
+        elif c == "{":
+            depth += 1
+            out.append("(?:")
+        elif c == "," and depth:
+            out.append("|")
+        elif c == "}" and depth:
+            depth -= 1
+            out.append(")")
+        else:
+            out.append(re.escape(c))
+        i += 1
+    if depth:
+        raise ValueError(f"spec_pathの波括弧が閉じられていません: {pattern}")
+    return "".join(out)
+
+@lru_cache(maxsize=32)
+def compile_spec_pattern(pattern):
+    """
+    リポジトリ内の相対パス（/区切り）が一致するかを判定する関数を返す
+    """
+    regex = re.compile(glob_to_regex(pattern.strip("/")))
+    return lambda path: regex.fullmatch(path) is not None
+
+def static_prefix(pattern):
+    """
+    パターン先頭のワイルドカードを含まないディレクトリ部分を返す
+    例: docs/**/*.yaml -> docs, services/*/openapi.yml -> services
+    """
+    segments = pattern.strip("/").split("/")[:-1]
+    prefix = []
+    for segment in segments:
+        if any(ch in segment for ch in GLOB_SPECIAL_CHARS):
+            break
+        prefix.append(segment)
+    return "/".join(prefix)
@@ -0,0 +1,210 @@
+import json
+import base64
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from src.config import CONFIG
+
+logger = logging.getLogger('openapispec-collector')
+
+INDEX_FILE = "index.json"
+
+class VendorAssetError(Exception):
+    """
+    ビルドに必要な外部アセットをキャッシュからも取得先からも用意できない場合に送出する
+    """
+
+def compute_integrity(content):
+    """
+    Subresource Integrity と同じ形式（sha384-<base64>）のハッシュを返す
+    """
+    return "sha384-" + base64.b64encode(hashlib.sha384(content).digest()).decode("ascii")
+
+def get_lock_path():
+    lock_file = CONFIG.get("vendor_lock_file")
+    return Path(lock_file) if lock_file else None
+
+def load_locked_integrities():
+    """
+    vendor_lock_file に記録した URL -> integrity を返す（ファイルがない場合は空）
+    """
+    lock_path = get_lock_path()
+    if lock_path is None or not lock_path.exists():
+        return {}
+    with open(lock_path, "r", encoding='utf-8') as f:
+        return json.load(f)
+
+def save_locked_integrities(locked):
+    lock_path = get_lock_path()
+    if lock_path is None:
+        raise VendorAssetError("vendor_lock_file が設定されていないため integrity を記録できません")
+    tmp_path = lock_path.with_suffix(".tmp")
+    with open(tmp_path, "w", encoding='utf-8') as f:
+        json.dump(dict(sorted(locked.items())), f, ensure_ascii=False, indent=2)
+        f.write("\n")
+    tmp_path.replace(lock_path)
+
+class VendorCache:
+    """
+    Swagger UI / ReDoc などの外部アセットを内容のハッシュをファイル名にして保存するキャッシュ
+    index.json にURLごとのファイル名とintegrityを記録する
+    内容は設定または vendor_lock_file で固定したintegrityと照合し、固定されていないアセットは使わない
+    """
+
+    def __init__(self, cache_dir, locked=None):
+        self.cache_dir = Path(cache_dir)
+        self.lock = threading.Lock()
+        self.index = self._load_index()
+        # URL -> vendor_lock_file で固定したintegrity
+        self.locked = load_locked_integrities() if locked is None else locked
+
+    def _load_index(self):
+        index_path = self.cache_dir / INDEX_FILE
+        if not index_path.exists():
+            return {}
+        try:
+            with open(index_path, "r", encoding='utf-8') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning(f"外部アセットキャッシュの索引を読み込めませんでした: {index_path}, エラー: {e}")
+            return {}
+
+    def _save_index(self):
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        index_path = self.cache_dir / INDEX_FILE
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding='utf-8') as f:
+            json.dump(dict(sorted(self.index.items())), f, ensure_ascii=False, indent=1)
+        tmp_path.replace(index_path)
+
+    def expected_integrity(self, asset):
+        """
+        設定で固定されたintegrity、なければ vendor_lock_file で固定したintegrityを返す
+        どちらもない場合は、取得した内容を信用しないようVendorAssetErrorを送出する
+        """
+        expected = asset.get("integrity") or self.locked.get(asset["url"])
+        if not expected:
+            raise VendorAssetError(
+                f"外部アセットのintegrityが固定されていません: {asset['url']}。"
+                f"vendor_assets に integrity を設定するか、`python openapispec_cli.py vendor --lock` で "
+                f"{CONFIG.get('vendor_lock_file')} に記録してください"
+            )
+        return expected
+
+    def read(self, asset):
+        """
+        キャッシュからアセットを読み出す。キャッシュにない場合はNoneを返し、
+        内容がintegrityと一致しない場合はVendorAssetErrorを送出する
+        """
+        with self.lock:
+            recorded = self.index.get(asset["url"])
+        if not recorded:
+            return None
+        asset_file = self.cache_dir / recorded["file"]
+        if not asset_file.exists():
+            return None
+        content = asset_file.read_bytes()
+        expected = self.expected_integrity(asset)
+        if compute_integrity(content) != expected:
+            raise VendorAssetError(
+                f"外部アセットのキャッシュがintegrityと一致しません: {asset['url']} "
+                f"(期待値: {expected}, キャッシュ: {compute_integrity(content)})"
+            )
+        return content
+
+    def store(self, asset, content):
+        """
+        アセットをキャッシュに保存する。固定されたintegrityと一致しない場合は保存しない
+        """
+        integrity = compute_integrity(content)
+        expected = self.expected_integrity(asset)
+        if integrity != expected:
+            raise VendorAssetError(
+                f"取得した外部アセットがintegrityと一致しません: {asset['url']} (期待値: {expected}, 取得: {integrity})"
+            )
+        file_name = hashlib.sha256(content).hexdigest() + Path(asset["url"]).suffix
+        self.cache_dir.mkdir(exist_ok=True, parents=True)
+        asset_file = self.cache_dir / file_name
+        if not asset_file.exists():
+            tmp_path = asset_file.with_suffix(".tmp")
+            tmp_path.write_bytes(content)
+            tmp_path.replace(asset_file)
+        with self.lock:
+            self.index[asset["url"]] = {"file": file_name, "integrity": integrity, "size": len(content)}
+            self._save_index()
+        return integrity
+
+def get_vendor_cache():
+    return VendorCache(CONFIG.get("vendor_cache_dir", ".vendor_cache"))
+
+def get_asset_config(name):
+    assets = CONFIG.get("vendor_assets", {})
+    if name not in assets:
+        raise VendorAssetError(f"未定義の外部アセットです: {name}")
+    return assets[name]
+
+def download_asset(asset):
+    # ビルドはキャッシュ済みのアセットを使うことが多いため、requestsは取得する場合だけ読み込む
+    import requests
+    logger.info(f"外部アセットを取得中: {asset['url']}")
+    try:
+        response = requests.get(asset["url"], timeout=CONFIG.get("http_timeout", 30))
+        response.raise_for_status()
+    except requests.RequestException as e:
+        raise VendorAssetError(f"外部アセットを取得できませんでした: {asset['url']}, エラー: {e}") from e
+    return response.content
+
+def vendor_assets(names=None, refresh=False, lock=False):
+    """
+    外部アセットを取得してキャッシュに保存する（vendorコマンド）
+    refreshを指定しない場合、キャッシュ済みのアセットは取得し直さない
+    lockを指定すると、設定でintegrityを固定していないアセットを取得し直し、その内容のintegrityを
+    vendor_lock_file に記録する（URLのバージョンを上げた場合に実行し、記録したファイルをコミットする）
+    戻り値は {アセット名: integrity}
+    """
+    cache = get_vendor_cache()
+    result = {}
+    for name in names or sorted(CONFIG.get("vendor_assets", {})):
+        asset = get_asset_config(name)
+        if lock and not asset.get("integrity"):
+            content = download_asset(asset)
+            cache.locked[asset["url"]] = compute_integrity(content)
+            save_locked_integrities(cache.locked)
+            logger.info(f"外部アセットのintegrityを記録しました: {name} ({get_lock_path()})")
+        else:
+            # 固定されていないアセットは取得する前に失敗させる
+            cache.expected_integrity(asset)
+            content = None if refresh else cache.read(asset)
+            if content is not None:
+                result[name] = cache.expected_integrity(asset)
+                logger.info(f"{name}: {asset['url']} {result[name]} (キャッシュ済み)")
+                continue
+            content = download_asset(asset)
+        cache.store(asset, content)
+        logger.info(f"外部アセットをキャッシュしました: {name} ({len(content)} バイト)")
+        result[name] = cache.expected_integrity(asset)
+        logger.info(f"{name}: {asset['url']} {result[name]}")
+    return result
+
+def load_vendor_asset(name, cache=None):
+    """
+    ビルドに埋め込む外部アセットの内容を文字列で返す
+    キャッシュになければ vendor_offline が False の場合に限り1回だけ取得してキャッシュする
+    どちらもできない場合は、壊れたビューアを生成しないようVendorAssetErrorを送出する
+    """
+    cache = cache or get_vendor_cache()
+    asset = get_asset_config(name)
+    cache.expected_integrity(asset)
+    content = cache.read(asset)
+    if content is None:
+        if CONFIG.get("vendor_offline", False):
+            raise VendorAssetError(
+                f"外部アセットがキャッシュにありません: {name} ({asset['url']})。"
+                f"ネットワークに接続できる環境で `python openapispec_cli.py vendor` を実行してください"
+            )
+        content = download_asset(asset)
+        cache.store(asset, content)
+    text = content.decode("utf-8")
+    logger.info(f"外部アセットを読み込みました: {name} ({len(text)} バイト)")
+    return text
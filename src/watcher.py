@@ -0,0 +1,169 @@
+import time
+import logging
+from pathlib import Path
+from src.config import CONFIG
+from src.catalog import SpecCatalog, discover_spec_files, parse_spec_file
+from src.parse_cache import get_parse_cache
+from src.catalog_db import update_catalog_db
+from src.site_generator import (
+    STATIC_ASSETS_DIR, SEARCH_INDEX_DIR, render_index_html, script_json, write_catalog_summaries,
+    write_search_index, write_search_shards, write_spec_payload, write_spec_payloads,
+)
+
+logger = logging.getLogger('openapispec-collector')
+
+def file_stamp(path):
+    """
+    変更の検出に使う (更新日時, サイズ) を返す
+    """
+    stat = path.stat()
+    return stat.st_mtime_ns, stat.st_size
+
+def scan_files(directories):
+    files = {}
+    for directory in directories:
+        for path in directory.rglob("*"):
+            if path.is_file():
+                files[path] = file_stamp(path)
+    return files
+
+class SiteWatcher:
+    """
+    static_site/<リポジトリ>/ 配下と static_assets/ をポーリングで監視し、変更のあった部分だけを生成し直す
+    仕様書が変わった場合は、その仕様書だけを解析し直して分割出力のJSON・仕様書一覧・検索索引のシャードを更新する
+    index.html はテンプレート・アセットが変わった場合と、埋め込んだ内容（仕様書一覧、inlineの場合は仕様書）が
+    変わった場合だけ生成し直す
+    """
+
+    def __init__(self, static_site_dir=None):
+        self.static_site_dir = Path(static_site_dir or CONFIG["static_site_dir"])
+        self.split_output = CONFIG.get("site_output_mode", "inline") == "split"
+        self.parse_cache = get_parse_cache()
+        self.catalog = None
+        self.catalog_json = None
+        self.search_scripts = {}
+        self.repo_files = {}
+        self.asset_files = {}
+
+    def repo_dirs(self):
+        if not self.static_site_dir.exists():
+            return []
+        return [
+            path for path in sorted(self.static_site_dir.iterdir())
+            if path.is_dir() and path.name != "static" and not path.name.startswith(".")
+        ]
+
+    def build(self):
+        """
+        最初に静的サイト全体を生成する
+        """
+        self.repo_files = scan_files(self.repo_dirs())
+        self.asset_files = scan_files([STATIC_ASSETS_DIR])
+        self.catalog = SpecCatalog.load(self.static_site_dir)
+        if self.split_output:
+            self.catalog_json = script_json(write_spec_payloads(self.catalog, self.static_site_dir))
+        self.search_scripts = write_search_index(self.catalog, self.static_site_dir)
+        update_catalog_db(self.catalog)
+        render_index_html(self.catalog, self.static_site_dir, self.catalog_json)
+        logger.info(f"静的サイトを生成しました: 仕様書 {len(self.catalog)}件")
+
+    def poll(self):
+        """
+        前回からの変更を反映し、反映した内容を返す
+        specs: 解析し直した仕様書の数, removed: 削除された仕様書の数, shards: 書き出した検索索引のシャードの数,
+        html: index.html を生成し直したか
+        """
+        repo_files = scan_files(self.repo_dirs())
+        asset_files = scan_files([STATIC_ASSETS_DIR])
+        changed_files = {
+            path for path in set(repo_files) | set(self.repo_files)
+            if repo_files.get(path) != self.repo_files.get(path)
+        }
+        assets_changed = asset_files != self.asset_files
+        result = {"specs": 0, "removed": 0, "shards": 0, "html": False}
+        embedded_changed = False
+        if changed_files:
+            embedded_changed = self.update_specs(changed_files, result)
+        self.repo_files = repo_files
+        if assets_changed or embedded_changed:
+            render_index_html(self.catalog, self.static_site_dir, self.catalog_json)
+            result["html"] = True
+        # 生成に失敗した場合は次回も生成し直すよう、成功してから記録する
+        self.asset_files = asset_files
+        return result
+
+    def update_specs(self, changed_files, result):
+        """
+        変更のあった仕様書だけを解析し直し、カタログ・分割出力のJSON・検索索引・カタログのデータベースを更新する
+        index.html に埋め込んだ内容が変わった場合はTrueを返す
+        """
+        jobs = {job[1]: job for job in discover_spec_files(self.static_site_dir)}
+        entries = {entry.path: entry for entry in self.catalog}
+        # 仕様書以外のファイル（$refの参照先）が変わった場合は、同じリポジトリの仕様書をすべて解析し直す
+        changed_repos = {
+            path.relative_to(self.static_site_dir).parts[0] for path in changed_files
+            if path not in jobs and str(path.relative_to(self.static_site_dir)) not in entries
+        }
+        summaries = self.catalog.summaries()
+        builder = self.catalog.search_builder
+        for spec_file, job in jobs.items():
+            if spec_file not in changed_files and job[0].name not in changed_repos:
+                continue
+            entry = parse_spec_file(self.static_site_dir, *job, self.parse_cache, self.catalog.resolver)
+            for warning in entry.warnings:
+                logger.warning(f"{entry.path}: {warning}")
+            entries[entry.path] = entry
+            if entry.parsed and isinstance(entry.data, dict):
+                builder.add_spec(entry)
+            else:
+                builder.remove_spec(entry.path)
+            if self.split_output and entry.parsed:
+                write_spec_payload(self.static_site_dir, entry)
+            result["specs"] += 1
+        spec_paths = [str(spec_file.relative_to(self.static_site_dir)) for spec_file in jobs]
+        for path in set(entries) - set(spec_paths):
+            removed = entries.pop(path)
+            builder.remove_spec(path)
+            (self.static_site_dir / removed.payload_path).unlink(missing_ok=True)
+            result["removed"] += 1
+        if not result["specs"] and not result["removed"]:
+            return False
+        self.catalog.entries = [entries[path] for path in spec_paths]
+        self.catalog.search_index = builder.build()
+        scripts = write_search_shards(
+            self.static_site_dir / SEARCH_INDEX_DIR, self.catalog.search_index, self.search_scripts
+        )
+        result["shards"] = sum(1 for name, script in scripts.items() if self.search_scripts.get(name) != script)
+        self.search_scripts = scripts
+        update_catalog_db(self.catalog)
+        if not self.split_output:
+            return True
+        if self.catalog.summaries() == summaries:
+            return False
+        self.catalog_json = script_json(write_catalog_summaries(self.catalog, self.static_site_dir))
+        return True
+
+def watch(interval=None):
+    """
+    静的サイトを生成した後、変更を監視して生成し直す（watchコマンド）
+    """
+    interval = interval or CONFIG.get("watch_interval", 1.0)
+    watcher = SiteWatcher()
+    watcher.build()
+    logger.info(f"変更を監視しています (間隔: {interval}秒, Ctrl+Cで終了)")
+    try:
+        while True:
+            time.sleep(interval)
+            try:
+                result = watcher.poll()
+            except Exception as e:
+                # 編集途中のテンプレートなどで失敗しても監視は続ける
+                logger.error(f"再生成中にエラーが発生しました: {e}")
+                continue
+            if result["specs"] or result["removed"] or result["html"]:
+                logger.info(
+                    f"再生成しました: 仕様書 {result['specs']}件, 削除 {result['removed']}件, "
+                    f"検索索引のシャード {result['shards']}件, index.html: {'再生成' if result['html'] else '変更なし'}"
+                )
+    except KeyboardInterrupt:
+        logger.info("監視を終了します")
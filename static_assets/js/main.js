@@ -5,6 +5,11 @@
 // グローバル変数の定義
 window.apiSpecs = typeof apiSpecs !== 'undefined' ? apiSpecs : {}; // テンプレートから渡されたデータを使用
 window.redocTemplateBase64 = typeof redocTemplateBase64 !== 'undefined' ? redocTemplateBase64 : ''; // テンプレートから渡されたデータを使用
+window.apiCatalog = typeof apiCatalog !== 'undefined' ? apiCatalog : null; // 分割出力の場合の仕様書一覧
+window.compressedApiSpecs = typeof compressedApiSpecs !== 'undefined' ? compressedApiSpecs : null; // 圧縮して埋め込んだ仕様書
+window.apiSpecCompression = typeof apiSpecCompression !== 'undefined' ? apiSpecCompression : null; // 圧縮方式 (gzip / deflate)
+window.sharedComponents = typeof sharedComponents !== 'undefined' ? sharedComponents : null; // 仕様書間で共通のcomponents
+Object.values(window.apiSpecs).forEach(rehydrateSpec);
 
 // CDNが利用できない場合のフォールバックリンク
 const CDN_LINKS = {
@@ -27,7 +32,7 @@ const appState = {
 document.addEventListener('DOMContentLoaded', function() {
     // データの存在確認とロギング
     console.log('API仕様データ:', window.apiSpecs);
-    console.log('API数:', Object.keys(window.apiSpecs).length);
+    console.log('API数:', getCatalogEntries().length);
     
     // 必要に応じて外部リソースを読み込み
     if (!window.SwaggerUIBundle) {
@@ -51,10 +56,14 @@ document.addEventListener('DOMContentLoaded', function() {
         debounceTimeout = setTimeout(() => {
             if (query.length >= 2) {
                 appState.searchQuery = query;
-                appState.searchResults = searchAllSpecs(query, window.apiSpecs);
-                updateSearchResults(appState.searchResults, appState);
-                // 検索結果タブに切り替え
-                document.getElementById('tab-search').click();
+                // 検索索引の必要なシャードだけを読み込んで検索
+                searchAllSpecs(query).then(results => {
+                    if (appState.searchQuery !== query) return;
+                    appState.searchResults = results;
+                    updateSearchResults(appState.searchResults, appState);
+                    // 検索結果タブに切り替え
+                    document.getElementById('tab-search').click();
+                });
             } else if (query.length === 0) {
                 // 検索クエリが空の場合はAPI一覧に戻る
                 document.getElementById('tab-apis').click();
@@ -78,8 +87,10 @@ document.addEventListener('DOMContentLoaded', function() {
         
         // 検索結果がなければ再検索
         if (appState.searchResults.length === 0 && appState.searchQuery) {
-            appState.searchResults = searchAllSpecs(appState.searchQuery, window.apiSpecs);
-            updateSearchResults(appState.searchResults, appState);
+            searchAllSpecs(appState.searchQuery).then(results => {
+                appState.searchResults = results;
+                updateSearchResults(appState.searchResults, appState);
+            });
         }
     });
     
@@ -189,10 +200,9 @@ function initializeApiList() {
 
     // 1. リポジトリごとにAPI仕様書をグループ化
     const repoMap = {};
-    for (const [specPath, specData] of Object.entries(window.apiSpecs)) {
-        const repoName = specPath.split('/')[0];
-        if (!repoMap[repoName]) repoMap[repoName] = [];
-        repoMap[repoName].push({ specPath, specData });
+    for (const entry of getCatalogEntries()) {
+        if (!repoMap[entry.repo]) repoMap[entry.repo] = [];
+        repoMap[entry.repo].push(entry);
     }
 
     // 2. 各リポジトリごとに親要素＋子リストを作成
@@ -212,8 +222,7 @@ function initializeApiList() {
         const childList = document.createElement('div');
         childList.className = 'repo-api-list';
 
-        repoMap[repoName].forEach(({ specPath, specData }) => {
-            const title = specData?.info?.title || specPath;
+        repoMap[repoName].forEach(({ path: specPath, title, description }) => {
             const listItem = document.createElement('div');
             listItem.className = 'list-group-item api-list-item';
             listItem.style.cursor = 'pointer';
@@ -224,12 +233,11 @@ function initializeApiList() {
             listItem.appendChild(heading);
 
             // 説明文
-            if (specData?.info?.description) {
-                const description = document.createElement('p');
-                description.className = 'api-description mb-2';
-                description.textContent = specData.info.description.substring(0, 150) +
-                    (specData.info.description.length > 150 ? '...' : '');
-                listItem.appendChild(description);
+            if (description) {
+                const descriptionElement = document.createElement('p');
+                descriptionElement.className = 'api-description mb-2';
+                descriptionElement.textContent = description;
+                listItem.appendChild(descriptionElement);
             }
 
             // API名クリックで現在の表示方法で開く
@@ -253,6 +261,23 @@ function initializeApiList() {
     });
 }
 
+// サイドバーに表示する仕様書一覧を取得
+// 分割出力の場合は埋め込まれた仕様書一覧を、そうでなければ埋め込まれた仕様書から一覧を作成する
+function getCatalogEntries() {
+    if (window.apiCatalog) {
+        return window.apiCatalog;
+    }
+    return Object.entries(window.apiSpecs).map(([specPath, specData]) => {
+        const description = specData?.info?.description || '';
+        return {
+            path: specPath,
+            repo: specPath.split('/')[0],
+            title: specData?.info?.title || specPath,
+            description: description.substring(0, 150) + (description.length > 150 ? '...' : '')
+        };
+    });
+}
+
 // Base64文字列をデコードする関数
 function decodeBase64(base64) {
     try {
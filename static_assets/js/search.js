@@ -2,225 +2,212 @@
  * OpenAPI仕様書検索機能
  */
 
+// 検索索引のシャード（ビルド時にPythonで作成し、static/search/<名前>.js として配置される）
+const searchShards = {};
+const searchShardLoads = {};
+
+// 日本語は2文字ずつ区切って索引されている（src/search_index.py の tokenize() と同じ規則）
+const CJK_PATTERN = /[\u3040-\u30ff\u3400-\u9fff\uf900-\ufaff]+/g;
+
+// シャードのスクリプトから呼び出される
+function registerSearchShard(name, data) {
+    searchShards[name] = data;
+}
+
+// シャードを<script>で読み込む（file://で開いた場合も読み込めるようfetchは使わない）
+function loadSearchShard(name) {
+    if (searchShards[name]) {
+        return Promise.resolve(searchShards[name]);
+    }
+    if (!searchShardLoads[name]) {
+        searchShardLoads[name] = new Promise((resolve, reject) => {
+            const baseUrl = typeof searchIndexBaseUrl !== 'undefined' ? searchIndexBaseUrl : 'static/search/';
+            const script = document.createElement('script');
+            script.src = `${baseUrl}${name}.js`;
+            script.onload = () => searchShards[name]
+                ? resolve(searchShards[name])
+                : reject(new Error(`検索索引を読み込めませんでした: ${name}`));
+            script.onerror = () => {
+                delete searchShardLoads[name];
+                reject(new Error(`検索索引を読み込めませんでした: ${name}`));
+            };
+            document.head.appendChild(script);
+        });
+    }
+    return searchShardLoads[name];
+}
+
+// 検索語を索引と同じ規則で分割する
+function tokenizeQuery(query) {
+    const tokens = new Set();
+    for (const word of query.toLowerCase().match(/[\p{L}\p{N}]+/gu) || []) {
+        for (const part of word.split(CJK_PATTERN)) {
+            if (part.length >= 2) tokens.add(part);
+        }
+        for (const run of word.match(CJK_PATTERN) || []) {
+            if (run.length === 1) tokens.add(run);
+            for (let i = 0; i + 2 <= run.length; i++) {
+                tokens.add(run.substring(i, i + 2));
+            }
+        }
+    }
+    return [...tokens];
+}
+
+// 語シャードの名前（src/search_index.py の shard_key() と同じ規則）
+function searchShardKey(term) {
+    const first = term[0];
+    return /^[a-z0-9]$/.test(first) ? first : 'x' + (term.codePointAt(0) % 16).toString(16);
+}
+
+// 検索語で前方一致する語の出現位置を集め、仕様書 -> (項目 -> 重み) で返す
+function findTokenHits(token) {
+    const hits = new Map();
+    const shard = searchShards[`terms-${searchShardKey(token)}`];
+    if (!shard) return hits;
+    // 語はソート済みなので二分探索で前方一致の開始位置を求める
+    let low = 0;
+    let high = shard.terms.length;
+    while (low < high) {
+        const mid = (low + high) >> 1;
+        if (shard.terms[mid] < token) low = mid + 1; else high = mid;
+    }
+    const seen = new Set();
+    for (let i = low; i < shard.terms.length && shard.terms[i].startsWith(token); i++) {
+        const postings = shard.postings[i];
+        for (let j = 0; j < postings.length; j += 3) {
+            const [spec, weight, item] = [postings[j], postings[j + 1], postings[j + 2]];
+            const key = `${item}:${weight}`;
+            if (seen.has(key)) continue;
+            seen.add(key);
+            if (!hits.has(spec)) hits.set(spec, new Map());
+            const items = hits.get(spec);
+            items.set(item, (items.get(item) || 0) + weight);
+        }
+    }
+    return hits;
+}
+
+// 索引の項目を検索結果の表示用に変換
+function toMatch(item, query) {
+    const [path, value, text, method, operations] = item;
+    const match = {
+        path: path,
+        value: value,
+        snippet: highlightSnippet(getSnippet(text, query), query)
+    };
+    if (method) match.method = method;
+    if (operations) {
+        match.operations = operations.map(([opMethod, summary, operationId]) => ({
+            method: opMethod,
+            summary: summary,
+            operationId: operationId
+        }));
+    }
+    return match;
+}
+
+// serveコマンドで配信している場合はサーバーの検索APIを使う（使えない場合は索引のシャードで検索する）
+let searchApiAvailable = typeof searchApiUrl !== 'undefined' && /^https?:$/.test(window.location.protocol);
+
+// サーバーの検索API（src/server.py）で検索する。項目は索引と同じ形式で返るので表示用に変換する
+function searchWithApi(query) {
+    return fetch(`${searchApiUrl}?q=${encodeURIComponent(query.trim())}`).then(response => {
+        if (!response.ok) {
+            throw new Error(`検索APIを利用できません (${response.status})`);
+        }
+        return response.json();
+    }).then(results => results.map(result => ({
+        ...result,
+        matches: result.matches.map(item => toMatch(item, query))
+    })));
+}
+
 // 全API横断検索機能
-function searchAllSpecs(query, apiSpecs) {
+// ビルド時に作成した転置索引を検索し、検索結果をPromiseで返す
+// すべての検索語がいずれかの項目に一致した仕様書を、一致した項目の重みの合計でスコア付けする
+function searchAllSpecs(query) {
     if (!query || query.trim().length < 2) {
-        return [];
+        return Promise.resolve([]);
+    }
+    const tokens = tokenizeQuery(query.trim());
+    if (tokens.length === 0) {
+        return Promise.resolve([]);
     }
-    
-    const results = [];
-    const searchQuery = query.toLowerCase().trim();
-    
-    // 検索クエリを単語に分割
-    const queryWords = searchQuery.split(/\s+/).filter(word => word.length >= 2);
     
     // インジケータの表示
     showSearchIndicator();
     
-    // すべてのAPI仕様書を検索
-    for (const [specPath, specData] of Object.entries(apiSpecs)) {
-        const repoName = specPath.split('/')[0];
-        const title = specData?.info?.title || repoName;
-        const description = specData?.info?.description || '';
-        const version = specData?.info?.version || '';
-        
-        let score = 0;
-        let matchItems = [];
-        
-        // タイトル、説明文、バージョンの一致をチェック
-        const titleMatch = title.toLowerCase().includes(searchQuery);
-        if (titleMatch) score += 100;
-        
-        if (description && description.toLowerCase().includes(searchQuery)) {
-            score += 50;
-            matchItems.push({
-                path: 'info.description',
-                value: description,
-                snippet: highlightSnippet(getSnippet(description, searchQuery), searchQuery)
-            });
-        }
-        
-        if (version && version.toLowerCase().includes(searchQuery)) {
-            score += 30;
-            matchItems.push({
-                path: 'info.version',
-                value: version,
-                snippet: `バージョン: ${version}`
-            });
-        }
-        
-        // エンドポイント(paths)の特別な検索処理
-        if (specData.paths) {
-            for (const [path, pathObj] of Object.entries(specData.paths)) {
-                // パスが検索クエリを含む場合
-                if (path.toLowerCase().includes(searchQuery)) {
-                    score += 80;
-                    let operations = [];
-                    
-                    // 利用可能なHTTPメソッドを収集
-                    for (const [method, operation] of Object.entries(pathObj)) {
-                        if (['get', 'post', 'put', 'delete', 'patch'].includes(method)) {
-                            operations.push({
-                                method: method.toUpperCase(),
-                                summary: operation.summary || '',
-                                operationId: operation.operationId || ''
-                            });
-                        }
-                    }
-                    
-                    matchItems.push({
-                        path: `paths.${path}`,
-                        value: path,
-                        snippet: `エンドポイント: ${path}`,
-                        operations: operations
-                    });
+    const search = searchApiAvailable
+        ? searchWithApi(query).catch(() => {
+            searchApiAvailable = false;
+            return searchWithShards(query, tokens);
+        })
+        : searchWithShards(query, tokens);
+    return search.finally(() => {
+        // インジケータの非表示
+        hideSearchIndicator();
+    });
+}
+
+// 索引のシャードを読み込んで検索する
+function searchWithShards(query, tokens) {
+    return loadSearchShard('index').then(meta => {
+        const shardNames = [...new Set(tokens.map(token => `terms-${searchShardKey(token)}`))]
+            .filter(name => meta.termShards.includes(name));
+        return Promise.all(shardNames.map(loadSearchShard)).then(() => {
+            // 仕様書ごとに、すべての検索語に一致した項目と重みを集計
+            let specHits = null;
+            for (const token of tokens) {
+                const tokenHits = findTokenHits(token);
+                if (specHits === null) {
+                    specHits = tokenHits;
+                    continue;
                 }
-                
-                // 各HTTPメソッドの詳細情報を検索
-                for (const [method, operation] of Object.entries(pathObj)) {
-                    if (!['get', 'post', 'put', 'delete', 'patch'].includes(method)) continue;
-                    
-                    const methodUpper = method.toUpperCase();
-                    let matched = false;
-                    
-                    // サマリーの検索
-                    if (operation.summary && operation.summary.toLowerCase().includes(searchQuery)) {
-                        score += 60;
-                        matched = true;
-                    }
-                    
-                    // operationIdの検索
-                    if (operation.operationId && operation.operationId.toLowerCase().includes(searchQuery)) {
-                        score += 70;
-                        matched = true;
-                    }
-                    
-                    // タグの検索
-                    if (operation.tags && operation.tags.some(tag => tag.toLowerCase().includes(searchQuery))) {
-                        score += 50;
-                        matched = true;
+                for (const [spec, items] of specHits) {
+                    if (!tokenHits.has(spec)) {
+                        specHits.delete(spec);
+                        continue;
                     }
-                    
-                    // 説明文の検索
-                    if (operation.description && operation.description.toLowerCase().includes(searchQuery)) {
-                        score += 40;
-                        matched = true;
-                    }
-                    
-                    if (matched) {
-                        matchItems.push({
-                            path: `paths.${path}.${method}`,
-                            value: `${methodUpper} ${path}`,
-                            snippet: highlightSnippet(operation.summary || operation.operationId || `${methodUpper} 操作`, searchQuery),
-                            method: methodUpper
-                        });
+                    for (const [item, weight] of tokenHits.get(spec)) {
+                        items.set(item, (items.get(item) || 0) + weight);
                     }
                 }
             }
-        }
-        
-        // スキーマ定義の検索処理
-        if (specData.components && specData.components.schemas) {
-            for (const [schemaName, schema] of Object.entries(specData.components.schemas)) {
-                // スキーマ名の一致
-                if (schemaName.toLowerCase().includes(searchQuery)) {
-                    score += 60;
-                    matchItems.push({
-                        path: `components.schemas.${schemaName}`,
-                        value: schemaName,
-                        snippet: `スキーマ: ${schemaName}`,
-                        schemaType: schema.type || 'object'
-                    });
-                }
-                
-                // スキーマ説明の一致
-                if (schema.description && schema.description.toLowerCase().includes(searchQuery)) {
-                    score += 40;
-                    matchItems.push({
-                        path: `components.schemas.${schemaName}.description`,
-                        value: schema.description,
-                        snippet: highlightSnippet(`${schemaName}: ${getSnippet(schema.description, searchQuery)}`, searchQuery)
-                    });
-                }
-                
-                // スキーマのプロパティ検索
-                if (schema.properties) {
-                    for (const [propName, propDef] of Object.entries(schema.properties)) {
-                        // プロパティ名の一致
-                        if (propName.toLowerCase().includes(searchQuery)) {
-                            score += 50;
-                            matchItems.push({
-                                path: `components.schemas.${schemaName}.properties.${propName}`,
-                                value: propName,
-                                snippet: `${schemaName}.${propName}: ${propDef.type || 'any'}`
-                            });
-                        }
-                        
-                        // プロパティの説明一致
-                        if (propDef.description && propDef.description.toLowerCase().includes(searchQuery)) {
-                            score += 30;
-                            matchItems.push({
-                                path: `components.schemas.${schemaName}.properties.${propName}.description`,
-                                value: propDef.description,
-                                snippet: highlightSnippet(`${schemaName}.${propName}: ${getSnippet(propDef.description, searchQuery)}`, searchQuery)
-                            });
-                        }
-                    }
+            
+            // 一致した項目を含む項目シャードを読み込む
+            const itemShards = new Set();
+            for (const items of specHits.values()) {
+                for (const item of items.keys()) {
+                    itemShards.add(`items-${Math.floor(item / meta.itemsPerShard)}`);
                 }
             }
-        }
-        
-        // より一般的なテキスト検索のために仕様書をフラット化
-        const flattenedMatches = flattenSpec(specData, searchQuery);
-        matchItems = [...matchItems, ...flattenedMatches];
-        
-        // 複数単語の検索で単語ごとのスコアを加算
-        if (queryWords.length > 1) {
-            queryWords.forEach(word => {
-                if (title.toLowerCase().includes(word)) score += 20;
-                if (description && description.toLowerCase().includes(word)) score += 10;
-                
-                // パスやメソッドの一致も評価
-                if (matchItems.some(item => 
-                    item.path.includes('paths') && item.value.toLowerCase().includes(word))) {
-                    score += 15;
+            return Promise.all([...itemShards].map(loadSearchShard)).then(() => {
+                const results = [];
+                for (const [spec, items] of specHits) {
+                    const [specPath, title, repo, description] = meta.specs[spec];
+                    const ranked = [...items].sort((a, b) => b[1] - a[1] || a[0] - b[0]);
+                    const matches = ranked.map(([item]) => {
+                        const shard = searchShards[`items-${Math.floor(item / meta.itemsPerShard)}`];
+                        return shard[item % meta.itemsPerShard];
+                    });
+                    results.push({
+                        specPath: specPath,
+                        title: title,
+                        repo: repo,
+                        description: description,
+                        matches: matches.slice(0, 15).map(item => toMatch(item, query)), // 上位15件に制限
+                        totalMatches: matches.length,
+                        titleMatch: matches.some(item => item[0] === 'info.title'),
+                        queryScore: ranked.reduce((sum, [, weight]) => sum + weight, 0)
+                    });
                 }
+                // スコア順にソート
+                results.sort((a, b) => b.queryScore - a.queryScore);
+                return results;
             });
-        }
-        
-        // 重複を除去し上位のマッチを保持
-        const uniqueMatches = [];
-        const seenPaths = new Set();
-        
-        for (const match of matchItems) {
-            if (!seenPaths.has(match.path)) {
-                seenPaths.add(match.path);
-                uniqueMatches.push(match);
-            }
-        }
-        
-        // 最低スコアまたはマッチがある場合に結果に追加
-        if (score > 0 || uniqueMatches.length > 0) {
-            results.push({
-                specPath: specPath,
-                title: title,
-                repo: repoName,
-                description: description?.substring(0, 150) + (description?.length > 150 ? '...' : ''),
-                matches: uniqueMatches.slice(0, 15), // 上位15件に制限
-                totalMatches: uniqueMatches.length,
-                titleMatch: titleMatch,
-                queryScore: score
-            });
-        }
-    }
-    
-    // インジケータの非表示
-    hideSearchIndicator();
-    
-    // スコア順にソート
-    results.sort((a, b) => b.queryScore - a.queryScore);
-    
-    return results;
+        });
+    });
 }
 
 // 検索インジケータの表示
@@ -249,57 +236,6 @@ function hideSearchIndicator() {
     }
 }
 
-// オブジェクトをフラット化して検索するヘルパー関数
-function flattenSpec(obj, query, path = '', maxDepth = 5, currentDepth = 0) {
-    let items = [];
-    
-    if (typeof obj !== 'object' || obj === null || currentDepth >= maxDepth) {
-        return items;
-    }
-    
-    for (const [key, value] of Object.entries(obj)) {
-        // 特定のノイズの多いプロパティをスキップ
-        if (['example', 'examples', 'enum'].includes(key)) continue;
-        
-        const currentPath = path ? `${path}.${key}` : key;
-        
-        // 特定のコンテキストを優先
-        const isHighPriorityContext = currentPath.includes('paths') || 
-                                     currentPath.includes('components.schemas') ||
-                                     currentPath.includes('info');
-        
-        if (typeof value === 'object' && value !== null) {
-            // 再帰的にオブジェクトを探索
-            items = [...items, ...flattenSpec(value, query, currentPath, maxDepth, currentDepth + 1)];
-        } else if (typeof value === 'string') {
-            const stringValue = value.toLowerCase();
-            if (stringValue.includes(query.toLowerCase())) {
-                items.push({
-                    path: currentPath,
-                    value: value,
-                    snippet: highlightSnippet(getSnippet(value, query), query),
-                    priority: isHighPriorityContext ? 2 : 1
-                });
-            }
-        } else if (typeof value === 'number' || typeof value === 'boolean') {
-            const stringValue = String(value).toLowerCase();
-            if (stringValue === query.toLowerCase()) {
-                items.push({
-                    path: currentPath,
-                    value: String(value),
-                    snippet: String(value),
-                    priority: isHighPriorityContext ? 2 : 1
-                });
-            }
-        }
-    }
-    
-    // 優先度でソート
-    items.sort((a, b) => b.priority - a.priority);
-    
-    return items;
-}
-
 // スニペットのハイライト処理を改善
 function highlightSnippet(text, query) {
     if (!text || !query) return text;
@@ -2,6 +2,64 @@
  * OpenAPI仕様書ビューア機能
  */
 
+// 共有テーブルへの参照に置き換えられたcomponentsを元に戻す（src/shared_components.py と同じキー）
+const SHARED_COMPONENT_KEY = 'x-openapispec-shared';
+
+function rehydrateSpec(spec) {
+    const components = spec && spec.components;
+    if (!window.sharedComponents || !components || typeof components !== 'object') {
+        return spec;
+    }
+    for (const section of Object.values(components)) {
+        if (!section || typeof section !== 'object') continue;
+        for (const [name, value] of Object.entries(section)) {
+            const key = value && typeof value === 'object' ? value[SHARED_COMPONENT_KEY] : undefined;
+            if (key in window.sharedComponents && Object.keys(value).length === 1) {
+                // 仕様書ごとに別のオブジェクトにする（ビューアが書き換えても他の仕様書に影響しないように）
+                section[name] = JSON.parse(JSON.stringify(window.sharedComponents[key]));
+            }
+        }
+    }
+    return spec;
+}
+
+// 圧縮して埋め込まれた仕様書をブラウザの DecompressionStream で展開する（file:// でも動作する）
+function decompressSpec(packed) {
+    const bytes = Uint8Array.from(atob(packed), c => c.charCodeAt(0));
+    const stream = new Blob([bytes]).stream().pipeThrough(new DecompressionStream(window.apiSpecCompression));
+    return new Response(stream).text().then(text => rehydrateSpec(JSON.parse(text)));
+}
+
+// 分割出力の場合に、未読み込みの仕様書のJSONを読み込んでapiSpecsに追加
+// 圧縮して埋め込まれている場合は、表示する仕様書だけを展開してapiSpecsに追加
+function loadSpec(specPath) {
+    if (specPath in window.apiSpecs || !window.apiCatalog) {
+        return Promise.resolve(window.apiSpecs[specPath]);
+    }
+    if (window.compressedApiSpecs && specPath in window.compressedApiSpecs) {
+        return decompressSpec(window.compressedApiSpecs[specPath]).then(spec => {
+            window.apiSpecs[specPath] = spec;
+            delete window.compressedApiSpecs[specPath];
+            return spec;
+        });
+    }
+    const entry = window.apiCatalog.find(item => item.path === specPath);
+    if (!entry) {
+        return Promise.reject(new Error(`仕様書が見つかりません: ${specPath}`));
+    }
+    return fetch(entry.url)
+        .then(response => {
+            if (!response.ok) {
+                throw new Error(`仕様書の読み込みに失敗しました: ${entry.url} (${response.status})`);
+            }
+            return response.json();
+        })
+        .then(spec => {
+            window.apiSpecs[specPath] = spec;
+            return spec;
+        });
+}
+
 // SwaggerUIまたはReDocで仕様書を表示
 function showSpec(specPath, viewerType, title, apiSpecs) {
     console.log('showSpec呼び出し', specPath, viewerType, title);
@@ -25,7 +83,24 @@ function showSpec(specPath, viewerType, title, apiSpecs) {
     welcomeScreen.classList.add('hidden');
     viewerContainer.classList.remove('hidden');
     
-    // 仕様書データを取得
+    // 仕様書データを取得（分割出力で未読み込みの場合は読み込んでから表示し直す）
+    if (!(specPath in apiSpecs) && window.apiCatalog) {
+        swaggerUI.classList.remove('hidden');
+        redocFrame.classList.add('hidden');
+        swaggerUI.innerHTML = '';
+        swaggerUI.appendChild(createLoadingIndicator('仕様書を読み込み中...'));
+        loadSpec(specPath)
+            .then(() => {
+                if (appState.currentSpecPath === specPath) {
+                    showSpec(specPath, viewerType, title, window.apiSpecs);
+                }
+            })
+            .catch(error => {
+                console.error(error);
+                swaggerUI.innerHTML = `<div class="alert alert-danger m-3">${error.message}</div>`;
+            });
+        return;
+    }
     const spec = apiSpecs[specPath];
     
     if (viewerType === 'swagger') {
@@ -0,0 +1,542 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+合成した仕様書で collect / build / viewer の各段階の実行時間・最大メモリ使用量・出力サイズを計測するベンチマーク
+
+    python test/benchmark.py                      # smallシナリオを計測し、基準値と比較
+    python test/benchmark.py --scenario medium --latency 0.02
+    python test/benchmark.py --repos 50 --files 4 --paths 30 --schema-depth 4
+    python test/benchmark.py --update-baseline    # 計測結果を基準値として保存
+    python test/benchmark.py --startup            # clean / 変更のない collect / build の起動時間を以前のCLIと比較
+    python test/benchmark.py --startup --reference <コミット>
+
+スタブサーバー（test/stub_github_server.py）を合成したリポジトリのGitHub APIとして起動し、
+各段階は別プロセスで実行する（最大メモリ使用量を段階ごとに計測するため）
+基準値より tolerance の割合以上悪化した項目があれば終了コード1で終了する
+"""
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import platform
+import resource
+import tempfile
+import subprocess
+from pathlib import Path
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT_DIR))
+
+logger = logging.getLogger('openapispec-benchmark')
+
+STAGES = ["collect", "build", "viewer"]
+METRICS = ["wall_time", "peak_rss", "output_bytes"]
+
+BASELINE_FILE = Path(__file__).parent / "benchmark_baseline.json"
+
+# シナリオごとの規模 (リポジトリ数, リポジトリあたりの仕様書数, 仕様書あたりのパス数, スキーマの入れ子の深さ)
+SCENARIOS = {
+    "small": {"repos": 5, "files": 3, "paths": 10, "schema_depth": 2},
+    "medium": {"repos": 30, "files": 5, "paths": 30, "schema_depth": 3},
+    "large": {"repos": 100, "files": 10, "paths": 60, "schema_depth": 4},
+}
+
+# 実行時間・メモリはこれ以下の差であれば悪化とみなさない（小さいシナリオでの揺らぎを無視する）
+MIN_REGRESSION = {"wall_time": 0.1, "peak_rss": 8 * 1024 * 1024, "output_bytes": 0}
+
+# 起動時間の計測に使う子プロセスのスクリプト（引数: 設定のJSON, コマンド）
+# 以前のCLIでも動くよう、作業ディレクトリの openapispec_cli.py と src を読み込む
+STARTUP_SCRIPT = """
+import sys, json
+from src.config import CONFIG
+CONFIG.update(json.loads(sys.argv[1]))
+sys.argv = ["openapispec_cli.py", sys.argv[2]]
+import openapispec_cli
+openapispec_cli.main()
+"""
+
+# 以前のCLIの collect が呼び出す gh の代わり（合成した仕様書を {data_dir} に用意した応答で返す）
+# gh repo list はリポジトリ一覧、gh api <パス> --jq .content はファイルの内容、それ以外の gh api はディレクトリのファイル名
+FAKE_GH_SCRIPT = """#!/bin/sh
+if [ "$1" = "repo" ]; then
+    cat "{data_dir}/repos.json"
+elif [ "$4" = ".content" ]; then
+    cat "{data_dir}$2.content"
+else
+    cat "{data_dir}$2.list"
+fi
+"""
+
+REPO_PREFIX = "bench-api"
+WORDS = ["user", "order", "item", "payment", "invoice", "account", "shipment", "review", "coupon", "report"]
+JA_WORDS = ["ユーザー", "注文", "商品", "支払い", "請求書", "アカウント", "配送", "レビュー", "クーポン", "レポート"]
+
+VENDOR_ASSETS = {
+    "swagger_ui_css": b"/* benchmark swagger-ui.css */",
+    "swagger_ui_js": b"/* benchmark swagger-ui-bundle.js */",
+    "redoc_js": b"/* benchmark redoc.standalone.js */",
+}
+
+def nested_schema(rng, name, depth):
+    """
+    depth 段の入れ子になったオブジェクトのスキーマを作る
+    """
+    properties = {
+        "id": {"type": "integer", "format": "int64"},
+        "name": {"type": "string", "description": f"{name}の{rng.choice(JA_WORDS)}名"},
+        "createdAt": {"type": "string", "format": "date-time"},
+    }
+    for index in range(rng.randint(1, 3)):
+        properties[f"{rng.choice(WORDS)}Count{index}"] = {"type": "integer"}
+    if depth > 1:
+        properties["detail"] = nested_schema(rng, name, depth - 1)
+        properties["children"] = {"type": "array", "items": nested_schema(rng, name, depth - 1)}
+    return {"type": "object", "required": ["id"], "properties": properties}
+
+def synthetic_spec(rng, repo_index, file_index, paths, schema_depth):
+    """
+    パス数・スキーマの深さを指定して OpenAPI 3.0 の仕様書を作る
+    全仕様書に共通のErrorスキーマと、リポジトリ内の共通スキーマファイルへの $ref を含める
+    """
+    resource_names = [f"{rng.choice(WORDS)}{repo_index}x{file_index}x{index}" for index in range(max(1, paths // 2))]
+    spec_paths = {}
+    schemas = {}
+    for index in range(paths):
+        resource_name = resource_names[index % len(resource_names)]
+        schema_name = resource_name[0].upper() + resource_name[1:]
+        schemas[schema_name] = nested_schema(rng, schema_name, schema_depth)
+        item_path = f"/{resource_name}s" + ("/{id}" if index % 2 else "")
+        operation = {
+            "operationId": f"{'get' if index % 2 else 'list'}{schema_name}{index}",
+            "summary": f"{rng.choice(JA_WORDS)}の{'取得' if index % 2 else '一覧'}",
+            "tags": [resource_name],
+            "parameters": [
+                {"name": "limit", "in": "query", "schema": {"type": "integer"}},
+                {"name": "X-Request-Id", "in": "header", "schema": {"type": "string"}},
+            ],
+            "responses": {
+                "200": {
+                    "description": "OK",
+                    "content": {"application/json": {"schema": {"$ref": f"#/components/schemas/{schema_name}"}}},
+                },
+                "default": {"$ref": "#/components/responses/Error"},
+            },
+        }
+        if index % 2:
+            operation["parameters"].insert(0, {"name": "id", "in": "path", "required": True, "schema": {"type": "integer"}})
+        spec_paths.setdefault(item_path, {})["get"] = operation
+        if index % 3 == 0:
+            spec_paths[item_path]["post"] = {
+                "operationId": f"create{schema_name}{index}",
+                "summary": f"{rng.choice(JA_WORDS)}の作成",
+                "requestBody": {"content": {"application/json": {"schema": {"$ref": "../schemas/common.yml#/Audit"}}}},
+                "responses": {"201": {"description": "Created"}},
+            }
+    schemas["Error"] = {
+        "type": "object",
+        "description": "共通のエラーレスポンス",
+        "properties": {"code": {"type": "string"}, "message": {"type": "string"}},
+    }
+    return {
+        "openapi": "3.0.3",
+        "info": {
+            "title": f"Bench API {repo_index}-{file_index}",
+            "version": "1.0.0",
+            "description": f"{rng.choice(JA_WORDS)}と{rng.choice(JA_WORDS)}を扱うベンチマーク用のAPI",
+        },
+        "paths": spec_paths,
+        "components": {
+            "schemas": schemas,
+            "responses": {
+                "Error": {
+                    "description": "エラー",
+                    "content": {"application/json": {"schema": {"$ref": "#/components/schemas/Error"}}},
+                },
+            },
+        },
+    }
+
+def generate_synthetic_specs(data_dir, repos, files, paths, schema_depth, seed=0):
+    """
+    data_dir/<リポジトリ>/docs/paths/*.yml に合成した仕様書を書き出し、書き出した仕様書の数を返す
+    同じ引数からは常に同じ内容を作る
+    """
+    import yaml
+    rng = random.Random(seed)
+    data_dir = Path(data_dir)
+    for repo_index in range(repos):
+        repo_dir = data_dir / f"{REPO_PREFIX}-{repo_index:04d}"
+        (repo_dir / "docs" / "paths").mkdir(parents=True, exist_ok=True)
+        (repo_dir / "docs" / "schemas").mkdir(parents=True, exist_ok=True)
+        common = {"Audit": nested_schema(rng, "Audit", schema_depth)}
+        (repo_dir / "docs" / "schemas" / "common.yml").write_text(
+            yaml.safe_dump(common, allow_unicode=True, sort_keys=False), encoding='utf-8'
+        )
+        for file_index in range(files):
+            spec = synthetic_spec(rng, repo_index, file_index, paths, schema_depth)
+            (repo_dir / "docs" / "paths" / f"spec-{file_index:03d}.yml").write_text(
+                yaml.safe_dump(spec, allow_unicode=True, sort_keys=False), encoding='utf-8'
+            )
+    return repos * files
+
+def directory_size(path, exclude=()):
+    path = Path(path)
+    if not path.exists():
+        return 0
+    if path.is_file():
+        return path.stat().st_size
+    return sum(
+        item.stat().st_size for item in path.rglob("*")
+        if item.is_file() and not any(part in exclude for part in item.relative_to(path).parts)
+    )
+
+def stage_settings(work_dir, api_url):
+    """
+    子プロセスで使う、作業ディレクトリ・スタブサーバー向けの設定を返す
+    外部アセットはベンチマーク用の内容のintegrityで固定する
+    """
+    from src.config import CONFIG
+    from src.vendor_assets import compute_integrity
+    return {
+        "organization": "bench-org",
+        "repo_pattern": REPO_PREFIX,
+        "static_site_dir": str(work_dir / "static_site"),
+        "parse_cache_dir": None,
+        "template_cache_dir": str(work_dir / "template_cache"),
+        "github_backend": "http",
+        "github_api_url": api_url,
+        "collect_mode": "rest",
+        "vendor_cache_dir": str(work_dir / "vendor_cache"),
+        "vendor_offline": True,
+        "vendor_assets": {
+            name: {**asset, "integrity": compute_integrity(VENDOR_ASSETS[name])}
+            for name, asset in CONFIG["vendor_assets"].items()
+        },
+    }
+
+def configure_stage(stage, work_dir, api_url):
+    """
+    子プロセスの設定を書き換え、生成する段階では外部アセットのキャッシュを用意する
+    """
+    from src.config import CONFIG
+    CONFIG.update(stage_settings(work_dir, api_url))
+    if stage != "collect":
+        import src.vendor_assets as vendor_assets
+        cache = vendor_assets.VendorCache(CONFIG["vendor_cache_dir"])
+        for name, content in VENDOR_ASSETS.items():
+            cache.store(CONFIG["vendor_assets"][name], content)
+    return CONFIG
+
+def run_stage(stage, work_dir, api_url):
+    """
+    1つの段階を実行し、計測結果を返す（子プロセスで呼び出す）
+    """
+    config = configure_stage(stage, work_dir, api_url)
+    static_site_dir = Path(config["static_site_dir"])
+    started = time.perf_counter()
+    if stage == "collect":
+        import openapispec_cli
+        count, _ = openapispec_cli.collect_specs()
+    elif stage == "build":
+        from src.site_generator import generate_static_site
+        count = generate_static_site()
+    elif stage == "viewer":
+        from src.site_generator import generate_integrated_viewer
+        generate_integrated_viewer()
+        count = None
+    else:
+        raise ValueError(f"未対応の段階です: {stage}")
+    wall_time = time.perf_counter() - started
+    if stage == "collect":
+        output_bytes = directory_size(static_site_dir, exclude={"static"})
+    elif stage == "build":
+        output_bytes = directory_size(static_site_dir / "index.html") + directory_size(static_site_dir / "static")
+    else:
+        output_bytes = directory_size(static_site_dir / "api-spec-viewer.html")
+    return {
+        "wall_time": round(wall_time, 4),
+        # Linuxの ru_maxrss はKB単位
+        "peak_rss": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024,
+        "output_bytes": output_bytes,
+        **({"count": count} if count is not None else {}),
+    }
+
+def spawn_stage(stage, work_dir, api_url, verbose=False):
+    command = [
+        sys.executable, str(Path(__file__).resolve()), "--run-stage", stage,
+        "--work-dir", str(work_dir), "--api-url", api_url,
+    ]
+    if verbose:
+        command.append("--verbose")
+    # gh auth token を呼び出さないよう、スタブサーバー用のトークンを渡す
+    env = {**os.environ, "GITHUB_TOKEN": "benchmark-token"}
+    completed = subprocess.run(command, cwd=ROOT_DIR, env=env, stdout=subprocess.PIPE, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"{stage}の実行に失敗しました (終了コード {completed.returncode})")
+    return json.loads(completed.stdout.strip().splitlines()[-1])
+
+def run_benchmark(scenario, latency=0.0, repeat=1, seed=0, verbose=False):
+    """
+    シナリオの仕様書を合成し、collect -> build -> viewer を repeat 回実行して計測結果を返す
+    実行時間・メモリは最小値、出力サイズは最後の値を使う
+    """
+    from test.stub_github_server import StubGitHubServer
+    work_dir = Path(tempfile.mkdtemp(prefix="openapispec-bench-"))
+    try:
+        upstream_dir = work_dir / "upstream"
+        specs = generate_synthetic_specs(upstream_dir, seed=seed, **scenario)
+        upstream_bytes = directory_size(upstream_dir)
+        logger.info(f"仕様書を合成しました: {specs}件 ({upstream_bytes} バイト)")
+        stages = {}
+        with StubGitHubServer(data_dir=upstream_dir, other_repos=[], latency=latency) as stub:
+            for iteration in range(repeat):
+                shutil.rmtree(work_dir / "static_site", ignore_errors=True)
+                for stage in STAGES:
+                    requests_before = len(stub.requests)
+                    measured = spawn_stage(stage, work_dir, stub.base_url, verbose)
+                    if stage == "collect":
+                        measured["requests"] = len(stub.requests) - requests_before
+                    logger.info(
+                        f"[{iteration + 1}/{repeat}] {stage}: {measured['wall_time']:.3f}秒, "
+                        f"最大メモリ {measured['peak_rss'] / 1024 / 1024:.1f} MB, 出力 {measured['output_bytes']} バイト"
+                    )
+                    previous = stages.get(stage)
+                    if previous is not None:
+                        measured["wall_time"] = min(measured["wall_time"], previous["wall_time"])
+                        measured["peak_rss"] = min(measured["peak_rss"], previous["peak_rss"])
+                    stages[stage] = measured
+        if stages["collect"]["count"] != specs:
+            raise RuntimeError(f"収集した仕様書の数が合成した数と異なります: {stages['collect']['count']} / {specs}")
+        return {
+            "scenario": {**scenario, "latency": latency, "seed": seed},
+            "specs": specs,
+            "upstream_bytes": upstream_bytes,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stages": stages,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def time_command(command, settings, repeat=5, cwd=ROOT_DIR, env=None):
+    """
+    cwd の openapispec_cli.py のコマンドを子プロセスで repeat 回実行し、最短の実行時間（秒）を返す
+    """
+    args = [sys.executable, "-c", STARTUP_SCRIPT, json.dumps(settings), command]
+    env = {**os.environ, "GITHUB_TOKEN": "benchmark-token", **(env or {})}
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        completed = subprocess.run(args, cwd=cwd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        elapsed = time.perf_counter() - started
+        if completed.returncode != 0:
+            raise RuntimeError(f"{command}の実行に失敗しました (終了コード {completed.returncode})")
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best, 4)
+
+def root_commit():
+    """
+    リポジトリの最初のコミット（この一連の変更の前のCLI）を返す
+    """
+    output = subprocess.run(
+        ["git", "rev-list", "--max-parents=0", "HEAD"], cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    ).stdout
+    return output.split()[-1]
+
+def extract_reference(ref, target_dir):
+    """
+    refの時点のツリーを target_dir に展開し、refのコミットのハッシュを返す
+    """
+    import io
+    import tarfile
+    commit = subprocess.run(
+        ["git", "rev-parse", "--verify", f"{ref}^{{commit}}"], cwd=ROOT_DIR, capture_output=True, text=True, check=True,
+    ).stdout.strip()
+    archive = subprocess.run(["git", "archive", "--format=tar", commit], cwd=ROOT_DIR, capture_output=True, check=True).stdout
+    with tarfile.open(fileobj=io.BytesIO(archive)) as tar:
+        tar.extractall(target_dir)
+    return commit
+
+def prepare_fake_gh(upstream_dir, gh_dir):
+    """
+    以前のCLIが gh コマンドで取得する内容を、合成した仕様書から gh_dir に用意し、gh の代わりのスクリプトを返す
+    """
+    import base64
+    data_dir = gh_dir / "data"
+    repos = sorted(repo_dir.name for repo_dir in upstream_dir.iterdir() if repo_dir.is_dir())
+    data_dir.mkdir(parents=True)
+    (data_dir / "repos.json").write_text(json.dumps([{"name": name} for name in repos]), encoding='utf-8')
+    for name in repos:
+        for spec_dir in {spec_file.parent for spec_file in (upstream_dir / name).rglob("*.yml")}:
+            contents_dir = data_dir / "repos" / "bench-org" / name / "contents" / spec_dir.relative_to(upstream_dir / name)
+            contents_dir.mkdir(parents=True, exist_ok=True)
+            spec_files = sorted(spec_dir.glob("*.yml"))
+            contents_dir.with_name(contents_dir.name + ".list").write_text(
+                "".join(f"{spec_file.name}\n" for spec_file in spec_files), encoding='utf-8',
+            )
+            for spec_file in spec_files:
+                (contents_dir / f"{spec_file.name}.content").write_text(
+                    base64.b64encode(spec_file.read_bytes()).decode("ascii") + "\n", encoding='utf-8',
+                )
+    fake_gh = gh_dir / "gh"
+    fake_gh.write_text(FAKE_GH_SCRIPT.format(data_dir=data_dir), encoding='utf-8')
+    fake_gh.chmod(0o755)
+    return fake_gh
+
+def run_startup_benchmark(repeat=5, reference=None):
+    """
+    clean と、変更のない collect、build の実行時間を、referenceのコミット（既定は最初のコミット）のCLIと比較する
+    以前のCLIは gh コマンドで毎回すべての仕様書を取得し直すため、合成した仕様書をすぐに返す gh の代わりで実行する
+    （実際の gh はGitHubへの通信を含むため、以前のCLIに有利な比較になる）
+    以前の build は Swagger UI のCSSをCDNから取得するため、接続できないプロキシを指定してすぐに失敗させる
+    """
+    from test.stub_github_server import StubGitHubServer
+    work_dir = Path(tempfile.mkdtemp(prefix="openapispec-bench-"))
+    try:
+        upstream_dir = work_dir / "upstream"
+        specs = generate_synthetic_specs(upstream_dir, repos=2, files=2, paths=4, schema_depth=2)
+        reference_dir = work_dir / "reference"
+        commit = extract_reference(reference or root_commit(), reference_dir)
+        fake_gh = prepare_fake_gh(upstream_dir, work_dir / "gh")
+        reference_site_dir = work_dir / "reference_site"
+        reference_settings = {"organization": "bench-org", "repo_pattern": REPO_PREFIX, "static_site_dir": str(reference_site_dir)}
+        reference_env = {"PATH": f"{fake_gh.parent}{os.pathsep}{os.environ.get('PATH', '')}", "HTTPS_PROXY": "http://127.0.0.1:9"}
+        stages = {}
+        with StubGitHubServer(data_dir=upstream_dir, other_repos=[]) as stub:
+            settings = stage_settings(work_dir, stub.base_url)
+            # 1回目で収集と生成（外部アセットのキャッシュの用意）をしておき、計測するのは変更のない collect と build
+            spawn_stage("collect", work_dir, stub.base_url)
+            spawn_stage("build", work_dir, stub.base_url)
+            for repo_dir in (work_dir / "static_site").glob(f"{REPO_PREFIX}*"):
+                shutil.copytree(repo_dir, reference_site_dir / repo_dir.name)
+            # 以前のCLIの collect / clean は静的サイトを削除するため、build から計測する
+            for name, command in (("build", "build"), ("collect_noop", "collect"), ("clean", "clean")):
+                stages[name] = {"wall_time": time_command(command, settings, repeat)}
+                stages[f"{name}_reference"] = {
+                    "wall_time": time_command(command, reference_settings, repeat, cwd=reference_dir, env=reference_env),
+                }
+                logger.info(f"{name}: {stages[name]['wall_time']:.3f}秒 (以前のCLI: {stages[f'{name}_reference']['wall_time']:.3f}秒)")
+                if command == "collect" and len(list(reference_site_dir.rglob("*.yml"))) != specs:
+                    raise RuntimeError("以前のCLIの collect で合成した仕様書を取得できませんでした")
+        ratios = {
+            name: round(stages[name]["wall_time"] / stages[f"{name}_reference"]["wall_time"], 3)
+            for name in ("clean", "collect_noop", "build")
+        }
+        for name, ratio in ratios.items():
+            logger.info(f"{name}: 以前のCLI ({commit[:12]}) の {ratio:.0%} の時間で完了しました")
+        return {
+            "scenario": {"startup": True, "repeat": repeat},
+            "reference": commit,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "stages": stages,
+            "ratios": ratios,
+        }
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+def compare_with_baseline(result, baseline, tolerance):
+    """
+    基準値より悪化した項目を (段階, 項目, 基準値, 計測値) の一覧で返す
+    """
+    regressions = []
+    for stage, measured in result["stages"].items():
+        for metric in METRICS:
+            expected = baseline["stages"].get(stage, {}).get(metric)
+            actual = measured.get(metric)
+            if expected is None or actual is None:
+                continue
+            if actual > expected * (1 + tolerance) and actual - expected > MIN_REGRESSION[metric]:
+                regressions.append((stage, metric, expected, actual))
+    return regressions
+
+def load_baselines(baseline_file):
+    if not baseline_file.exists():
+        return {}
+    with open(baseline_file, encoding='utf-8') as f:
+        return json.load(f)
+
+def save_baselines(baseline_file, baselines):
+    with open(baseline_file, "w", encoding='utf-8') as f:
+        json.dump(baselines, f, ensure_ascii=False, indent=2, sort_keys=True)
+        f.write("\n")
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(description="collect / build / viewer のベンチマーク")
+    parser.add_argument("--scenario", choices=sorted(SCENARIOS), default="small", help="計測する規模")
+    parser.add_argument("--repos", type=int, help="リポジトリ数（シナリオの値を上書き）")
+    parser.add_argument("--files", type=int, help="リポジトリあたりの仕様書数（シナリオの値を上書き）")
+    parser.add_argument("--paths", type=int, help="仕様書あたりのパス数（シナリオの値を上書き）")
+    parser.add_argument("--schema-depth", type=int, help="スキーマの入れ子の深さ（シナリオの値を上書き）")
+    parser.add_argument("--latency", type=float, default=0.0, help="スタブサーバーの応答遅延（秒）")
+    parser.add_argument("--repeat", type=int, default=1, help="繰り返し回数（実行時間・メモリは最小値を使う）")
+    parser.add_argument("--seed", type=int, default=0, help="仕様書を合成する乱数のシード")
+    parser.add_argument("--output", type=Path, help="計測結果のJSONの保存先")
+    parser.add_argument("--baseline", type=Path, default=BASELINE_FILE, help="基準値のJSON")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="悪化とみなす割合")
+    parser.add_argument("--update-baseline", action="store_true", help="計測結果を基準値として保存する")
+    parser.add_argument("--startup", action="store_true", help="clean / 変更のない collect / build の起動時間を以前のCLIと比較する")
+    parser.add_argument("--reference", help="--startup で比較するコミット（既定はリポジトリの最初のコミット）")
+    parser.add_argument("--verbose", action="store_true", help="各段階のログを表示する")
+    parser.add_argument("--run-stage", choices=STAGES, help=argparse.SUPPRESS)
+    parser.add_argument("--work-dir", type=Path, help=argparse.SUPPRESS)
+    parser.add_argument("--api-url", help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+def main(argv=None):
+    args = parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    if args.run_stage:
+        if not args.verbose:
+            logging.getLogger('openapispec-collector').setLevel(logging.WARNING)
+        print(json.dumps(run_stage(args.run_stage, args.work_dir, args.api_url)))
+        return 0
+
+    if args.startup:
+        name = "startup"
+        result = run_startup_benchmark(repeat=max(5, args.repeat), reference=args.reference)
+    else:
+        scenario = dict(SCENARIOS[args.scenario])
+        for key in scenario:
+            if getattr(args, key) is not None:
+                scenario[key] = getattr(args, key)
+        # シナリオの規模を変えた場合は別の基準値として扱う
+        name = args.scenario if scenario == SCENARIOS[args.scenario] else "custom-" + "-".join(
+            f"{key}{value}" for key, value in scenario.items()
+        )
+        if args.latency:
+            name += f"-latency{args.latency}"
+        result = run_benchmark(scenario, latency=args.latency, repeat=max(1, args.repeat), seed=args.seed, verbose=args.verbose)
+    result["name"] = name
+    if args.output:
+        with open(args.output, "w", encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+            f.write("\n")
+    else:
+        print(json.dumps(result, ensure_ascii=False, indent=2))
+
+    baselines = load_baselines(args.baseline)
+    if args.update_baseline:
+        baselines[name] = result
+        save_baselines(args.baseline, baselines)
+        logger.info(f"基準値を保存しました: {args.baseline} ({name})")
+        return 0
+    baseline = baselines.get(name)
+    if baseline is None:
+        logger.warning(f"基準値がありません: {name} (--update-baseline で保存できます)")
+        return 0
+    regressions = compare_with_baseline(result, baseline, args.tolerance)
+    for stage, metric, expected, actual in regressions:
+        logger.error(f"{stage}の{metric}が基準値より悪化しました: {expected} -> {actual}")
+    if regressions:
+        return 1
+    logger.info(f"基準値との差は許容範囲内です (許容: {args.tolerance:.0%})")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""
+test/mock_data をGitHub REST APIとして配信するローカルスタブサーバー
+"""
+
+import re
+import json
+import base64
+import hashlib
+import time
+import threading
+from pathlib import Path
+from urllib.parse import urlsplit, parse_qs, unquote
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+MOCK_DATA_DIR = Path(__file__).parent / "mock_data"
+OTHER_REPOS = ["other-repo-1", "another-project"]
+
+def git_blob_sha(content):
+    """
+    gitと同じ方法でblobのSHA-1を計算する
+    """
+    return hashlib.sha1(b"blob %d\0" % len(content) + content).hexdigest()
+
+_file_shas = {}
+_file_shas_lock = threading.Lock()
+
+def file_blob_sha(path):
+    """
+    ファイルのblob SHAを返す（更新日時とサイズが変わらない間は計算結果を使い回す）
+    """
+    stat = path.stat()
+    key = (str(path), stat.st_mtime_ns, stat.st_size)
+    with _file_shas_lock:
+        if key in _file_shas:
+            return _file_shas[key]
+    sha = git_blob_sha(path.read_bytes())
+    with _file_shas_lock:
+        _file_shas[key] = sha
+    return sha
+
+GRAPHQL_REPOSITORY = re.compile(r'(\w+):\s*repository\(owner:\s*"((?:[^"\\]|\\.)*)",\s*name:\s*"((?:[^"\\]|\\.)*)"\)')
+GRAPHQL_OBJECT = re.compile(r'(\w+):\s*object\(expression:\s*"((?:[^"\\]|\\.)*)"\)')
+
+class _StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    # ヘッダーと本文を別々に送るため、Nagleアルゴリズムと遅延ACKで応答ごとに約40ミリ秒待たされないようにする
+    disable_nagle_algorithm = True
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, body, content_type="application/json", headers=None):
+        if not isinstance(body, bytes):
+            body = body.encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("X-RateLimit-Limit", "5000")
+        self.send_header("X-RateLimit-Remaining", str(max(0, 5000 - len(self.server.stub.requests))))
+        self.send_header("X-RateLimit-Reset", str(int(time.time()) + 3600))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, status, data, headers=None):
+        self._send(status, json.dumps(data), headers=headers)
+
+    def do_GET(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        query = parse_qs(url.query)
+        with stub.lock:
+            stub.requests.append(url.path)
+            stub.connections.add(self.client_address)
+        if stub.latency:
+            time.sleep(stub.latency)
+        throttled = stub.rate_limit_every and len(stub.requests) % stub.rate_limit_every == 0
+        if throttled:
+            stub.throttled += 1
+            return self._send_json(403, {
+                "message": "You have exceeded a secondary rate limit. Please wait a few minutes before you try again.",
+            }, headers={"Retry-After": "0"})
+        if url.path in stub.assets:
+            return self._send(200, stub.assets[url.path], content_type="text/plain")
+        parts = [unquote(part) for part in url.path.strip("/").split("/")]
+        if len(parts) >= 2 and parts[0] == "repos" and parts[2] in stub.failing_repos:
+            return self._send_json(502, {"message": "Bad Gateway"})
+        if len(parts) == 3 and parts[0] in ("orgs", "users") and parts[2] == "repos":
+            return self._list_repos(query)
+        if parts == ["search", "repositories"]:
+            return self._search_repos(query)
+        if len(parts) >= 4 and parts[0] == "repos" and parts[3] == "contents":
+            return self._contents(parts[2], "/".join(parts[4:]))
+        if len(parts) == 6 and parts[0] == "repos" and parts[3] == "git" and parts[4] == "trees":
+            return self._tree(parts[2])
+        if len(parts) == 6 and parts[0] == "repos" and parts[3] == "git" and parts[4] == "blobs":
+            return self._blob(parts[2], parts[5])
+        self._send_json(404, {"message": "Not Found"})
+
+    def do_POST(self):
+        stub = self.server.stub
+        url = urlsplit(self.path)
+        body = self.rfile.read(int(self.headers.get("Content-Length", "0")))
+        with stub.lock:
+            stub.requests.append(url.path)
+            stub.connections.add(self.client_address)
+        if stub.latency:
+            time.sleep(stub.latency)
+        if url.path.rstrip("/") != "/graphql":
+            return self._send_json(404, {"message": "Not Found"})
+        self._graphql(json.loads(body)["query"])
+
+    def _graphql(self, query):
+        """
+        repository(owner, name) { alias: object(expression: "HEAD:path") { ... on Blob } } の形のクエリだけに応答する
+        """
+        stub = self.server.stub
+        data = {}
+        tokens = sorted(
+            [(m.start(), "repo", m) for m in GRAPHQL_REPOSITORY.finditer(query)]
+            + [(m.start(), "object", m) for m in GRAPHQL_OBJECT.finditer(query)],
+            key=lambda token: token[0],
+        )
+        current = None
+        for _, kind, match in tokens:
+            if kind == "repo":
+                repo_dir = stub.data_dir / json.loads(f'"{match.group(3)}"')
+                current = {} if repo_dir.is_dir() else None
+                data[match.group(1)] = current
+                continue
+            if current is None:
+                continue
+            expression = json.loads(f'"{match.group(2)}"')
+            target = repo_dir / expression.split(":", 1)[1]
+            if not target.is_file():
+                current[match.group(1)] = None
+                continue
+            content = target.read_bytes()
+            truncated = stub.graphql_truncate_bytes is not None and len(content) > stub.graphql_truncate_bytes
+            current[match.group(1)] = {
+                "oid": git_blob_sha(content),
+                "text": None if truncated else content.decode("utf-8"),
+                "isBinary": False,
+                "isTruncated": truncated,
+            }
+        self._send_json(200, {"data": data})
+
+    def _list_repos(self, query):
+        stub = self.server.stub
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        chunk = stub.repo_names()[(page - 1) * per_page:page * per_page]
+        self._send_json(200, [{"name": name, **stub.repo_metadata(name)} for name in chunk])
+
+    def _search_repos(self, query):
+        """
+        "org:xxx <語> in:name topic:yyy archived:false" の形の検索クエリだけを解釈する
+        """
+        stub = self.server.stub
+        terms = query.get("q", [""])[0].split()
+        stub.search_queries.append(" ".join(terms))
+        names = stub.repo_names()
+        for index, term in enumerate(terms):
+            if term == "in:name" and index > 0:
+                names = [name for name in names if terms[index - 1].lower() in name.lower()]
+            elif term.startswith("topic:"):
+                names = [name for name in names if term[len("topic:"):] in stub.repo_metadata(name)["topics"]]
+            elif term == "archived:false":
+                names = [name for name in names if not stub.repo_metadata(name)["archived"]]
+        per_page = int(query.get("per_page", ["30"])[0])
+        page = int(query.get("page", ["1"])[0])
+        chunk = names[(page - 1) * per_page:page * per_page]
+        self._send_json(200, {
+            "total_count": len(names),
+            "incomplete_results": False,
+            "items": [{"name": name, **stub.repo_metadata(name)} for name in chunk],
+        })
+
+    def _contents(self, repo, rel_path):
+        target = self.server.stub.data_dir / repo / rel_path
+        if target.is_dir():
+            entries = [
+                {
+                    "name": item.name,
+                    "path": f"{rel_path}/{item.name}".lstrip("/"),
+                    "type": "dir" if item.is_dir() else "file",
+                    "sha": None if item.is_dir() else git_blob_sha(item.read_bytes()),
+                }
+                for item in sorted(target.iterdir())
+            ]
+            return self._send_json(200, entries)
+        if not target.is_file():
+            return self._send_json(404, {"message": "Not Found"})
+        content = target.read_bytes()
+        etag = f'"{git_blob_sha(content)}"'
+        if self.headers.get("If-None-Match") == etag:
+            return self._send(304, b"", headers={"ETag": etag})
+        if "application/vnd.github.raw" in self.headers.get("Accept", ""):
+            return self._send(200, content, content_type="application/vnd.github.raw", headers={"ETag": etag})
+        self._send_json(200, {
+            "name": target.name,
+            "path": rel_path,
+            "type": "file",
+            "encoding": "base64",
+            "content": base64.b64encode(content).decode("ascii"),
+        })
+
+    def _tree(self, repo):
+        repo_dir = self.server.stub.data_dir / repo
+        if not repo_dir.is_dir():
+            return self._send_json(404, {"message": "Not Found"})
+        entries = []
+        for item in sorted(repo_dir.rglob("*")):
+            path = item.relative_to(repo_dir).as_posix()
+            if item.is_dir():
+                entries.append({"path": path, "type": "tree", "sha": git_blob_sha(path.encode())})
+            else:
+                entries.append({"path": path, "type": "blob", "sha": file_blob_sha(item), "size": item.stat().st_size})
+        body = json.dumps({"sha": "HEAD", "tree": entries, "truncated": False})
+        etag = f'"{hashlib.sha1(body.encode("utf-8")).hexdigest()}"'
+        if self.headers.get("If-None-Match") == etag:
+            with self.server.stub.lock:
+                self.server.stub.not_modified += 1
+            return self._send(304, b"", headers={"ETag": etag})
+        self._send(200, body, headers={"ETag": etag})
+
+    def _blob(self, repo, sha):
+        repo_dir = self.server.stub.data_dir / repo
+        for item in repo_dir.rglob("*"):
+            if item.is_file() and file_blob_sha(item) == sha:
+                content = item.read_bytes()
+                headers = {"ETag": f'"{sha}"'}
+                if "application/vnd.github.raw" in self.headers.get("Accept", ""):
+                    return self._send(200, content, content_type="application/vnd.github.raw", headers=headers)
+                return self._send_json(200, {
+                    "sha": sha,
+                    "size": len(content),
+                    "encoding": "base64",
+                    "content": base64.b64encode(content).decode("ascii"),
+                }, headers=headers)
+        self._send_json(404, {"message": "Not Found"})
+
+class StubGitHubServer:
+    """
+    スレッドで起動するGitHub APIスタブ
+    requestsにアクセスされたパス、connectionsにクライアントの接続元を記録する
+    not_modifiedにはIf-None-Matchが一致して304を返したツリーの取得回数を記録する
+    rate_limit_everyを指定するとN回に1回セカンダリレート制限(403 + Retry-After)を返し、
+    failing_reposに指定したリポジトリへのアクセスには常に502を返す
+    assetsには {パス: 内容} で外部アセット（CDNの代わり）を指定できる
+    latencyを指定すると各リクエストへの応答をその秒数だけ遅らせる（ベンチマーク用）
+    """
+
+    def __init__(self, data_dir=MOCK_DATA_DIR, other_repos=OTHER_REPOS, graphql_truncate_bytes=None,
+                 rate_limit_every=None, failing_repos=(), repo_metadata=None, assets=None, latency=0.0):
+        self.data_dir = Path(data_dir)
+        self.latency = latency
+        self.assets = dict(assets or {})
+        self.metadata = repo_metadata or {}
+        self.search_queries = []
+        self.rate_limit_every = rate_limit_every
+        self.failing_repos = set(failing_repos)
+        self.throttled = 0
+        self.not_modified = 0
+        self.graphql_truncate_bytes = graphql_truncate_bytes
+        self.other_repos = list(other_repos)
+        self.requests = []
+        self.connections = set()
+        self.lock = threading.Lock()
+        self.httpd = ThreadingHTTPServer(("127.0.0.1", 0), _StubHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.stub = self
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.httpd.server_address
+        return f"http://{host}:{port}"
+
+    def repo_names(self):
+        repos = sorted(item.name for item in self.data_dir.iterdir() if item.is_dir())
+        return repos + self.other_repos
+
+    def repo_metadata(self, name):
+        metadata = self.metadata.get(name, {})
+        return {"topics": list(metadata.get("topics", [])), "archived": bool(metadata.get("archived", False))}
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.httpd.shutdown()
+        self.httpd.server_close()
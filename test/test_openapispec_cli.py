@@ -5,6 +5,9 @@ import os
 import sys
 import shutil
 import logging
+import tempfile
+import time
+import datetime
 from pathlib import Path
 
 # src配下のモジュールをimportするよう修正
@@ -14,6 +17,13 @@ from src.config import CONFIG
 import src.gh_utils as gh_utils
 import src.site_generator as site_generator
 import src.cleaner as cleaner
+import src.collector as collector
+import src.scheduler as scheduler
+import src.git_mirror as git_mirror
+from src.spec_glob import compile_spec_pattern
+from src.catalog import SpecCatalog
+import src.vendor_assets as vendor_assets
+from test.stub_github_server import StubGitHubServer, git_blob_sha
 
 # collect_openapi.pyの代わりにCLIの関数を直接importする場合は、
 # openapispec_cli.pyのcollect_only/all_processなどをimportしてもよい
@@ -30,21 +40,6 @@ def simple_mock_gh_command(command):
     # リポジトリ一覧を取得
     if command[0:3] == ["gh", "repo", "list"]:
         return """[{\"name\":\"xxx-api-1\"},{\"name\":\"xxx-api-2\"},{\"name\":\"xxx-api-3\"},{\"name\":\"other-repo-1\"},{\"name\":\"another-project\"}]"""
-    # パターン付きYAML一覧取得
-    elif command[0:2] == ["gh", "api"] and "/contents/docs/paths" in command[2] and "--jq" in command and "/contents/docs/paths/" not in command[2]:
-        import re
-        jq_arg = command[command.index("--jq") + 1]
-        import re as _re
-        m = _re.search(r'test\\?\("(.*?)\\?"\)', jq_arg)
-        if m:
-            regex = m.group(1)
-        else:
-            regex = None
-        files = ["openapi.yml", "subapi.yml"]
-        if regex:
-            files = [f for f in files if re.match(regex, f)]
-        print(f"[MOCK] Returning file list for {command[2]}: {files}")
-        return "\n".join(files)
     # docs/paths配下のYAMLファイル内容取得
     elif command[0:2] == ["gh", "api"] and "/contents/docs/paths/" in command[2] and "--jq" in command and command[-1] == ".content":
         import base64
@@ -69,6 +64,27 @@ def simple_mock_gh_command(command):
                 return ""
         return ""
 
+    # リポジトリのツリー取得
+    elif command[0:2] == ["gh", "api"] and "/git/trees/" in command[2]:
+        repo = command[2].split("/")[3]
+        repo_dir = Path(f"test/mock_data/{repo}")
+        lines = []
+        for mock_file in sorted(repo_dir.rglob("*")):
+            if mock_file.is_file():
+                content = mock_file.read_bytes()
+                lines.append(f"{mock_file.relative_to(repo_dir).as_posix()}\t{git_blob_sha(content)}\t{len(content)}")
+        print(f"[MOCK] Returning tree for {repo}: {lines}")
+        return "\n".join(lines)
+    # blobの内容取得
+    elif command[0:2] == ["gh", "api"] and "/git/blobs/" in command[2]:
+        import base64
+        repo, sha = command[2].split("/")[3], command[2].split("/")[-1]
+        for mock_file in Path(f"test/mock_data/{repo}").rglob("*"):
+            if mock_file.is_file() and git_blob_sha(mock_file.read_bytes()) == sha:
+                return base64.b64encode(mock_file.read_bytes()).decode()
+        print(f"[MOCK] Blob not found: {sha}")
+        return ""
+
     print(f"[MOCK] No matching response found, returning empty object")
     return "{}"
 
@@ -108,6 +124,27 @@ def clean_test_environment():
     
     logger.info("クリーンアップが完了しました")
 
+TEST_VENDOR_ASSETS = {
+    "swagger_ui_css": b"/* test swagger-ui.css */",
+    "swagger_ui_js": b"/* test swagger-ui-bundle.js */",
+    "redoc_js": b"/* test redoc.standalone.js */",
+}
+TEST_VENDOR_CACHE_DIR = Path(tempfile.mkdtemp())
+TEST_TEMPLATE_CACHE_DIR = Path(tempfile.mkdtemp())
+TEST_DIFF_STATE_DIR = Path(tempfile.mkdtemp())
+
+def prepare_test_vendor_cache():
+    """
+    ネットワークに接続せずにビルドできるよう、テスト用の外部アセットをキャッシュに保存する
+    """
+    CONFIG["vendor_assets"] = {
+        name: {**asset, "integrity": vendor_assets.compute_integrity(TEST_VENDOR_ASSETS[name])}
+        for name, asset in CONFIG["vendor_assets"].items()
+    }
+    cache = vendor_assets.VendorCache(TEST_VENDOR_CACHE_DIR)
+    for name, content in TEST_VENDOR_ASSETS.items():
+        cache.store(CONFIG["vendor_assets"][name], content)
+
 def setup_test_environment():
     """
     テスト環境をセットアップ
@@ -121,8 +158,32 @@ def setup_test_environment():
     test_static_site_dir.mkdir(exist_ok=True)
     
     # 一時的に設定を書き換え
-    global original_static_site_dir
+    global original_static_site_dir, original_github_settings, original_parse_cache_dir, original_vendor_settings
+    global original_template_cache_dir, original_diff_state_dir
     original_static_site_dir = CONFIG["static_site_dir"]
+    original_github_settings = (CONFIG["github_backend"], CONFIG["github_api_url"])
+    original_parse_cache_dir = CONFIG["parse_cache_dir"]
+    original_vendor_settings = (CONFIG["vendor_assets"], CONFIG["vendor_cache_dir"], CONFIG["vendor_offline"])
+    original_template_cache_dir = CONFIG["template_cache_dir"]
+    original_diff_state_dir = CONFIG["diff_state_dir"]
+
+    # 解析キャッシュはテストごとに明示的に有効にする
+    CONFIG["parse_cache_dir"] = None
+
+    # コンパイル済みのテンプレートはテスト用のディレクトリに保存する
+    CONFIG["template_cache_dir"] = str(TEST_TEMPLATE_CACHE_DIR)
+
+    # 仕様書の差分の記録はテストごとに空にする
+    shutil.rmtree(TEST_DIFF_STATE_DIR, ignore_errors=True)
+    CONFIG["diff_state_dir"] = str(TEST_DIFF_STATE_DIR)
+
+    # 外部アセットはテスト用のキャッシュから読み込む
+    prepare_test_vendor_cache()
+    CONFIG["vendor_cache_dir"] = str(TEST_VENDOR_CACHE_DIR)
+    CONFIG["vendor_offline"] = True
+    
+    # ghコマンドのモックを使うテストはghバックエンドで実行する
+    CONFIG["github_backend"] = "gh"
     
     # テスト用のパスに変更
     CONFIG["static_site_dir"] = str(test_static_site_dir)
@@ -132,6 +193,11 @@ def restore_config():
     元の設定を復元する
     """
     CONFIG["static_site_dir"] = original_static_site_dir
+    CONFIG["github_backend"], CONFIG["github_api_url"] = original_github_settings
+    CONFIG["parse_cache_dir"] = original_parse_cache_dir
+    CONFIG["vendor_assets"], CONFIG["vendor_cache_dir"], CONFIG["vendor_offline"] = original_vendor_settings
+    CONFIG["template_cache_dir"] = original_template_cache_dir
+    CONFIG["diff_state_dir"] = original_diff_state_dir
 
 def run_test():
     logger.info("テスト環境をセットアップします")
@@ -196,6 +262,1434 @@ def run_test():
         gh_utils.run_gh_command = original_run_gh_command
         restore_config()
 
+def failing_mock_gh_command(command):
+    """
+    xxx-api-2へのアクセスだけ失敗させるモック
+    """
+    if command[0:2] == ["gh", "api"] and "/xxx-api-2/" in command[2]:
+        raise RuntimeError("mock failure for xxx-api-2")
+    return simple_mock_gh_command(command)
+
+def run_concurrent_collect_test():
+    """
+    並行収集で順序が決定的であり、1リポジトリの失敗が他に影響しないことを確認する
+    """
+    logger.info("並行収集のテストを実行します")
+    setup_test_environment()
+    original_run_gh_command = gh_utils.run_gh_command
+    original_limits = (CONFIG["max_concurrent_repos"], CONFIG["max_concurrent_files"])
+    gh_utils.run_gh_command = failing_mock_gh_command
+    CONFIG["max_concurrent_repos"], CONFIG["max_concurrent_files"] = 3, 4
+    try:
+        result = collector.collect_repositories(["xxx-api-3", "xxx-api-2", "xxx-api-1"])
+        expected_files = [
+            Path(CONFIG["static_site_dir"]) / repo / "docs/paths" / name
+            for repo in ["xxx-api-3", "xxx-api-1"]
+            for name in ["openapi.yml", "subapi.yml"]
+        ]
+        if result["files"] != expected_files:
+            logger.error(f"収集結果の順序が想定と異なります: {result['files']}")
+            return False
+        if list(result["failed"]) != ["xxx-api-2"] or result["succeeded"] != ["xxx-api-3", "xxx-api-1"]:
+            logger.error(f"失敗したリポジトリの扱いが想定と異なります: {result}")
+            return False
+        logger.info("並行収集のテストに成功しました")
+        return True
+    finally:
+        gh_utils.run_gh_command = original_run_gh_command
+        CONFIG["max_concurrent_repos"], CONFIG["max_concurrent_files"] = original_limits
+        restore_config()
+
+def run_http_backend_test():
+    """
+    HTTPバックエンドをローカルスタブサーバーに向けて収集し、接続が再利用されることを確認する
+    """
+    logger.info("HTTPバックエンドのテストを実行します")
+    setup_test_environment()
+    try:
+        with StubGitHubServer() as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            api_repos = gh_utils.get_api_repositories()
+            if api_repos != ["xxx-api-1", "xxx-api-2", "xxx-api-3"]:
+                logger.error(f"リポジトリ一覧が想定と異なります: {api_repos}")
+                return False
+            result = collector.collect_repositories(api_repos)
+            if len(result["files"]) != 6:
+                logger.error(f"収集件数が想定と異なります: {result['files']}")
+                return False
+            for spec_file in result["files"]:
+                mock_file = Path("test/mock_data") / spec_file.relative_to(CONFIG["static_site_dir"])
+                if spec_file.read_text(encoding='utf-8') != mock_file.read_text(encoding='utf-8'):
+                    logger.error(f"取得内容がモックデータと一致しません: {spec_file}")
+                    return False
+            if len(stub.connections) >= len(stub.requests):
+                logger.error(f"接続が再利用されていません: {len(stub.connections)}接続 / {len(stub.requests)}リクエスト")
+                return False
+        logger.info(f"HTTPバックエンドのテストに成功しました ({len(stub.connections)}接続 / {len(stub.requests)}リクエスト)")
+        return True
+    finally:
+        restore_config()
+
+def run_spec_glob_test():
+    """
+    spec_pathのglob（**、波括弧、ディレクトリ途中の*）の判定を確認する
+    """
+    cases = [
+        ("docs/paths/*.yml", "docs/paths/openapi.yml", True),
+        ("docs/paths/*.yml", "docs/paths/v1/openapi.yml", False),
+        ("docs/**/*.yaml", "docs/openapi.yaml", True),
+        ("docs/**/*.yaml", "docs/a/b/openapi.yaml", True),
+        ("services/*/openapi.yml", "services/users/openapi.yml", True),
+        ("services/*/openapi.yml", "services/users/v1/openapi.yml", False),
+        ("docs/*.{yml,yaml}", "docs/openapi.yaml", True),
+        ("docs/*.{yml,yaml}", "docs/openapi.json", False),
+    ]
+    for pattern, path, expected in cases:
+        if compile_spec_pattern(pattern)(path) != expected:
+            logger.error(f"globの判定が想定と異なります: {pattern} {path} (期待値: {expected})")
+            return False
+    logger.info("globパターンのテストに成功しました")
+    return True
+
+def run_incremental_collect_test():
+    """
+    2回目の収集では変更・削除されたファイルだけが反映され、
+    ツリーに変更のないリポジトリはETagによる304で一覧を使い回すことを確認する
+    """
+    logger.info("差分収集のテストを実行します")
+    setup_test_environment()
+    upstream_dir = Path(tempfile.mkdtemp())
+    try:
+        shutil.copytree("test/mock_data", upstream_dir, dirs_exist_ok=True)
+        with StubGitHubServer(data_dir=upstream_dir) as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            api_repos = ["xxx-api-1", "xxx-api-2", "xxx-api-3"]
+            first = collector.collect_repositories(api_repos)
+            if first["fetched"] != 6:
+                logger.error(f"初回収集の取得件数が想定と異なります: {first}")
+                return False
+            changed_file = upstream_dir / "xxx-api-1/docs/paths/subapi.yml"
+            changed_file.write_text(changed_file.read_text(encoding='utf-8') + "x-changed: true\n", encoding='utf-8')
+            (upstream_dir / "xxx-api-2/docs/paths/subapi.yml").unlink()
+            stub.requests.clear()
+            second = collector.collect_repositories(api_repos)
+            file_requests = [path for path in stub.requests if "/git/blobs/" in path]
+            static_site_dir = Path(CONFIG["static_site_dir"])
+            if (second["fetched"], second["unchanged"], second["removed"]) != (1, 4, 1) or len(file_requests) != 1:
+                logger.error(f"差分収集の結果が想定と異なります: {second}, {file_requests}")
+                return False
+            if (static_site_dir / "xxx-api-2/docs/paths/subapi.yml").exists():
+                logger.error("上流で削除された仕様書が残っています")
+                return False
+            if "x-changed" not in (static_site_dir / "xxx-api-1/docs/paths/subapi.yml").read_text(encoding='utf-8'):
+                logger.error("変更された仕様書が更新されていません")
+                return False
+            if stub.not_modified != 1:
+                logger.error(f"変更のないツリーを条件付きで取得していません: {stub.not_modified}")
+                return False
+            # ツリーに変更がなければ304で前回の一覧を使い、blobは取得しない
+            stub.requests.clear()
+            third = collector.collect_repositories(api_repos)
+            if (third["fetched"], third["unchanged"], stub.not_modified) != (0, 5, 4) or len(stub.requests) != 3:
+                logger.error(f"変更のない収集で再取得しました: {third}, {stub.requests}")
+                return False
+        logger.info("差分収集のテストに成功しました")
+        return True
+    finally:
+        shutil.rmtree(upstream_dir, ignore_errors=True)
+        restore_config()
+
+def run_graphql_collect_test():
+    """
+    GraphQLモードで複数リポジトリのblobをまとめて取得し、切り詰められたblobやoidがblob SHAと
+    一致しないblobはRESTで補うことを確認する
+    """
+    logger.info("GraphQL収集のテストを実行します")
+    setup_test_environment()
+    original_graphql = (CONFIG["collect_mode"], CONFIG["graphql_batch_size"])
+    try:
+        with StubGitHubServer(graphql_truncate_bytes=178) as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            CONFIG["collect_mode"], CONFIG["graphql_batch_size"] = "graphql", 4
+            result = collector.collect_repositories(["xxx-api-1", "xxx-api-2", "xxx-api-3"])
+            graphql_requests = [path for path in stub.requests if path == "/graphql"]
+            blob_requests = [path for path in stub.requests if "/git/blobs/" in path]
+            if len(result["files"]) != 6 or len(graphql_requests) != 2 or len(blob_requests) != 2:
+                logger.error(f"GraphQL収集の結果が想定と異なります: {result}, {stub.requests}")
+                return False
+            for spec_file in result["files"]:
+                mock_file = Path("test/mock_data") / spec_file.relative_to(CONFIG["static_site_dir"])
+                if spec_file.read_text(encoding='utf-8') != mock_file.read_text(encoding='utf-8'):
+                    logger.error(f"取得内容がモックデータと一致しません: {spec_file}")
+                    return False
+            # ツリーの取得後にHEADが進んだ場合は、oidがblob SHAと一致しないためGraphQLの本文を使わない
+            blobs = gh_utils.resolve_spec_blobs("xxx-api-1")
+            stale = {**blobs[0], "sha": "0" * 40}
+            texts = gh_utils.fetch_blob_texts_graphql([("xxx-api-1", stale), ("xxx-api-1", blobs[1])])
+            if list(texts) != [("xxx-api-1", blobs[1]["path"])]:
+                logger.error(f"blob SHAと異なるoidの本文が使われました: {list(texts)}")
+                return False
+        logger.info("GraphQL収集のテストに成功しました")
+        return True
+    finally:
+        CONFIG["collect_mode"], CONFIG["graphql_batch_size"] = original_graphql
+        restore_config()
+
+def run_rate_limit_test():
+    """
+    セカンダリレート制限を受けても再試行で収集を完了し、
+    失敗リポジトリが多すぎる場合は部分的な結果を公開しないことを確認する
+    """
+    logger.info("レート制限と再試行のテストを実行します")
+    setup_test_environment()
+    original_retry = (CONFIG["retry_base_delay"], CONFIG["max_retries"])
+    CONFIG["retry_base_delay"], CONFIG["max_retries"] = 0.01, 3
+    scheduler.reset_scheduler()
+    try:
+        # searchの上限（30回）では残り回数が少なくても使い切るまで止めず、止めるのもsearchだけにする
+        request_scheduler = scheduler.RequestScheduler(max_concurrency=4)
+        reset = str(int(time.time()) + 60)
+        request_scheduler._observe_rate_limit(
+            {"X-RateLimit-Limit": "30", "X-RateLimit-Remaining": "29", "X-RateLimit-Reset": reset}, "search"
+        )
+        if request_scheduler.paused_until or request_scheduler.limit != 4:
+            logger.error(f"searchの残り回数で停止しました: {request_scheduler.paused_until}")
+            return False
+        request_scheduler._observe_rate_limit(
+            {"X-RateLimit-Limit": "30", "X-RateLimit-Remaining": "0", "X-RateLimit-Reset": reset,
+             "X-RateLimit-Resource": "search"}, "core"
+        )
+        if list(request_scheduler.paused_until) != ["search"]:
+            logger.error(f"停止したリソースが想定と異なります: {request_scheduler.paused_until}")
+            return False
+        request_scheduler._observe_rate_limit(
+            {"X-RateLimit-Limit": "5000", "X-RateLimit-Remaining": "40", "X-RateLimit-Reset": reset}, "core"
+        )
+        if "core" not in request_scheduler.paused_until:
+            logger.error("coreの残り回数が閾値以下でも停止しませんでした")
+            return False
+        with StubGitHubServer(rate_limit_every=3) as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            result = collector.collect_repositories(["xxx-api-1", "xxx-api-2", "xxx-api-3"])
+            stats = scheduler.get_scheduler().stats
+            if len(result["files"]) != 6 or result["failed"] or stub.throttled == 0 or stats["retries"] < stub.throttled:
+                logger.error(f"レート制限下の収集結果が想定と異なります: {result}, {stats}")
+                return False
+        scheduler.reset_scheduler()
+        with StubGitHubServer(failing_repos=["xxx-api-2"]) as stub:
+            CONFIG["github_api_url"] = stub.base_url
+            result = collector.collect_repositories(["xxx-api-1", "xxx-api-2", "xxx-api-3"])
+            if list(result["failed"]) != ["xxx-api-2"]:
+                logger.error(f"失敗リポジトリが想定と異なります: {result}")
+                return False
+            try:
+                collector.check_failure_threshold(result)
+                logger.error("失敗リポジトリが多すぎるのに処理が継続されました")
+                return False
+            except collector.CollectionFailedError as e:
+                logger.info(f"想定どおり中断されました: {e}")
+        logger.info("レート制限と再試行のテストに成功しました")
+        return True
+    finally:
+        CONFIG["retry_base_delay"], CONFIG["max_retries"] = original_retry
+        scheduler.reset_scheduler()
+        restore_config()
+
+def run_repository_discovery_test():
+    """
+    リポジトリ探索が名前・トピック・アーカイブ状態をsearch APIに渡し、ページ単位で取得することを確認する
+    """
+    logger.info("リポジトリ探索のテストを実行します")
+    setup_test_environment()
+    original_discovery = (CONFIG["repo_topics"], CONFIG["repo_page_size"])
+    metadata = {
+        "xxx-api-1": {"topics": ["openapi"]},
+        "xxx-api-2": {"topics": ["openapi"], "archived": True},
+        "xxx-api-3": {"topics": ["openapi"]},
+        "other-repo-1": {"topics": ["openapi"]},
+    }
+    try:
+        with StubGitHubServer(repo_metadata=metadata) as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            CONFIG["repo_topics"], CONFIG["repo_page_size"] = ["openapi"], 1
+            api_repos = gh_utils.get_api_repositories()
+            search_requests = [path for path in stub.requests if path == "/search/repositories"]
+            if api_repos != ["xxx-api-1", "xxx-api-3"] or len(search_requests) != 2:
+                logger.error(f"探索結果が想定と異なります: {api_repos}, {stub.requests}")
+                return False
+            if stub.search_queries[0] != "org:xxx-project xxx-api in:name topic:openapi archived:false":
+                logger.error(f"検索クエリが想定と異なります: {stub.search_queries[0]}")
+                return False
+            result = collector.collect_repositories(gh_utils.iter_api_repositories())
+            if result["repos"] != ["xxx-api-1", "xxx-api-3"] or len(result["files"]) != 4:
+                logger.error(f"ページ単位の収集結果が想定と異なります: {result}")
+                return False
+        logger.info("リポジトリ探索のテストに成功しました")
+        return True
+    finally:
+        CONFIG["repo_topics"], CONFIG["repo_page_size"] = original_discovery
+        restore_config()
+
+def create_local_git_repositories(base_dir):
+    """
+    test/mock_data の各リポジトリからローカルのgitリポジトリを作成する
+    """
+    import subprocess
+    for mock_repo in sorted(Path("test/mock_data").iterdir()):
+        repo_dir = Path(base_dir) / mock_repo.name
+        shutil.copytree(mock_repo, repo_dir)
+        for args in (
+            ["init", "--quiet", "--initial-branch=main"],
+            ["config", "uploadpack.allowFilter", "true"],
+            ["config", "uploadpack.allowAnySHA1InWant", "true"],
+            ["add", "."],
+            ["-c", "user.name=test", "-c", "user.email=test@example.com", "commit", "--quiet", "-m", "init"],
+        ):
+            subprocess.run(["git", "-C", str(repo_dir)] + args, check=True)
+
+def run_mirror_collect_test():
+    """
+    ローカルのgitリポジトリから既定のブランチだけの部分クローンを作り、cat-file --batchで仕様書を取得することを確認する
+    """
+    import subprocess
+    logger.info("ミラー収集のテストを実行します")
+    setup_test_environment()
+    work_dir = Path(tempfile.mkdtemp())
+    original_mirror = (CONFIG["collect_mode"], CONFIG["mirror_cache_dir"], CONFIG["git_clone_url"])
+    try:
+        create_local_git_repositories(work_dir / "upstream")
+        CONFIG["collect_mode"] = "mirror"
+        CONFIG["mirror_cache_dir"] = str(work_dir / "mirrors")
+        CONFIG["git_clone_url"] = (work_dir / "upstream").resolve().as_uri() + "/{repo}"
+        upstream_1 = work_dir / "upstream/xxx-api-1"
+        subprocess.run(["git", "-C", str(upstream_1), "update-ref", "refs/pull/1/head", "HEAD"], check=True)
+        # 以前の git clone --mirror で作成したミラーは作り直す
+        subprocess.run(
+            ["git", "clone", "--mirror", "--quiet", CONFIG["git_clone_url"].format(repo="xxx-api-1"),
+             str(work_dir / "mirrors/xxx-api-1.git")],
+            check=True,
+        )
+        api_repos = ["xxx-api-1", "xxx-api-2", "xxx-api-3"]
+        first = collector.collect_repositories(api_repos)
+        if len(first["files"]) != 6 or first["fetched"] != 6:
+            logger.error(f"ミラーからの収集結果が想定と異なります: {first}")
+            return False
+        refs = subprocess.run(
+            ["git", "--git-dir", str(work_dir / "mirrors/xxx-api-1.git"), "for-each-ref", "--format=%(refname)"],
+            capture_output=True, text=True, check=True,
+        ).stdout.split()
+        if refs != ["refs/heads/main"]:
+            logger.error(f"既定のブランチ以外の参照を取得しています: {refs}")
+            return False
+        for spec_file in first["files"]:
+            mock_file = Path("test/mock_data") / spec_file.relative_to(CONFIG["static_site_dir"])
+            if spec_file.read_text(encoding='utf-8') != mock_file.read_text(encoding='utf-8'):
+                logger.error(f"取得内容がモックデータと一致しません: {spec_file}")
+                return False
+        upstream_file = work_dir / "upstream/xxx-api-3/docs/paths/openapi.yml"
+        upstream_file.write_text(upstream_file.read_text(encoding='utf-8') + "x-changed: true\n", encoding='utf-8')
+        subprocess.run(
+            ["git", "-C", str(upstream_file.parents[2]), "-c", "user.name=test", "-c", "user.email=test@example.com",
+             "commit", "--quiet", "-am", "update"],
+            check=True,
+        )
+        mirror_3 = git_mirror.update_mirror("xxx-api-3")
+        changed_sha = next(
+            blob["sha"] for blob in git_mirror.list_mirror_blobs(mirror_3) if blob["path"] == "docs/paths/openapi.yml"
+        )
+        unchanged_sha = git_blob_sha(Path("test/mock_data/xxx-api-3/docs/paths/subapi.yml").read_bytes())
+        # 判定のために存在しないblobを取得しないため、2回目も同じ結果になる
+        for _ in range(2):
+            if git_mirror.find_missing_blobs(mirror_3, [changed_sha, unchanged_sha]) != [changed_sha]:
+                logger.error("部分クローンにないblobを判定できていないか、判定で取得しました")
+                return False
+        second = collector.collect_repositories(api_repos)
+        if (second["fetched"], second["unchanged"]) != (1, 5):
+            logger.error(f"ミラーの差分収集結果が想定と異なります: {second}")
+            return False
+        logger.info("ミラー収集のテストに成功しました")
+        return True
+    finally:
+        CONFIG["collect_mode"], CONFIG["mirror_cache_dir"], CONFIG["git_clone_url"] = original_mirror
+        shutil.rmtree(work_dir, ignore_errors=True)
+        restore_config()
+
+def run_spec_catalog_test():
+    """
+    SpecCatalogで仕様書を1回だけ解析し、index.html と統合ビューアの両方を生成できることを確認する
+    """
+    import src.catalog as catalog_module
+    logger.info("仕様書カタログのテストを実行します")
+    setup_test_environment()
+    original_load_yaml = catalog_module.load_yaml
+    parsed = []
+    def counting_load_yaml(content):
+        parsed.append(content)
+        return original_load_yaml(content)
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, Path(CONFIG["static_site_dir"]) / mock_repo.name)
+        catalog_module.load_yaml = counting_load_yaml
+        catalog = SpecCatalog.load()
+        site_generator.generate_static_site(catalog)
+        site_generator.generate_integrated_viewer(catalog)
+        if len(parsed) != 6 or len(catalog.api_specs()) != 6:
+            logger.error(f"仕様書の解析回数が想定と異なります: {len(parsed)}回 / {len(catalog.api_specs())}件")
+            return False
+        entry = catalog.entries[0]
+        if (entry.repo, entry.path) != ("xxx-api-1", "xxx-api-1/docs/paths/openapi.yml") or not entry.title:
+            logger.error(f"カタログの内容が想定と異なります: {entry.repo} {entry.path} {entry.title}")
+            return False
+        for name in ("index.html", "api-spec-viewer.html"):
+            if entry.title not in (Path(CONFIG["static_site_dir"]) / name).read_text(encoding='utf-8'):
+                logger.error(f"{name}に仕様書のタイトルが含まれていません: {entry.title}")
+                return False
+        logger.info("仕様書カタログのテストに成功しました")
+        return True
+    finally:
+        catalog_module.load_yaml = original_load_yaml
+        restore_config()
+
+def run_parse_cache_test():
+    """
+    2回目のビルドでは解析キャッシュから読み込み、結果が変わらないことと、サイズ上限での削除を確認する
+    """
+    from src.parse_cache import ParseCache, load_yaml
+    logger.info("解析キャッシュのテストを実行します")
+    setup_test_environment()
+    cache_dir = Path(tempfile.mkdtemp())
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, Path(CONFIG["static_site_dir"]) / mock_repo.name)
+        CONFIG["parse_cache_dir"] = str(cache_dir)
+        first = SpecCatalog.load()
+        second = SpecCatalog.load()
+        if (first.parse_stats["misses"], second.parse_stats["hits"], second.parse_stats["misses"]) != (6, 6, 0):
+            logger.error(f"解析キャッシュのヒット・ミス数が想定と異なります: {first.parse_stats} / {second.parse_stats}")
+            return False
+        if first.api_specs() != second.api_specs():
+            logger.error("キャッシュから読み込んだ解析結果が一致しません")
+            return False
+        # キャッシュから読み込んだ結果も、YAMLの日付や数値のキーを含めて解析した結果と同じになる
+        cache = ParseCache(cache_dir)
+        dated = "info:\n  title: dated\n  version: 2024-01-02\n"
+        expected = {"info": {"title": "dated", "version": datetime.date(2024, 1, 2)}}
+        if cache.load(dated) != expected or cache.load(dated) != expected or cache.stats["hits"] != 1:
+            logger.error(f"日付を含む仕様書がキャッシュされていません: {cache.stats}")
+            return False
+        int_keyed = (
+            "openapi: 3.0.0\ninfo:\n  title: codes\n  version: 1.0.0\npaths:\n  /codes:\n    get:\n"
+            "      responses:\n        200:\n          description: OK\n        404:\n          description: NG\n"
+        )
+        expected = load_yaml(int_keyed)
+        missed, hit = cache.load(int_keyed), ParseCache(cache_dir).load(int_keyed)
+        if missed != expected or hit != expected or list(hit["paths"]["/codes"]["get"]["responses"]) != [200, 404]:
+            logger.error(f"キャッシュの有無で解析結果が異なります: {missed} / {hit}")
+            return False
+        cache = ParseCache(cache_dir, max_bytes=0)
+        if cache.evict() != 8 or list(cache_dir.glob("*/*.pickle")):
+            logger.error("サイズ上限を超えた解析キャッシュが削除されていません")
+            return False
+        logger.info("解析キャッシュのテストに成功しました")
+        return True
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        restore_config()
+
+def run_parallel_build_test():
+    """
+    プロセスプールで解析した場合も、逐次処理と同じバイト列のindex.htmlと統合ビューアが生成されることを確認する
+    """
+    logger.info("並列ビルドのテストを実行します")
+    setup_test_environment()
+    original_build_workers = CONFIG["build_workers"]
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    outputs = []
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        for workers in (1, 4):
+            CONFIG["build_workers"] = workers
+            catalog = SpecCatalog.load()
+            site_generator.generate_static_site(catalog)
+            site_generator.generate_integrated_viewer(catalog)
+            outputs.append([(static_site_dir / name).read_bytes() for name in ("index.html", "api-spec-viewer.html")])
+        if outputs[0] != outputs[1]:
+            logger.error("並列ビルドの出力が逐次処理と一致しません")
+            return False
+        logger.info("並列ビルドのテストに成功しました")
+        return True
+    finally:
+        CONFIG["build_workers"] = original_build_workers
+        restore_config()
+
+def run_vendor_assets_test():
+    """
+    vendor --lock で固定した外部アセットをオフラインのビルドで埋め込み、
+    integrityが固定されていない・キャッシュがない・改ざんされている場合は失敗することを確認する
+    """
+    import json
+    logger.info("外部アセットキャッシュのテストを実行します")
+    setup_test_environment()
+    cache_dir = Path(tempfile.mkdtemp())
+    original_lock_file = CONFIG["vendor_lock_file"]
+    lock_file = Path(tempfile.mkdtemp()) / "vendor_assets.lock.json"
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    assets = {f"/npm/{name}.txt": content for name, content in TEST_VENDOR_ASSETS.items()}
+    try:
+        with StubGitHubServer(assets=assets) as server:
+            CONFIG["vendor_assets"] = {
+                name: {"url": f"{server.base_url}/npm/{name}.txt", "integrity": None} for name in TEST_VENDOR_ASSETS
+            }
+            CONFIG["vendor_cache_dir"] = str(cache_dir)
+            CONFIG["vendor_offline"] = False
+            CONFIG["vendor_lock_file"] = str(lock_file)
+            # integrityを固定していないアセットは取得せずに失敗する
+            try:
+                vendor_assets.vendor_assets()
+                logger.error("integrityを固定していない外部アセットを取得しました")
+                return False
+            except vendor_assets.VendorAssetError as e:
+                logger.info(f"想定どおり失敗しました: {e}")
+            pinned = vendor_assets.vendor_assets(lock=True)
+            vendor_assets.vendor_assets()
+            if len(server.requests) != 3:
+                logger.error(f"外部アセットの取得回数が想定と異なります: {server.requests}")
+                return False
+            locked = json.loads(lock_file.read_text(encoding='utf-8'))
+            expected = vendor_assets.compute_integrity(TEST_VENDOR_ASSETS["redoc_js"])
+            if pinned["redoc_js"] != expected or locked[CONFIG["vendor_assets"]["redoc_js"]["url"]] != expected:
+                logger.error(f"記録されたintegrityが想定と異なります: {pinned} {locked}")
+                return False
+            CONFIG["vendor_offline"] = True
+            for mock_repo in Path("test/mock_data").iterdir():
+                shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+            site_generator.generate_static_site()
+            site_generator.generate_integrated_viewer()
+            if len(server.requests) != 3:
+                logger.error(f"オフラインのビルドで外部アセットを取得しました: {server.requests}")
+                return False
+        viewer = (static_site_dir / "api-spec-viewer.html").read_text(encoding='utf-8')
+        if any(content.decode() not in viewer for content in TEST_VENDOR_ASSETS.values()):
+            logger.error("統合ビューアに外部アセットが埋め込まれていません")
+            return False
+        index = vendor_assets.VendorCache(cache_dir).index[CONFIG["vendor_assets"]["redoc_js"]["url"]]
+        (cache_dir / index["file"]).write_bytes(b"/* tampered */")
+        for broken_cache_dir in (cache_dir, Path(tempfile.mkdtemp())):
+            CONFIG["vendor_cache_dir"] = str(broken_cache_dir)
+            try:
+                site_generator.generate_integrated_viewer()
+                logger.error(f"外部アセットを用意できないのにビルドが成功しました: {broken_cache_dir}")
+                return False
+            except vendor_assets.VendorAssetError as e:
+                logger.info(f"想定どおりビルドが失敗しました: {e}")
+            finally:
+                if broken_cache_dir != cache_dir:
+                    shutil.rmtree(broken_cache_dir, ignore_errors=True)
+        logger.info("外部アセットキャッシュのテストに成功しました")
+        return True
+    finally:
+        CONFIG["vendor_lock_file"] = original_lock_file
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        shutil.rmtree(lock_file.parent, ignore_errors=True)
+        restore_config()
+
+def run_committed_vendor_pins_test():
+    """
+    既定の外部アセットはリポジトリにコミットした vendor_lock_file だけでintegrityが固定されており、
+    ビルドがキャッシュの内容をその値と照合することを確認する（取得先に接続しないため、内容は置き換える）
+    """
+    import re
+    logger.info("コミット済みの外部アセットのintegrityのテストを実行します")
+    setup_test_environment()
+    cache_dir = Path(tempfile.mkdtemp())
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    try:
+        CONFIG["vendor_assets"] = original_vendor_settings[0]
+        CONFIG["vendor_cache_dir"] = str(cache_dir)
+        cache = vendor_assets.get_vendor_cache()
+        for name, asset in sorted(CONFIG["vendor_assets"].items()):
+            if asset.get("integrity"):
+                logger.error(f"既定の設定でintegrityが指定されています（コミットしたファイルで固定する）: {name}")
+                return False
+            expected = cache.expected_integrity(asset)
+            if not re.fullmatch(r"sha384-[A-Za-z0-9+/]{64}", expected):
+                logger.error(f"コミットされたintegrityの形式が不正です: {name} {expected}")
+                return False
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        try:
+            site_generator.generate_integrated_viewer()
+            logger.error("外部アセットがキャッシュにないのにビルドが成功しました")
+            return False
+        except vendor_assets.VendorAssetError as e:
+            if "vendor`" not in str(e):
+                logger.error(f"キャッシュがない場合のエラーが想定と異なります: {e}")
+                return False
+        for name, asset in CONFIG["vendor_assets"].items():
+            content = f"/* not {asset['url']} */".encode()
+            (cache_dir / f"{name}.txt").write_bytes(content)
+            cache.index[asset["url"]] = {
+                "file": f"{name}.txt", "integrity": vendor_assets.compute_integrity(content), "size": len(content),
+            }
+        cache._save_index()
+        try:
+            site_generator.generate_integrated_viewer()
+            logger.error("コミットされたintegrityと一致しない外部アセットでビルドが成功しました")
+            return False
+        except vendor_assets.VendorAssetError as e:
+            if "一致しません" not in str(e):
+                logger.error(f"integrityが一致しない場合のエラーが想定と異なります: {e}")
+                return False
+        logger.info("コミット済みの外部アセットのintegrityのテストに成功しました")
+        return True
+    finally:
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        restore_config()
+
+def run_split_output_test():
+    """
+    分割出力では index.html に仕様書一覧だけを埋め込み、仕様書ごとのJSONを書き出すことを確認する
+    """
+    import json
+    logger.info("分割出力のテストを実行します")
+    setup_test_environment()
+    original_output_mode = CONFIG["site_output_mode"]
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        stale_file = static_site_dir / "static/specs/removed-repo/openapi.yml.json"
+        stale_file.parent.mkdir(parents=True)
+        stale_file.write_text("{}", encoding='utf-8')
+        CONFIG["site_output_mode"] = "split"
+        catalog = SpecCatalog.load()
+        site_generator.generate_static_site(catalog)
+        index = (static_site_dir / "index.html").read_text(encoding='utf-8')
+        summaries = json.loads((static_site_dir / "static/specs/catalog.json").read_text(encoding='utf-8'))
+        if len(summaries) != 6 or stale_file.exists():
+            logger.error(f"仕様書一覧が想定と異なります: {len(summaries)}件, 古いJSON: {stale_file.exists()}")
+            return False
+        for entry, summary in zip(catalog, summaries):
+            payload = json.loads((static_site_dir / summary["url"]).read_text(encoding='utf-8'))
+            if payload != entry.data or summary["operations"] != 1:
+                logger.error(f"仕様書のJSONまたはオペレーション数が想定と異なります: {summary}")
+                return False
+            if entry.json in index:
+                logger.error(f"分割出力の index.html に仕様書が埋め込まれています: {entry.path}")
+                return False
+        if "const apiCatalog" not in index or summaries[0]["title"] not in index:
+            logger.error("index.html に仕様書一覧が埋め込まれていません")
+            return False
+        logger.info("分割出力のテストに成功しました")
+        return True
+    finally:
+        CONFIG["site_output_mode"] = original_output_mode
+        restore_config()
+
+def run_search_index_test():
+    """
+    ビルド時に作成した検索索引に、フィールドごとの重みと検索結果に表示する項目が含まれることを確認する
+    """
+    from src.search_index import build_search_index, tokenize
+    logger.info("検索索引のテストを実行します")
+    setup_test_environment()
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        if not {"get", "user", "getuserbyid", "ユー", "ーザ"} <= tokenize("getUserById ユーザー"):
+            logger.error(f"語の分割が想定と異なります: {sorted(tokenize('getUserById ユーザー'))}")
+            return False
+        catalog = SpecCatalog.load()
+        site_generator.generate_static_site(catalog)
+        site_generator.generate_integrated_viewer(catalog)
+        shards = build_search_index(catalog)
+        meta = shards["index"]
+        terms = shards["terms-h"]
+        postings = terms["postings"][terms["terms"].index("hello")]
+        hits = {(meta["specs"][spec][0], weight, tuple(shards["items-0"][item][:2]))
+                for spec, weight, item in zip(postings[::3], postings[1::3], postings[2::3])}
+        expected = {
+            ("xxx-api-1/docs/paths/openapi.yml", 80, ("paths./hello", "/hello")),
+            ("xxx-api-1/docs/paths/openapi.yml", 60, ("paths./hello.get", "GET /hello")),
+        }
+        if not expected <= hits:
+            logger.error(f"検索索引の内容が想定と異なります: {sorted(hits)}")
+            return False
+        search_files = sorted(path.name for path in (static_site_dir / "static/search").iterdir())
+        if search_files != sorted(f"{name}.js" for name in shards):
+            logger.error(f"検索索引のシャードが書き出されていません: {search_files}")
+            return False
+        viewer = (static_site_dir / "api-spec-viewer.html").read_text(encoding='utf-8')
+        if viewer.count("registerSearchShard(") < len(shards):
+            logger.error("統合ビューアに検索索引が埋め込まれていません")
+            return False
+        logger.info("検索索引のテストに成功しました")
+        return True
+    finally:
+        restore_config()
+
+def run_streaming_viewer_test():
+    """
+    解析結果を保持しないカタログから逐次書き込みで生成した統合ビューアが、
+    解析結果を保持したカタログから生成したものと同じバイト列になることを確認する
+    """
+    logger.info("統合ビューアの逐次生成のテストを実行します")
+    setup_test_environment()
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    viewer_file = static_site_dir / "api-spec-viewer.html"
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        retained = SpecCatalog.load()
+        site_generator.generate_integrated_viewer(retained)
+        expected = viewer_file.read_bytes()
+        lean = SpecCatalog.load(retain_data=False)
+        if any(entry.data is not None or entry.json is not None for entry in lean):
+            logger.error("retain_data=False のカタログが解析結果を保持しています")
+            return False
+        if lean.api_specs_json() != retained.api_specs_json() or lean.search_index != retained.search_index:
+            logger.error("解析結果を保持しないカタログの内容が一致しません")
+            return False
+        site_generator.generate_integrated_viewer()
+        if viewer_file.read_bytes() != expected or viewer_file.with_suffix(".tmp").exists():
+            logger.error("逐次生成した統合ビューアが一致しません")
+            return False
+        logger.info("統合ビューアの逐次生成のテストに成功しました")
+        return True
+    finally:
+        restore_config()
+
+def run_compressed_viewer_test():
+    """
+    統合ビューアに仕様書を圧縮して埋め込み、展開すると元のJSONに戻ることを確認する
+    """
+    import re
+    import json
+    import gzip
+    import zlib
+    import base64
+    logger.info("統合ビューアの圧縮埋め込みのテストを実行します")
+    setup_test_environment()
+    original_compression = CONFIG["viewer_payload_compression"]
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    viewer_file = static_site_dir / "api-spec-viewer.html"
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        catalog = SpecCatalog.load()
+        site_generator.generate_integrated_viewer(catalog)
+        plain_size = viewer_file.stat().st_size
+        for compression, decompress in (("gzip", gzip.decompress), ("deflate", zlib.decompress)):
+            CONFIG["viewer_payload_compression"] = compression
+            site_generator.generate_integrated_viewer(catalog)
+            viewer = viewer_file.read_text(encoding='utf-8')
+            match = re.search(r"const compressedApiSpecs = (.*);\n", viewer)
+            if not match or f"const apiSpecCompression = '{compression}'" not in viewer:
+                logger.error(f"圧縮した仕様書が埋め込まれていません: {compression}")
+                return False
+            packed = json.loads(match.group(1))
+            for entry in catalog:
+                if decompress(base64.b64decode(packed[entry.path])).decode("utf-8") != entry.json:
+                    logger.error(f"展開した仕様書が一致しません: {compression} {entry.path}")
+                    return False
+                if entry.json in viewer:
+                    logger.error(f"圧縮していない仕様書が埋め込まれています: {entry.path}")
+                    return False
+            if "const apiCatalog" not in viewer:
+                logger.error("統合ビューアに仕様書一覧が埋め込まれていません")
+                return False
+        logger.info(f"統合ビューアのサイズ: {plain_size} バイト -> {viewer_file.stat().st_size} バイト")
+        logger.info("統合ビューアの圧縮埋め込みのテストに成功しました")
+        return True
+    finally:
+        CONFIG["viewer_payload_compression"] = original_compression
+        restore_config()
+
+def run_shared_components_test():
+    """
+    複数の仕様書で同じ内容のcomponentsを共有テーブルに1回だけ埋め込み、元に戻すと同じ仕様書になることを確認する
+    """
+    import re
+    import json
+    import src.catalog as catalog_module
+    from src.shared_components import SHARED_COMPONENT_KEY
+    logger.info("components共有のテストを実行します")
+    setup_test_environment()
+    original_parse = catalog_module.parse_spec_file
+    original_dedupe = CONFIG["viewer_dedupe_components"]
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    viewer_file = static_site_dir / "api-spec-viewer.html"
+    error_schema = (
+        "    Error:\n      type: object\n      description: 共通のエラーレスポンス\n      properties:\n"
+        "        code:\n          type: integer\n        message:\n          type: string\n"
+    )
+    try:
+        for index in range(3):
+            spec_dir = static_site_dir / f"shared-api-{index}" / "docs" / "paths"
+            spec_dir.mkdir(parents=True)
+            (spec_dir / "openapi.yml").write_text(
+                f"openapi: 3.0.0\ninfo:\n  title: shared-api-{index}\n  version: 1.0.0\npaths: {{}}\n"
+                f"components:\n  schemas:\n{error_schema}    Item{index}:\n      type: object\n",
+                encoding='utf-8',
+            )
+        catalog = SpecCatalog.load()
+        site_generator.generate_integrated_viewer(catalog)
+        plain_size = viewer_file.stat().st_size
+        CONFIG["viewer_dedupe_components"] = True
+        site_generator.generate_integrated_viewer(catalog)
+        viewer = viewer_file.read_text(encoding='utf-8')
+        shared = json.loads(re.search(r"const sharedComponents = (.*);\n", viewer).group(1))
+        api_specs = json.loads(re.search(r"const apiSpecs = (.*);\n", viewer).group(1))
+        if len(shared) != 1 or viewer.count(json.dumps("共通のエラーレスポンス")) != 1 or viewer_file.stat().st_size >= plain_size:
+            logger.error(f"共有テーブルが想定と異なります: {shared}")
+            return False
+        for spec in api_specs.values():
+            for name, schema in spec["components"]["schemas"].items():
+                if SHARED_COMPONENT_KEY in schema:
+                    spec["components"]["schemas"][name] = shared[schema[SHARED_COMPONENT_KEY]]
+        if api_specs != catalog.api_specs():
+            logger.error("共有テーブルから元に戻した仕様書が一致しません")
+            return False
+        # 解析結果を保持しないカタログでは、読み込み時に出現回数を数えて埋め込み時の1回だけ解析し直す
+        expected = viewer_file.read_bytes()
+        parsed = []
+        def counting_parse(*args, **kwargs):
+            parsed.append(args[2])
+            return original_parse(*args, **kwargs)
+        catalog_module.parse_spec_file = counting_parse
+        site_generator.generate_integrated_viewer()
+        if len(parsed) != 2 * len(catalog) or viewer_file.read_bytes() != expected:
+            logger.error(f"components共有のために仕様書を解析し直しました: {len(parsed)}回 ({len(catalog)}件)")
+            return False
+        logger.info("components共有のテストに成功しました")
+        return True
+    finally:
+        catalog_module.parse_spec_file = original_parse
+        CONFIG["viewer_dedupe_components"] = original_dedupe
+        restore_config()
+
+def run_ref_bundle_test():
+    """
+    収集対象外の $ref の参照先ファイルを収集後に取得し、外部参照・循環参照を解決した仕様書になることを確認する
+    """
+    import src.bundler as bundler
+    logger.info("$ref解決のテストを実行します")
+    setup_test_environment()
+    data_dir = Path(tempfile.mkdtemp())
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    upstream = {
+        "docs/paths/users.yml": (
+            "openapi: 3.0.0\ninfo:\n  title: users\n  version: 1.0.0\npaths:\n  /users:\n    get:\n"
+            "      responses:\n        '200':\n          description: OK\n          content:\n"
+            "            application/json:\n              schema:\n                $ref: '../schemas/user.yml#/UserList'\n"
+            "        default:\n          $ref: '#/components/responses/Error'\n"
+            "components:\n  responses:\n    Error:\n      description: エラー\n      content:\n"
+            "        application/json:\n          schema:\n            $ref: '../schemas/common.yml#/Error'\n"
+        ),
+        "docs/paths/health.yml": (
+            "openapi: 3.0.0\ninfo:\n  title: health\n  version: 1.0.0\npaths:\n  /health:\n    get:\n"
+            "      responses:\n        default:\n          description: エラー\n          content:\n"
+            "            application/json:\n              schema:\n                $ref: '../schemas/common.yml#/Error'\n"
+        ),
+        "docs/schemas/user.yml": (
+            "User:\n  type: object\n  properties:\n    id:\n      type: integer\n    friends:\n"
+            "      $ref: '#/UserList'\n    error:\n      $ref: 'common.yml#/Error'\n"
+            "UserList:\n  type: array\n  items:\n    $ref: '#/User'\n"
+        ),
+        "docs/schemas/common.yml": "Error:\n  type: object\n  properties:\n    message:\n      type: string\n",
+        "docs/schemas/unused.yml": "Unused:\n  type: object\n",
+    }
+    try:
+        for path, content in upstream.items():
+            (data_dir / "ref-api" / path).parent.mkdir(parents=True, exist_ok=True)
+            (data_dir / "ref-api" / path).write_text(content, encoding='utf-8')
+        with StubGitHubServer(data_dir=data_dir, other_repos=[]) as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            result = collector.collect_repositories(["ref-api"])
+            stats = bundler.fetch_missing_refs(result)
+            fetched = sorted(path.relative_to(static_site_dir).as_posix() for path in static_site_dir.rglob("*.yml"))
+            expected_files = sorted(f"ref-api/{path}" for path in upstream if path != "docs/schemas/unused.yml")
+            if fetched != expected_files or stats["fetched"] != 2:
+                logger.error(f"$refの参照先の取得結果が想定と異なります: {fetched} {stats}")
+                return False
+            requests_before, not_modified_before = len(stub.requests), stub.not_modified
+            stats = bundler.fetch_missing_refs(result)
+            if (stats["fetched"], stats["unchanged"]) != (0, 2) or len(stub.requests) != requests_before + 1 \
+                    or stub.not_modified != not_modified_before + 1:
+                logger.error(f"変更のない参照先ファイルを取得し直しました: {stats} {stub.requests[requests_before:]}")
+                return False
+        catalog = SpecCatalog.load()
+        specs = {entry.path: entry for entry in catalog}
+        users = specs["ref-api/docs/paths/users.yml"].data
+        error = {"type": "object", "properties": {"message": {"type": "string"}}}
+        list_schema = users["paths"]["/users"]["get"]["responses"]["200"]["content"]["application/json"]["schema"]
+        if list_schema != {"$ref": "#/components/schemas/UserList"}:
+            logger.error(f"循環参照が内部参照に置き換えられていません: {list_schema}")
+            return False
+        user_list = users["components"]["schemas"]["UserList"]
+        if user_list["items"]["properties"]["friends"] != list_schema or user_list["items"]["properties"]["error"] != error:
+            logger.error(f"参照先の内容が展開されていません: {user_list}")
+            return False
+        if users["paths"]["/users"]["get"]["responses"]["default"] != {"$ref": "#/components/responses/Error"}:
+            logger.error("仕様書内の参照が変更されています")
+            return False
+        if users["components"]["responses"]["Error"]["content"]["application/json"]["schema"] != error:
+            logger.error("仕様書内の定義からの外部参照が展開されていません")
+            return False
+        if "$ref" in specs["ref-api/docs/paths/health.yml"].json or any(entry.warnings for entry in catalog):
+            logger.error(f"解決されていない$refがあります: {[entry.warnings for entry in catalog]}")
+            return False
+        if catalog.resolver.stats["documents"] != 2 or not catalog.resolver.stats["document_hits"]:
+            logger.error(f"参照先ファイルが使い回されていません: {catalog.resolver.stats}")
+            return False
+        logger.info("$ref解決のテストに成功しました")
+        return True
+    finally:
+        shutil.rmtree(data_dir, ignore_errors=True)
+        restore_config()
+
+def run_metrics_test():
+    """
+    収集・生成の計測結果（APIリクエスト数・ダウンロード量・仕様書ごとの解析時間・出力サイズ）が記録され、
+    JSONとPrometheus形式で書き出されることを確認する
+    """
+    import json
+    from src.metrics import reset_metrics, write_metrics_report
+    logger.info("計測結果のテストを実行します")
+    setup_test_environment()
+    original_settings = (CONFIG["build_workers"], CONFIG["metrics_textfile"])
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    textfile = Path(tempfile.mkdtemp()) / "openapispec.prom"
+    try:
+        metrics = reset_metrics()
+        with StubGitHubServer() as stub:
+            CONFIG["github_backend"] = "http"
+            CONFIG["github_api_url"] = stub.base_url
+            collector.collect_repositories(["xxx-api-1", "xxx-api-2", "xxx-api-3"])
+            if metrics.counter_value("github_api_requests") != len(stub.requests):
+                logger.error(f"APIリクエスト数が一致しません: {metrics.counter_value('github_api_requests')} / {len(stub.requests)}")
+                return False
+        downloaded = sum(path.stat().st_size for path in static_site_dir.rglob("*.yml"))
+        if metrics.counter_value("github_downloaded_bytes") <= downloaded:
+            logger.error("ダウンロードしたバイト数が記録されていません")
+            return False
+        if metrics.counter_value("collected_files", result="fetched") != 6 or metrics.span_seconds("collect_repo", repo="xxx-api-1") <= 0:
+            logger.error(f"リポジトリ・仕様書ごとの収集が記録されていません: {metrics.to_dict()}")
+            return False
+        # プロセスプールで解析した場合も、各プロセスの計測結果が1回ずつ集計されることを確認する
+        CONFIG["build_workers"] = 2
+        site_generator.generate_static_site()
+        parse_spans = [item for item in metrics.to_dict()["spans"] if item["name"] == "parse_spec"]
+        if len(parse_spans) != 6 or any(item["count"] != 1 for item in parse_spans):
+            logger.error(f"仕様書ごとの解析時間が記録されていません: {parse_spans}")
+            return False
+        if metrics.counter_value("rendered_bytes", output="index.html") != (static_site_dir / "index.html").stat().st_size:
+            logger.error("index.html の出力サイズが記録されていません")
+            return False
+        CONFIG["metrics_textfile"] = str(textfile)
+        write_metrics_report()
+        with open(static_site_dir / CONFIG["metrics_file"], encoding='utf-8') as f:
+            report = json.load(f)
+        if not any(item["name"] == "build_step" and item["labels"] == {"step": "render"} for item in report["spans"]):
+            logger.error("JSONの計測結果に生成の区間がありません")
+            return False
+        prometheus = textfile.read_text(encoding='utf-8')
+        expected = f'openapispec_github_api_requests_total{{api="rest",backend="http",status="200"}}'
+        if expected not in prometheus or 'spec="' in prometheus or 'openapispec_parse_spec_count{repo="xxx-api-3"} 2' not in prometheus:
+            logger.error(f"Prometheus形式の計測結果が想定と異なります:\n{prometheus}")
+            return False
+        logger.info("計測結果のテストに成功しました")
+        return True
+    finally:
+        CONFIG["build_workers"], CONFIG["metrics_textfile"] = original_settings
+        restore_config()
+
+def run_startup_test():
+    """
+    clean は yaml / requests / jinja2 を、collect は静的サイト生成のモジュールを、build は requests を読み込まずに起動し、
+    requests はHTTPバックエンドが最初に送信する時まで読み込まず、
+    テンプレートの環境とコンパイル結果が使い回されることを確認する
+    """
+    import subprocess
+    logger.info("起動処理のテストを実行します")
+    check = (
+        "import sys, openapispec_cli\n"
+        "from src.config import CONFIG\n"
+        "CONFIG['metrics_file'] = None\n"
+        "loaded = lambda: sorted(m for m in ('yaml', 'requests', 'jinja2', 'src.site_generator') if m in sys.modules)\n"
+        "openapispec_cli.run_command(lambda: None)\n"
+        "print(loaded())\n"
+        "from src import site_generator, watcher, server\n"
+        "print(loaded())\n"
+        "from src import collector\n"
+        "print(loaded())\n"
+        "from src.github_client import HttpBackend\n"
+        "backend = HttpBackend('http://127.0.0.1:9')\n"
+        "print(loaded())\n"
+        "backend.session\n"
+        "print(loaded())\n"
+    )
+    result = subprocess.run([sys.executable, "-c", check], capture_output=True, text=True, cwd=Path(__file__).parent.parent)
+    generated = "['jinja2', 'src.site_generator', 'yaml']"
+    expected = ["[]", generated, generated, generated, "['jinja2', 'requests', 'src.site_generator', 'yaml']"]
+    if result.stdout.splitlines() != expected:
+        logger.error(f"起動時に不要なモジュールを読み込んでいます: {result.stdout} {result.stderr}")
+        return False
+    setup_test_environment()
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        shutil.rmtree(TEST_TEMPLATE_CACHE_DIR)
+        site_generator._template_environments.clear()
+        site_generator.generate_static_site()
+        first = (static_site_dir / "index.html").read_bytes()
+        if site_generator.get_template_environment() is not site_generator.get_template_environment():
+            logger.error("テンプレートの環境が共有されていません")
+            return False
+        cached = sorted(TEST_TEMPLATE_CACHE_DIR.iterdir())
+        if not cached:
+            logger.error("コンパイル済みのテンプレートが保存されていません")
+            return False
+        # 新しいプロセスと同じく環境を作り直し、保存したコンパイル結果から読み込む
+        site_generator._template_environments.clear()
+        site_generator.generate_static_site()
+        if (static_site_dir / "index.html").read_bytes() != first or sorted(TEST_TEMPLATE_CACHE_DIR.iterdir()) != cached:
+            logger.error("保存したコンパイル結果から同じ index.html を生成できませんでした")
+            return False
+        logger.info("起動処理のテストに成功しました")
+        return True
+    finally:
+        restore_config()
+
+def run_watch_test():
+    """
+    watchコマンドで、変更された仕様書だけを解析し直し、必要な場合だけ index.html を生成し直すことを確認する
+    """
+    from src.watcher import SiteWatcher
+    from src.search_index import shard_key
+    logger.info("watchコマンドのテストを実行します")
+    setup_test_environment()
+    original_output_mode = CONFIG["site_output_mode"]
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    def has_term(watcher, term):
+        shard = watcher.catalog.search_index.get(f"terms-{shard_key(term)}", {"terms": []})
+        return term in shard["terms"] and f'"{term}"' in (static_site_dir / f"static/search/terms-{shard_key(term)}.js").read_text(encoding='utf-8')
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        CONFIG["site_output_mode"] = "split"
+        watcher = SiteWatcher()
+        watcher.build()
+        index_file = static_site_dir / "index.html"
+        index_mtime = index_file.stat().st_mtime_ns
+        if watcher.poll() != {"specs": 0, "removed": 0, "shards": 0, "html": False}:
+            logger.error("変更がないのに再生成しました")
+            return False
+        spec_file = static_site_dir / "xxx-api-1/docs/paths/openapi.yml"
+        spec_file.write_text(spec_file.read_text(encoding='utf-8').replace("Hello endpoint", "Greeting endpoint"), encoding='utf-8')
+        result = watcher.poll()
+        if result["specs"] != 1 or result["html"] or index_file.stat().st_mtime_ns != index_mtime:
+            logger.error(f"仕様書の変更の反映が想定と異なります: {result}")
+            return False
+        if not 0 < result["shards"] < len(watcher.search_scripts) or not has_term(watcher, "greeting"):
+            logger.error(f"検索索引のシャードが更新されていません: {result}")
+            return False
+        payload = (static_site_dir / "static/specs/xxx-api-1/docs/paths/openapi.yml.json").read_text(encoding='utf-8')
+        if "Greeting endpoint" not in payload:
+            logger.error("仕様書のJSONが更新されていません")
+            return False
+        new_file = static_site_dir / "xxx-api-2/docs/paths/added.yml"
+        new_file.write_text("openapi: 3.0.0\ninfo:\n  title: added api\n  version: 1.0.0\npaths: {}\n", encoding='utf-8')
+        result = watcher.poll()
+        if (result["specs"], result["html"]) != (1, True) or "added api" not in index_file.read_text(encoding='utf-8'):
+            logger.error(f"仕様書の追加の反映が想定と異なります: {result}")
+            return False
+        new_file.unlink()
+        result = watcher.poll()
+        if (result["removed"], result["html"]) != (1, True) or (static_site_dir / "static/specs/xxx-api-2/docs/paths/added.yml.json").exists():
+            logger.error(f"仕様書の削除の反映が想定と異なります: {result}")
+            return False
+        if len(watcher.catalog) != 6 or has_term(watcher, "added"):
+            logger.error("削除した仕様書がカタログまたは検索索引に残っています")
+            return False
+        watcher.asset_files = {}
+        if watcher.poll() != {"specs": 0, "removed": 0, "shards": 0, "html": True}:
+            logger.error("テンプレート・アセットの変更で index.html を生成し直していません")
+            return False
+        logger.info("watchコマンドのテストに成功しました")
+        return True
+    finally:
+        CONFIG["site_output_mode"] = original_output_mode
+        restore_config()
+
+def run_catalog_db_test():
+    """
+    カタログのデータベースに仕様書の各項目が登録されて検索でき、変更のあった仕様書だけが入れ替わることを確認する
+    """
+    from src.catalog import SpecCatalog
+    import sqlite3
+    import src.catalog_db as catalog_db
+    from src.catalog_db import get_catalog_db_path, query_catalog_db, update_catalog_db
+    logger.info("カタログのデータベースのテストを実行します")
+    setup_test_environment()
+    original_catalog_db_file = CONFIG["catalog_db_file"]
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    users_spec = (
+        "openapi: 3.0.0\ninfo:\n  title: users api\n  version: 1.0.0\npaths:\n"
+        "  /users/{id}:\n    get:\n      operationId: getUser\n      summary: Fetch a user\n"
+        "      parameters:\n        - name: id\n          in: path\n          description: user identifier\n"
+        "      responses:\n        '404':\n          description: not found\n"
+        "components:\n  schemas:\n    ErrorResponse:\n      description: common error\n"
+        "      properties:\n        code:\n          type: integer\n          description: machine readable code\n"
+    )
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        for repo in ("xxx-api-1", "xxx-api-2"):
+            (static_site_dir / repo / "docs/paths/users.yml").write_text(users_spec, encoding='utf-8')
+        site_generator.generate_static_site()
+        if not get_catalog_db_path().exists():
+            logger.error("カタログのデータベースが作成されていません")
+            return False
+        results = query_catalog_db("/users/{id}", kind="path")
+        if sorted(result["repo"] for result in results) != ["xxx-api-1", "xxx-api-2"]:
+            logger.error(f"パスの検索結果が想定と異なります: {results}")
+            return False
+        results = query_catalog_db("errorresponse", kind="schema", exact=True)
+        if sorted(result["spec"] for result in results) != ["xxx-api-1/docs/paths/users.yml", "xxx-api-2/docs/paths/users.yml"]:
+            logger.error(f"スキーマの検索結果が想定と異なります: {results}")
+            return False
+        checks = [
+            (query_catalog_db("getUser", kind="operation"), "GET /users/{id}"),
+            (query_catalog_db("identifier", kind="parameter", repo="xxx-api-1"), "id"),
+            (query_catalog_db("machine readable"), "code"),
+            (query_catalog_db("id", kind="parameter", exact=True), "id"),
+        ]
+        for results, name in checks:
+            if not results or results[0]["name"] != name:
+                logger.error(f"検索結果が想定と異なります: {name} {results}")
+                return False
+        spec_file = static_site_dir / "xxx-api-2/docs/paths/users.yml"
+        spec_file.write_text(users_spec.replace("ErrorResponse", "ProblemDetails"), encoding='utf-8')
+        (static_site_dir / "xxx-api-1/docs/paths/users.yml").unlink()
+        stats = update_catalog_db(SpecCatalog.load(static_site_dir))
+        if stats != {"added": 0, "updated": 1, "unchanged": 6, "removed": 1}:
+            logger.error(f"変更のあった仕様書だけが更新されていません: {stats}")
+            return False
+        if query_catalog_db("ErrorResponse") or len(query_catalog_db("ProblemDetails", kind="schema")) != 1:
+            logger.error("更新・削除した仕様書の項目が検索結果に反映されていません")
+            return False
+        # trigramトークナイザがないSQLiteでは、全文検索索引のないデータベースに作り直して部分一致で検索する
+        expected = query_catalog_db("readable", kind="property")
+        catalog_db._fts_trigram_available = False
+        update_catalog_db(SpecCatalog.load(static_site_dir))
+        with sqlite3.connect(get_catalog_db_path()) as conn:
+            fts_tables = conn.execute("SELECT name FROM sqlite_master WHERE name = 'items_fts'").fetchall()
+        if fts_tables or query_catalog_db("readable", kind="property") != expected or not expected:
+            logger.error(f"trigramがない場合の検索結果が想定と異なります: {fts_tables} {expected}")
+            return False
+        catalog_db._fts_trigram_available = None
+        # データベースを開けない場合も、警告してカタログを作らずにビルドを続ける
+        CONFIG["catalog_db_file"] = "static"
+        site_generator.generate_static_site()
+        if not (static_site_dir / "index.html").exists():
+            logger.error("カタログのデータベースを作成できない場合にビルドが失敗しました")
+            return False
+        logger.info("カタログのデータベースのテストに成功しました")
+        return True
+    finally:
+        catalog_db._fts_trigram_available = None
+        CONFIG["catalog_db_file"] = original_catalog_db_file
+        restore_config()
+
+def run_serve_test():
+    """
+    serveコマンドで、起動時に圧縮した応答・強いETagと304・仕様書のJSONと検索のAPIを返し、
+    圧縮は受け付ける符号化方式だけを1回だけ行い、応答キャッシュが上限を超えないことを確認する
+    """
+    import gzip
+    import json
+    import threading
+    import urllib.error
+    import urllib.request
+    import src.server as server_module
+    from src.server import CachedResponse, FileResponse, ResponseCache, SpecServer, SERVE_VARIANTS_DIR, create_server
+    logger.info("serveコマンドのテストを実行します")
+    setup_test_environment()
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    server = None
+    def fetch(path, **headers):
+        request = urllib.request.Request(f"http://127.0.0.1:{server.server_address[1]}{path}", headers=headers)
+        try:
+            with urllib.request.urlopen(request) as response:
+                return response.status, response.headers, response.read()
+        except urllib.error.HTTPError as e:
+            return e.code, e.headers, e.read()
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        site_generator.generate_static_site()
+        server = create_server(port=0)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        index_html = (static_site_dir / "index.html").read_bytes()
+        # 起動時に圧縮しておき、最初の要求では圧縮しない
+        if any(encoding not in server.app.handle("/index.html", {}).variants for encoding in server_module.COMPRESSORS):
+            logger.error("起動時に index.html を圧縮していません")
+            return False
+        status, headers, body = fetch("/", **{"Accept-Encoding": "gzip, deflate"})
+        if status != 200 or headers["Content-Encoding"] != "gzip" or gzip.decompress(body) != index_html:
+            logger.error(f"index.html を圧縮して返していません: {status} {dict(headers)}")
+            return False
+        etag = headers["ETag"]
+        status, headers, body = fetch("/", **{"Accept-Encoding": "gzip", "If-None-Match": etag})
+        if status != 304 or body or headers["ETag"] != etag:
+            logger.error(f"ETagが一致するのに304を返していません: {status}")
+            return False
+        status, headers, body = fetch("/index.html", **{"If-None-Match": etag})
+        if status != 200 or body != index_html or headers["ETag"] == etag or "Content-Encoding" in headers:
+            logger.error("圧縮しない応答が圧縮した応答と区別されていません")
+            return False
+        status, _, body = fetch("/api/specs")
+        if status != 200 or len(json.loads(body)) != 6:
+            logger.error(f"仕様書一覧のAPIの応答が想定と異なります: {status} {body[:200]}")
+            return False
+        spec_path = "/api/specs/xxx-api-1/docs/paths/openapi.yml"
+        status, headers, body = fetch(spec_path)
+        hits = server.app.cache.stats["hits"]
+        if status != 200 or "/hello" not in json.loads(body)["paths"] or fetch(spec_path)[2] != body or server.app.cache.stats["hits"] != hits + 1:
+            logger.error(f"仕様書のJSONのAPIの応答が想定と異なります: {status} {body[:200]}")
+            return False
+        spec_file = static_site_dir / "xxx-api-1/docs/paths/openapi.yml"
+        spec_file.write_text(spec_file.read_text(encoding='utf-8').replace("Hello endpoint", "Greeting endpoint"), encoding='utf-8')
+        status, changed_headers, changed = fetch(spec_path, **{"If-None-Match": headers["ETag"]})
+        if status != 200 or b"Greeting endpoint" not in changed or changed_headers["ETag"] == headers["ETag"]:
+            logger.error("変更した仕様書のJSONを返していません")
+            return False
+        status, _, body = fetch("/api/search?q=hello")
+        results = json.loads(body)
+        if status != 200 or {result["specPath"] for result in results} != {"xxx-api-1/docs/paths/openapi.yml", "xxx-api-1/docs/paths/subapi.yml"}:
+            logger.error(f"検索APIの応答が想定と異なります: {status} {body[:200]}")
+            return False
+        if results[0]["matches"][0][:2] != ["paths./hello", "/hello"] or results[0]["queryScore"] <= 0:
+            logger.error(f"検索結果の項目が想定と異なります: {results[0]}")
+            return False
+        status, _, body = fetch("/api/query?q=/hello&kind=path")
+        if status != 200 or len(json.loads(body)) != 2 or fetch("/api/query?q=x&kind=bogus")[0] != 400:
+            logger.error(f"カタログのデータベースの検索APIの応答が想定と異なります: {status} {body[:200]}")
+            return False
+        for path in ("/.catalog.sqlite", "/../README.md", "/static/%2e%2e/%2e%2e/README.md", "/missing.html", "/api/unknown"):
+            if fetch(path)[0] != 404:
+                logger.error(f"返してはいけないファイルを返しました: {path}")
+                return False
+        response = CachedResponse(index_html, "text/html; charset=utf-8")
+        if response.variants or response.negotiate("gzip") != ("gzip", f'"{response.digest}-gzip"') or response.variants:
+            logger.error("ETagを求めるだけで本文を圧縮しました")
+            return False
+        if gzip.decompress(response.select("gzip, br;q=0")[1]) != index_html or list(response.variants) != ["gzip"]:
+            logger.error(f"受け付ける符号化方式だけを圧縮していません: {list(response.variants)}")
+            return False
+        # 応答キャッシュに収まらない大きいファイルは、圧縮した本文をディスクに保存して再起動後も使う
+        large_app = SpecServer(static_site_dir, cache_max_bytes=len(index_html))
+        large = large_app.handle("/index.html", {})
+        encoding, body, etag = large.select("gzip")
+        variant_files = list((static_site_dir / SERVE_VARIANTS_DIR).glob("*.gzip"))
+        if not isinstance(large, FileResponse) or gzip.decompress(body) != index_html or len(variant_files) != 1:
+            logger.error(f"大きいファイルの圧縮した本文を保存していません: {type(large).__name__} {variant_files}")
+            return False
+        if large_app.handle("/index.html", {}) is not large or fetch("/.serve_cache/" + variant_files[0].name)[0] != 404:
+            logger.error("大きいファイルの応答を保持していないか、圧縮した本文を配信しました")
+            return False
+        variant_mtime = variant_files[0].stat().st_mtime_ns
+        original_compressors = dict(server_module.COMPRESSORS)
+        server_module.COMPRESSORS["gzip"] = lambda data: (_ for _ in ()).throw(AssertionError("再圧縮しました"))
+        try:
+            reloaded = SpecServer(static_site_dir, cache_max_bytes=len(index_html)).handle("/index.html", {})
+            if reloaded.select("gzip")[1:] != (body, etag) or variant_files[0].stat().st_mtime_ns != variant_mtime:
+                logger.error("保存した圧縮済みの本文を使っていません")
+                return False
+        finally:
+            server_module.COMPRESSORS.clear()
+            server_module.COMPRESSORS.update(original_compressors)
+        cache = ResponseCache(4096)
+        for index in range(10):
+            cache.put(index, CachedResponse(os.urandom(1000), "application/octet-stream"))
+        if cache.total_bytes > 4096 or cache.stats["evictions"] != 6 or cache.get(5) is not None or cache.get(6) is None:
+            logger.error(f"応答キャッシュの上限が守られていません: {cache.total_bytes} {cache.stats}")
+            return False
+        logger.info("serveコマンドのテストに成功しました")
+        return True
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+        restore_config()
+
+def run_spec_diff_test():
+    """
+    前回の実行からの仕様書の変更を、ハッシュの変わった部分木だけを比べて互換性の有無で分類し、
+    変更履歴のJSONとHTMLに書き出すことを確認する
+    """
+    import json
+    import src.spec_diff as spec_diff
+    logger.info("仕様書の差分のテストを実行します")
+    setup_test_environment()
+    static_site_dir = Path(CONFIG["static_site_dir"])
+    users_spec = {
+        "openapi": "3.0.0",
+        "info": {"title": "users api", "version": "1.0.0"},
+        "paths": {
+            "/users/{id}": {
+                "parameters": [{"name": "id", "in": "path", "required": True, "schema": {"type": "string"}}],
+                "get": {"operationId": "getUser", "responses": {"200": {"description": "ok"}, "404": {"description": "not found"}}},
+            },
+            "/users": {"get": {"operationId": "listUsers", "responses": {"200": {"description": "ok"}}}},
+        },
+        "components": {"schemas": {
+            "User": {"type": "object", "required": ["id"], "properties": {"id": {"type": "string"}, "name": {"type": "string"}}},
+            "Status": {"type": "string", "enum": ["active", "inactive"]},
+        }},
+    }
+    spec_file = static_site_dir / "xxx-api-1/docs/paths/users.yml"
+    original_compare_operation = spec_diff.compare_operation
+    compared = []
+    def counting_compare_operation(*args):
+        compared.append(args)
+        return original_compare_operation(*args)
+    try:
+        for mock_repo in Path("test/mock_data").iterdir():
+            shutil.copytree(mock_repo, static_site_dir / mock_repo.name)
+        spec_file.write_text(json.dumps(users_spec), encoding='utf-8')
+        run = spec_diff.generate_changelog()
+        if not run["baseline"] or run["changes"] or not (static_site_dir / "changelog.html").exists():
+            logger.error(f"最初の実行で基準を保存していません: {run}")
+            return False
+        spec_diff.compare_operation = counting_compare_operation
+        run = spec_diff.generate_changelog()
+        if run["baseline"] or run["changes"] or compared:
+            logger.error(f"変更がないのに差分を検出しました: {run}")
+            return False
+        users_spec["paths"]["/users/{id}"]["get"]["responses"].pop("404")
+        users_spec["paths"]["/users"]["get"]["parameters"] = [{"name": "limit", "in": "query", "schema": {"type": "integer"}}]
+        users_spec["paths"]["/health"] = {"get": {"responses": {"200": {"description": "ok"}}}}
+        schemas = users_spec["components"]["schemas"]
+        schemas["User"]["properties"] = {"id": {"type": "string"}, "email": {"type": "string"}}
+        schemas["Status"]["enum"].append("pending")
+        spec_file.write_text(json.dumps(users_spec), encoding='utf-8')
+        (static_site_dir / "xxx-api-2/docs/paths/subapi.yml").unlink()
+        run = spec_diff.generate_changelog()
+        changes = {(change["kind"], change["target"], change["change"], change["breaking"]) for change in run["changes"]}
+        expected = {
+            ("operation", "GET /users/{id}", "modified", True),
+            ("operation", "GET /users", "modified", False),
+            ("path", "/health", "added", False),
+            ("schema", "User", "modified", True),
+            ("schema", "Status", "modified", True),
+            ("spec", "xxx-api-2/docs/paths/subapi.yml", "removed", True),
+        }
+        # どこからも参照されないスキーマはレスポンスにも使われうるため、列挙値の追加も互換性を壊す変更とする
+        if changes != expected or run["summary"]["breaking"] != 4:
+            logger.error(f"差分の分類が想定と異なります: {sorted(changes)}")
+            return False
+        if len(compared) != 2:
+            logger.error(f"変更のないオペレーションまで比較しています: {len(compared)}件")
+            return False
+        user_change = next(change for change in run["changes"] if change["target"] == "User")
+        if {(detail["message"], detail["breaking"]) for detail in user_change["details"]} != {
+            ("プロパティ name が削除されました", True), ("プロパティ email が追加されました", False),
+        }:
+            logger.error(f"スキーマの変更の内訳が想定と異なります: {user_change}")
+            return False
+        changelog = json.loads((static_site_dir / "changelog.json").read_text(encoding='utf-8'))
+        html = (static_site_dir / "changelog.html").read_text(encoding='utf-8')
+        if len(changelog["runs"]) != 1 or "GET /users/{id}" not in html or "レスポンス 404 が削除されました" not in html:
+            logger.error("変更履歴のJSON・HTMLに変更が書き出されていません")
+            return False
+        # インラインのリクエストボディ・レスポンスのスキーマの変更も分類する
+        users_spec["paths"]["/users"]["post"] = {
+            "requestBody": {"content": {"application/json": {"schema": {
+                "type": "object", "properties": {"name": {"type": "string"}, "nickname": {"type": "string"}},
+            }}}},
+            "responses": {"201": {"description": "created", "content": {"application/json": {"schema": {
+                "type": "object", "properties": {"id": {"type": "string"}},
+            }}}}},
+        }
+        spec_file.write_text(json.dumps(users_spec), encoding='utf-8')
+        spec_diff.generate_changelog()
+        post = users_spec["paths"]["/users"]["post"]
+        body_schema = post["requestBody"]["content"]["application/json"]["schema"]
+        body_schema["required"] = ["name"]
+        body_schema["properties"].pop("nickname")
+        post["responses"]["201"]["content"]["application/json"]["schema"]["properties"]["id"]["type"] = "integer"
+        spec_file.write_text(json.dumps(users_spec), encoding='utf-8')
+        run = spec_diff.generate_changelog()
+        post_change = next(change for change in run["changes"] if change["target"] == "POST /users")
+        if {(detail["message"], detail["breaking"]) for detail in post_change["details"]} != {
+            ("リクエストボディ (application/json) のプロパティ name が必須になりました", True),
+            ("リクエストボディ (application/json) のプロパティ nickname が削除されました", True),
+            ("レスポンス 201 (application/json) のプロパティ id の型が string から integer に変わりました", True),
+        }:
+            logger.error(f"インラインのスキーマの変更の内訳が想定と異なります: {post_change}")
+            return False
+        # レスポンスでは必須・任意と列挙値の互換性がリクエストと逆になり、入れ子のプロパティと items もたどる
+        post["responses"]["201"]["content"]["application/json"]["schema"] = {
+            "type": "object", "required": ["id", "status"], "properties": {
+                "id": {"type": "integer"},
+                "status": {"type": "string", "enum": ["active"]},
+                "email": {"type": "string"},
+                "profile": {"type": "object", "properties": {"nickname": {"type": "string"}, "bio": {"type": "string"}}},
+            },
+        }
+        body_schema["properties"]["tags"] = {"type": "array", "items": {"type": "object", "properties": {"label": {"type": "string"}}}}
+        schemas["Page"] = {"type": "object", "properties": {"next": {"type": "string"}}}
+        users_spec["paths"]["/users"]["get"]["responses"]["200"]["content"] = {
+            "application/json": {"schema": {"$ref": "#/components/schemas/Page"}},
+        }
+        spec_file.write_text(json.dumps(users_spec), encoding='utf-8')
+        spec_diff.generate_changelog()
+        response_schema = post["responses"]["201"]["content"]["application/json"]["schema"]
+        response_schema["required"] = ["status", "email", "createdAt"]
+        response_schema["properties"]["createdAt"] = {"type": "string"}
+        response_schema["properties"]["status"]["enum"].append("pending")
+        response_schema["properties"]["profile"]["properties"].pop("bio")
+        body_schema["properties"]["tags"]["items"]["required"] = ["label"]
+        schemas["Page"]["required"] = ["total"]
+        schemas["Page"]["properties"]["total"] = {"type": "integer"}
+        spec_file.write_text(json.dumps(users_spec), encoding='utf-8')
+        run = spec_diff.generate_changelog()
+        post_change = next(change for change in run["changes"] if change["target"] == "POST /users")
+        if {(detail["message"], detail["breaking"]) for detail in post_change["details"]} != {
+            ("リクエストボディ (application/json) のプロパティ tags[].label が必須になりました", True),
+            ("レスポンス 201 (application/json) のプロパティ id が任意になりました", True),
+            ("レスポンス 201 (application/json) のプロパティ email が必須になりました", False),
+            ("レスポンス 201 (application/json) の必須のプロパティ createdAt が追加されました", False),
+            ("レスポンス 201 (application/json) のプロパティ status の列挙値 pending が追加されました", True),
+            ("レスポンス 201 (application/json) のプロパティ profile.bio が削除されました", True),
+        }:
+            logger.error(f"レスポンスのスキーマの変更の内訳が想定と異なります: {post_change}")
+            return False
+        page_change = next(change for change in run["changes"] if change["target"] == "Page")
+        if page_change["breaking"] or [detail["message"] for detail in page_change["details"]] != ["必須のプロパティ total が追加されました"]:
+            logger.error(f"レスポンスだけで使われるスキーマの変更の分類が想定と異なります: {page_change}")
+            return False
+        site_generator.generate_static_site()
+        if 'href="changelog.html"' not in (static_site_dir / "index.html").read_text(encoding='utf-8'):
+            logger.error("index.html に変更履歴へのリンクがありません")
+            return False
+        logger.info("仕様書の差分のテストに成功しました")
+        return True
+    finally:
+        spec_diff.compare_operation = original_compare_operation
+        restore_config()
+
 if __name__ == "__main__":
     # コマンドライン引数の処理
     if len(sys.argv) > 1:
@@ -204,5 +1698,7 @@ if __name__ == "__main__":
             clean_test_environment()
             sys.exit(0)
     
-    success = run_test()
+    success = run_spec_glob_test() and run_concurrent_collect_test() and run_http_backend_test() and run_incremental_collect_test() and run_graphql_collect_test() and run_rate_limit_test() and run_repository_discovery_test() and run_mirror_collect_test() and run_spec_catalog_test() and run_parse_cache_test() and run_parallel_build_test() and run_vendor_assets_test() and run_committed_vendor_pins_test() and run_split_output_test() and run_search_index_test() and run_streaming_viewer_test() and run_compressed_viewer_test() and run_shared_components_test() and run_ref_bundle_test() and run_watch_test() and run_metrics_test() and run_startup_test() and run_catalog_db_test() and run_serve_test() and run_spec_diff_test() and run_test()
+    shutil.rmtree(TEST_VENDOR_CACHE_DIR, ignore_errors=True)
+    shutil.rmtree(TEST_DIFF_STATE_DIR, ignore_errors=True)
     sys.exit(0 if success else 1)
\ No newline at end of file